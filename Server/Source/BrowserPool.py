@@ -0,0 +1,263 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from Metrics import span
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class PooledBrowser:
+    def __init__(self, browser, index):
+        self.browser = browser
+        self.index = index
+        self.launched_at = time.time()
+        self.in_flight = 0
+        self.jobs_served = 0
+        self.pages_served = 0
+        self.rss_mb = None
+        self.draining = False
+        self.drain_reason = None
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "age_s": round(time.time() - self.launched_at, 1),
+            "in_flight": self.in_flight,
+            "jobs_served": self.jobs_served,
+            "pages_served": self.pages_served,
+            "rss_mb": self.rss_mb,
+            "draining": self.draining,
+            "drain_reason": self.drain_reason,
+        }
+
+
+class BrowserPool:
+    """
+    Navegadores Chromium reaproveitados entre jobs, num event loop próprio.
+
+    Cada navegador é reciclado ao passar de `max_pages_per_browser` páginas
+    servidas ou quando o RSS do processo (navegador + renderers) cruza
+    `rss_watermark_mb`. A reciclagem é graciosa: o navegador para de
+    receber jobs e só é fechado quando os `execute` em andamento terminam.
+    """
+
+    def __init__(self, settings, metrics=None):
+        self.size = max(1, settings.get("size", 2))
+        self.contexts_per_browser = max(1, settings.get("contexts_per_browser", 2))
+        self.max_pages = settings.get("max_pages_per_browser", 200)
+        self.rss_watermark_mb = settings.get("rss_watermark_mb", 1500)
+        self.sample_interval = settings.get("sample_interval", 10.0)
+        self.prewarm = settings.get("prewarm", 1)
+        self.drain_timeout = settings.get("drain_timeout", 60.0)
+        self.headless = settings.get("headless", True)
+        self.metrics = metrics
+
+        self.loop = None
+        self.thread = None
+        self.playwright = None
+        self.browsers = []
+        self.launching = 0
+        self.launched = 0
+        self.recycled = 0
+        self.changed = None
+        self.sampler = None
+        self.closing = False
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="browser-pool", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+        self.run(self._start())
+        return self
+
+    def run(self, coro, timeout=None):
+        """Executa uma corrotina no loop do pool e espera o resultado (chamado de outras threads)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _start(self):
+        self.changed = asyncio.Condition()
+        self.playwright = await async_playwright().start()
+
+        for _ in range(min(self.prewarm, self.size)):
+            try:
+                await self._launch()
+            except Exception as e:
+                print(f"[-] Falha ao pré-aquecer navegador: {e}")
+                break
+
+        self.sampler = asyncio.ensure_future(self._sample_loop())
+
+    async def _launch(self):
+        self.launching += 1
+        try:
+            browser = await self.playwright.chromium.launch(headless=self.headless)
+        finally:
+            self.launching -= 1
+
+        self.launched += 1
+        pooled = PooledBrowser(browser, self.launched)
+        self.browsers.append(pooled)
+        await self._sample(pooled)
+        print(f"[+] Navegador #{pooled.index} iniciado no pool ({len(self.browsers)}/{self.size})")
+        self._publish()
+        return pooled
+
+    @asynccontextmanager
+    async def browser(self, trace=None):
+        with span(trace, "browser_acquire"):
+            pooled = await self._acquire()
+        pooled.in_flight += 1
+        try:
+            yield pooled
+        finally:
+            pooled.in_flight -= 1
+            pooled.jobs_served += 1
+            self._check_recycle(pooled)
+            await self._close_if_drained(pooled)
+            async with self.changed:
+                self.changed.notify_all()
+
+    async def _acquire(self):
+        async with self.changed:
+            while True:
+                if self.closing:
+                    raise RuntimeError("Pool de navegadores encerrando")
+
+                available = [b for b in self.browsers if not b.draining and b.in_flight < self.contexts_per_browser]
+                if available:
+                    return min(available, key=lambda b: b.in_flight)
+
+                if len(self.browsers) + self.launching < self.size:
+                    break
+
+                await self.changed.wait()
+
+        try:
+            return await self._launch()
+        except Exception:
+            # Quem estava esperando vaga pode tentar lançar de novo
+            async with self.changed:
+                self.changed.notify_all()
+            raise
+
+    def _check_recycle(self, pooled):
+        if pooled.draining:
+            return
+        if not pooled.browser.is_connected():
+            self._drain(pooled, "navegador desconectado")
+        elif self.max_pages and pooled.pages_served >= self.max_pages:
+            self._drain(pooled, f"{pooled.pages_served} páginas servidas")
+        elif self.rss_watermark_mb and pooled.rss_mb and pooled.rss_mb >= self.rss_watermark_mb:
+            self._drain(pooled, f"RSS {pooled.rss_mb:.0f}MB")
+
+    def _drain(self, pooled, reason):
+        pooled.draining = True
+        pooled.drain_reason = reason
+        print(f"[+] Reciclando navegador #{pooled.index}: {reason}")
+
+    async def _close_if_drained(self, pooled):
+        if not pooled.draining or pooled.in_flight or pooled not in self.browsers:
+            return
+
+        self.browsers.remove(pooled)
+        self.recycled += 1
+        if self.metrics:
+            self.metrics.incr("browsers_recycled")
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"[-] Erro ao fechar navegador #{pooled.index}: {e}")
+        self._publish()
+
+    async def _sample(self, pooled):
+        """RSS do navegador e dos processos filhos, via CDP SystemInfo + psutil."""
+        if psutil is None:
+            return
+
+        try:
+            # Renderers nascem e morrem com as abas, então a lista de processos é refeita a cada amostra
+            session = await pooled.browser.new_browser_cdp_session()
+            try:
+                info = await session.send("SystemInfo.getProcessInfo")
+            finally:
+                await session.detach()
+
+            rss = 0
+            for proc in info.get("processInfo", []):
+                try:
+                    rss += psutil.Process(proc["id"]).memory_info().rss
+                except psutil.Error:
+                    pass
+            pooled.rss_mb = round(rss / (1024 * 1024), 1)
+        except Exception:
+            pooled.rss_mb = None
+
+    async def _sample_loop(self):
+        while not self.closing:
+            await asyncio.sleep(self.sample_interval)
+            for pooled in list(self.browsers):
+                await self._sample(pooled)
+                self._check_recycle(pooled)
+                await self._close_if_drained(pooled)
+            self._publish()
+
+    def _publish(self):
+        if not self.metrics:
+            return
+        self.metrics.gauge("browsers_open", len(self.browsers))
+        self.metrics.gauge("browsers_in_flight", sum(b.in_flight for b in self.browsers))
+        self.metrics.gauge("browsers_rss_mb", sum(b.rss_mb or 0 for b in self.browsers))
+
+    def status(self):
+        return {
+            "size": self.size,
+            "launched": self.launched,
+            "recycled": self.recycled,
+            "browsers": [b.to_dict() for b in list(self.browsers)],
+        }
+
+    async def _close(self):
+        self.closing = True
+        async with self.changed:
+            self.changed.notify_all()
+
+        deadline = time.time() + self.drain_timeout
+        while any(b.in_flight for b in self.browsers) and time.time() < deadline:
+            await asyncio.sleep(0.2)
+
+        if self.sampler:
+            self.sampler.cancel()
+        for pooled in list(self.browsers):
+            try:
+                await pooled.browser.close()
+            except Exception:
+                pass
+        self.browsers.clear()
+        await self.playwright.stop()
+
+    def close(self):
+        # Server.stop pode rodar duas vezes (comando exit e finally do main)
+        loop, self.loop = self.loop, None
+        if not loop or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(self.drain_timeout + 10)
+        except Exception as e:
+            print(f"[-] Erro ao encerrar pool de navegadores: {e}")
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+
+DEFAULT_TIMEOUTS = {
+    "request": 900.0,
+    "site": 300.0,
+    "navigation": 30.0,
+    "selector": 15.0,
+    "load_state": 20.0,
+}
+
+
+class JobCancelled(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Job cancelado: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Prazo de uma requisição e sinal de cancelamento compartilhado entre threads."""
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    @property
+    def cancelled(self):
+        if not self.event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        return self.event.is_set()
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.reason)
+
+
+async def run_guarded(coro, token=None, timeout=None, poll=0.25):
+    """
+    Executa a corrotina até terminar, o token ser cancelado ou `timeout`
+    estourar. Cancelar a task faz os `finally` do worker fecharem página,
+    contexto e devolverem o navegador ao pool.
+    """
+    task = asyncio.ensure_future(coro)
+    deadline = time.monotonic() + timeout if timeout else None
+
+    while not task.done():
+        await asyncio.wait({task}, timeout=poll)
+        if task.done():
+            break
+
+        reason = None
+        if token is not None and token.cancelled:
+            reason = token.reason
+        elif deadline is not None and time.monotonic() >= deadline:
+            reason = f"timeout do site ({timeout:.0f}s)"
+
+        if reason:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass
+            raise JobCancelled(reason)
+
+    return task.result()
+
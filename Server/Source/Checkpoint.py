@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_key TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    search_term TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    last_page INTEGER NOT NULL DEFAULT 0,
+    url TEXT,
+    storage_state TEXT,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint_pages (
+    job_key TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    html BLOB NOT NULL,
+    PRIMARY KEY (job_key, page_no)
+);
+"""
+
+
+# Páginas vindas de extraction_script são selector maps, gravados como JSON com este prefixo
+SELECTOR_MAP_MARK = "\x00selector_map\x00"
+SELECTOR_MAP_BYTES = SELECTOR_MAP_MARK.encode("utf-8")
+
+
+def job_key(site_name, search_term, config_hash):
+    raw = json.dumps([site_name, search_term, config_hash], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Checkpoints de crawl em SQLite local: última página concluída, URL,
+    cookies (storage_state do Playwright) e o HTML das páginas já baixadas,
+    para que um retry ou um batch repetido continue de onde parou.
+    """
+
+    def __init__(self, path="state/checkpoints.db", max_age_hours=24):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_age = max_age_hours * 3600
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.prune()
+
+    def open(self, site_name, search_term, config_hash):
+        key = job_key(site_name, search_term, config_hash)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT last_page, url, storage_state, completed FROM checkpoints WHERE job_key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO checkpoints (job_key, site, search_term, config_hash, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, site_name, search_term, config_hash, time.time())
+                )
+                self.conn.commit()
+                return CrawlCheckpoint(self, key)
+
+        last_page, url, storage_state, completed = row
+        return CrawlCheckpoint(
+            self, key, last_page, url,
+            json.loads(storage_state) if storage_state else None,
+            bool(completed)
+        )
+
+    def record_page(self, key, page_no, html, url, storage_state):
+        if isinstance(html, dict):
+            html = SELECTOR_MAP_MARK + json.dumps(html, ensure_ascii=False)
+        data = zlib.compress(html.encode("utf-8") if isinstance(html, str) else html, 6)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoint_pages (job_key, page_no, html) VALUES (?, ?, ?)",
+                (key, page_no, data)
+            )
+            self.conn.execute(
+                "UPDATE checkpoints SET last_page = ?, url = ?, storage_state = ?, updated_at = ? WHERE job_key = ?",
+                (page_no, url, json.dumps(storage_state) if storage_state else None, time.time(), key)
+            )
+            self.conn.commit()
+
+    def iter_pages(self, key):
+        """Páginas salvas, uma por vez e como bytes UTF-8, para não descomprimir todas juntas."""
+        with self.lock:
+            numbers = [row[0] for row in self.conn.execute(
+                "SELECT page_no FROM checkpoint_pages WHERE job_key = ? ORDER BY page_no", (key,)
+            )]
+
+        for page_no in numbers:
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT html FROM checkpoint_pages WHERE job_key = ? AND page_no = ?", (key, page_no)
+                ).fetchone()
+            if row is None:
+                continue
+            page = zlib.decompress(row[0])
+            if page.startswith(SELECTOR_MAP_BYTES):
+                page = json.loads(page[len(SELECTOR_MAP_BYTES):])
+            yield page
+
+    def pages(self, key):
+        return list(self.iter_pages(key))
+
+    def mark_completed(self, key):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE checkpoints SET completed = 1, updated_at = ? WHERE job_key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+
+    def clear(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoint_pages WHERE job_key = ?", (key,))
+            self.conn.execute("DELETE FROM checkpoints WHERE job_key = ?", (key,))
+            self.conn.commit()
+
+    def clear_completed(self, site_name, search_term, config_hash):
+        """Apaga o checkpoint só se o crawl tinha terminado, sem criar um novo."""
+        key = job_key(site_name, search_term, config_hash)
+        with self.lock:
+            completed = self.conn.execute(
+                "SELECT 1 FROM checkpoints WHERE job_key = ? AND completed = 1", (key,)
+            ).fetchone()
+        if completed:
+            self.clear(key)
+
+    def prune(self):
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM checkpoint_pages WHERE job_key IN (SELECT job_key FROM checkpoints WHERE updated_at < ?)",
+                (cutoff,)
+            )
+            removed = self.conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (cutoff,)).rowcount
+            self.conn.commit()
+        if removed:
+            print(f"[+] {removed} checkpoints expirados removidos")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CrawlCheckpoint:
+    def __init__(self, store, key, last_page=0, url=None, storage_state=None, completed=False):
+        self.store = store
+        self.key = key
+        self.last_page = last_page
+        self.url = url
+        self.storage_state = storage_state
+        self.completed = completed
+
+    def record(self, page_no, html, url, storage_state=None):
+        self.store.record_page(self.key, page_no, html, url, storage_state)
+        self.last_page = page_no
+        self.url = url
+        self.storage_state = storage_state
+
+    def pages(self):
+        return self.store.pages(self.key)
+
+    def iter_pages(self):
+        return self.store.iter_pages(self.key)
+
+    def mark_completed(self):
+        self.store.mark_completed(self.key)
+        self.completed = True
+
+    def clear(self):
+        self.store.clear(self.key)
+        self.last_page = 0
+        self.url = None
+        self.storage_state = None
+        self.completed = False
@@ -0,0 +1,326 @@
+import itertools
+import json
+import socket
+import threading
+import time
+
+from Cancellation import JobCancelled
+from Metrics import span
+from Serializer import StreamEncoder, frame, read_frame
+
+
+DEFAULTS = {
+    "heartbeat_interval": 5.0,
+    "heartbeat_timeout": 15.0,
+    "max_reassign": 2,
+    "local_fallback": True,
+}
+
+
+def send_message(sock, message, encoder, lock=None):
+    """Mensagem JSON com prefixo de tamanho, o formato do link coordenador <-> worker."""
+    payload = frame(encoder.dumps(message))
+    if lock is None:
+        sock.sendall(payload)
+        return
+    with lock:
+        sock.sendall(payload)
+
+
+def read_message(sock):
+    payload = read_frame(sock)
+    return None if payload is None else json.loads(payload)
+
+
+class RemoteJob:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.lost = False
+
+
+class RemoteNode:
+    def __init__(self, node_id, session, capacity, sites, encoder):
+        self.id = node_id
+        self.session = session
+        self.capacity = capacity
+        self.sites = set(sites or [])
+        self.encoder = encoder
+        self.send_lock = threading.Lock()
+        self.jobs = {}
+        self.registered_at = time.time()
+        self.last_seen = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.alive = True
+
+    @property
+    def free(self):
+        return self.capacity - len(self.jobs)
+
+    def accepts(self, site_name):
+        return not self.sites or site_name in self.sites
+
+    def send(self, message):
+        send_message(self.session.socket, message, self.encoder, self.send_lock)
+
+    def to_dict(self):
+        return {
+            "addr": str(self.session.addr),
+            "capacity": self.capacity,
+            "in_flight": len(self.jobs),
+            "sites": sorted(self.sites) or None,
+            "completed": self.completed,
+            "failed": self.failed,
+            "age_s": round(time.time() - self.registered_at, 1),
+            "last_heartbeat_s": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class Coordinator:
+    """
+    Distribui o crawl + parse de cada (site, termo) para processos
+    WorkerNode conectados ao servidor, no mesmo host ou em outros.
+
+    O worker se registra com register_worker (capacidade e, opcionalmente,
+    os sites que atende) e a conexão passa a trocar JSON com prefixo de
+    tamanho: heartbeat periódico com a capacidade atual, job, cancel e
+    result. Se o worker cair ou parar de mandar heartbeat, os jobs dele
+    voltam para a fila e vão para outro worker (até `max_reassign` vezes).
+    """
+
+    def __init__(self, settings=None, metrics=None):
+        self.settings = {**DEFAULTS, **(settings or {})}
+        self.heartbeat_interval = float(self.settings["heartbeat_interval"])
+        self.heartbeat_timeout = float(self.settings["heartbeat_timeout"])
+        self.max_reassign = int(self.settings["max_reassign"])
+        self.local_fallback = bool(self.settings["local_fallback"])
+        self.metrics = metrics
+        self.encoder = StreamEncoder("auto")
+        self.nodes = {}
+        self.condition = threading.Condition()
+        self.job_ids = itertools.count(1)
+        self.reassigned = 0
+        self.stop_event = threading.Event()
+        self.monitor = None
+
+    def start(self):
+        self.monitor = threading.Thread(target=self._monitor, name="cluster-monitor", daemon=True)
+        self.monitor.start()
+        return self
+
+    def has_nodes(self):
+        with self.condition:
+            return bool(self.nodes)
+
+    def capacity(self):
+        with self.condition:
+            return sum(node.capacity for node in self.nodes.values())
+
+    def serve(self, session, message):
+        """Atende a conexão de um worker até ela cair (roda numa thread própria do Server)."""
+        node_id = str(message.get("node_id") or f"{session.addr[0]}:{session.addr[1]}")
+        node = RemoteNode(
+            node_id, session, max(1, int(message.get("capacity", 1))), message.get("sites"), self.encoder
+        )
+        session.node_id = node_id
+
+        with self.condition:
+            previous = self.nodes.get(node_id)
+        if previous:
+            # Mesmo worker reconectando: os jobs da conexão antiga são redistribuídos
+            self._lose(previous, "substituído por nova conexão")
+
+        node.send({
+            "type": "register_worker",
+            "content": {"node_id": node_id, "heartbeat_interval": self.heartbeat_interval},
+            "success": True,
+            "timestamp": time.time(),
+        })
+        with self.condition:
+            self.nodes[node_id] = node
+            self.condition.notify_all()
+        self._publish()
+        print(f"[+] Worker {node_id} registrado ({session.addr}, capacidade {node.capacity})")
+
+        reason = "conexão encerrada"
+        try:
+            while not self.stop_event.is_set():
+                message = read_message(session.socket)
+                if message is None:
+                    break
+                self._handle(node, message)
+        except (OSError, ValueError) as e:
+            reason = f"erro na conexão: {e}"
+        finally:
+            self._lose(node, reason)
+
+    def _handle(self, node, message):
+        kind = message.get("type")
+        with self.condition:
+            node.last_seen = time.monotonic()
+
+            if kind == "heartbeat":
+                capacity = message.get("capacity")
+                if isinstance(capacity, int) and capacity > 0 and capacity != node.capacity:
+                    node.capacity = capacity
+                    self.condition.notify_all()
+
+            elif kind == "result":
+                job = node.jobs.pop(message.get("job_id"), None)
+                if job is None:
+                    return  # Job já cancelado ou redistribuído
+                if message.get("success"):
+                    job.result = message.get("content")
+                    node.completed += 1
+                else:
+                    job.error = message.get("content") or "erro desconhecido"
+                    node.failed += 1
+                job.done.set()
+                self.condition.notify_all()
+
+    def _lose(self, node, reason):
+        with self.condition:
+            # Monitor de heartbeat e a thread de leitura podem chegar aqui juntos
+            if not node.alive:
+                return
+            node.alive = False
+            if self.nodes.get(node.id) is node:
+                del self.nodes[node.id]
+            jobs, node.jobs = list(node.jobs.values()), {}
+            for job in jobs:
+                job.lost = True
+                job.done.set()
+            self.condition.notify_all()
+
+        try:
+            # Acorda o read_message da thread do worker, se ela ainda estiver lendo
+            node.session.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        if self.metrics:
+            self.metrics.incr("cluster_nodes_lost")
+        self._publish()
+        print(f"[-] Worker {node.id} removido ({reason}), {len(jobs)} jobs redistribuídos")
+
+    def _monitor(self):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            now = time.monotonic()
+            with self.condition:
+                silent = [node for node in self.nodes.values() if now - node.last_seen > self.heartbeat_timeout]
+            for node in silent:
+                self._lose(node, f"sem heartbeat há {now - node.last_seen:.0f}s")
+
+    def _assign(self, site_name, job, token):
+        with self.condition:
+            while True:
+                if self.stop_event.is_set():
+                    raise RuntimeError("Coordenador encerrando")
+                if token is not None:
+                    token.check()
+
+                candidates = [node for node in self.nodes.values() if node.accepts(site_name)]
+                if not candidates and self.local_fallback:
+                    return None
+
+                available = [node for node in candidates if node.free > 0]
+                if available:
+                    node = max(available, key=lambda n: n.free)
+                    node.jobs[job.id] = job
+                    return node
+
+                self.condition.wait(min(token.remaining(), 1.0) if token and token.deadline else 1.0)
+
+    def run(self, site, search_term, token=None, trace=None, timeouts=None, known=None, key_member=None,
+            rate_limit=None, retries=0):
+        """
+        Executa o crawl + parse de um site num worker remoto e devolve o
+        resultado organizado. Retorna None se não houver worker para o site
+        e local_fallback estiver ligado (o servidor faz o crawl ele mesmo).
+        """
+        message = {
+            "type": "job",
+            "site": site.name,
+            "site_cfg": site.cfg,
+            "search_term": search_term,
+            "timeouts": timeouts or {},
+            "rate_limit": rate_limit,
+            "retries": retries,
+            # Modo incremental: o worker para a paginação ao ver só chaves conhecidas
+            "known": sorted(known) if known is not None else None,
+            "key_member": key_member,
+        }
+
+        attempts = 0
+        while True:
+            job = RemoteJob(next(self.job_ids))
+            with span(trace, "node_wait", site=site.name):
+                node = self._assign(site.name, job, token)
+            if node is None:
+                return None
+
+            try:
+                node.send({**message, "job_id": job.id, "timeout": token.remaining() if token else None})
+                with span(trace, "remote_job", site=site.name, node=node.id):
+                    while not job.done.wait(0.25):
+                        if token is not None and token.cancelled:
+                            self._cancel(node, job, token.reason)
+                            raise JobCancelled(token.reason)
+            except OSError as e:
+                self._lose(node, f"falha ao enviar job: {e}")
+
+            if job.lost:
+                attempts += 1
+                self.reassigned += 1
+                if self.metrics:
+                    self.metrics.incr("cluster_jobs_reassigned")
+                if attempts > self.max_reassign:
+                    raise RuntimeError(f"{site.name}: job perdido em {attempts} workers")
+                print(f"[-] {site.name}: worker {node.id} caiu, redistribuindo '{search_term}' ({attempts})")
+                continue
+
+            if job.error is not None:
+                raise RuntimeError(f"worker {node.id}: {job.error}")
+            return job.result
+
+    def _cancel(self, node, job, reason):
+        with self.condition:
+            node.jobs.pop(job.id, None)
+            self.condition.notify_all()
+        try:
+            node.send({"type": "cancel", "job_id": job.id, "reason": reason})
+        except OSError:
+            pass
+
+    def _publish(self):
+        if not self.metrics:
+            return
+        with self.condition:
+            nodes = list(self.nodes.values())
+        self.metrics.gauge("cluster_nodes", len(nodes))
+        self.metrics.gauge("cluster_capacity", sum(node.capacity for node in nodes))
+
+    def status(self):
+        with self.condition:
+            return {
+                "nodes": {node_id: node.to_dict() for node_id, node in self.nodes.items()},
+                "capacity": sum(node.capacity for node in self.nodes.values()),
+                "in_flight": sum(len(node.jobs) for node in self.nodes.values()),
+                "reassigned": self.reassigned,
+            }
+
+    def stop(self, shutdown_cmd):
+        self.stop_event.set()
+        with self.condition:
+            nodes = list(self.nodes.values())
+            self.condition.notify_all()
+
+        for node in nodes:
+            try:
+                node.send({"type": "system", "content": shutdown_cmd, "success": True, "timestamp": time.time()})
+                node.session.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+
+
+def default_config_path():
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+
+    return os.path.join(base_path, 'Config.json')
+
+
+def read_config(json_path=None):
+    with open(json_path or default_config_path(), 'r', encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def load_config(json_path=None):
+    json_path = json_path or default_config_path()
+    try:
+        return read_config(json_path)
+
+    except FileNotFoundError:
+        print(f"Arquivo de Config não encontrado em: {json_path}")
+        return {}
+    except json.JSONDecodeError:
+        print("Erro ao decodificar o JSON de config")
+        return {}
+
+
+def config_hash(value):
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def validate_root(raw):
+    if not isinstance(raw, dict):
+        return ["a raiz do config deve ser um objeto"]
+    errors = []
+    for section in ("sites", "settings"):
+        if not isinstance(raw.get(section, {}), dict):
+            errors.append(f"'{section}' deve ser um objeto")
+    return errors
+
+
+def validate_site(site_name, site_cfg):
+    errors = []
+
+    if not isinstance(site_cfg, dict):
+        return [f"{site_name}: configuração do site deve ser um objeto"]
+
+    if not isinstance(site_cfg.get("url"), str) or not site_cfg.get("url"):
+        errors.append(f"{site_name}: 'url' ausente")
+
+    search_cfg = site_cfg.get("search_config")
+    if not isinstance(search_cfg, dict):
+        errors.append(f"{site_name}: 'search_config' ausente")
+    else:
+        if search_cfg.get("method") == "form_fill":
+            for key in ("input_selector", "submit_selector"):
+                if not search_cfg.get(key):
+                    errors.append(f"{site_name}: search_config.{key} é obrigatório para form_fill")
+
+        pagination = search_cfg.get("pagination", {})
+        if not isinstance(pagination, dict):
+            errors.append(f"{site_name}: search_config.pagination deve ser um objeto")
+            pagination = {}
+        max_pages = pagination.get("max_pages", 1)
+        if not isinstance(max_pages, int) or max_pages < 0:
+            errors.append(f"{site_name}: pagination.max_pages deve ser um inteiro >= 0")
+        if isinstance(max_pages, int) and max_pages > 1 and not pagination.get("next_selector"):
+            errors.append(f"{site_name}: pagination.next_selector é obrigatório quando max_pages > 1")
+        for key in ("resume_url_template", "current_page_selector"):
+            value = pagination.get(key)
+            if value is not None and (not isinstance(value, str) or not value.strip()):
+                errors.append(f"{site_name}: pagination.{key} deve ser uma string não vazia")
+
+    for key in ("result_root_selector", "extraction_script"):
+        value = site_cfg.get(key)
+        if value is not None and (not isinstance(value, str) or not value.strip()):
+            errors.append(f"{site_name}: '{key}' deve ser uma string não vazia")
+
+    groups = site_cfg.get("groups", {})
+    if not isinstance(groups, dict):
+        errors.append(f"{site_name}: 'groups' deve ser um objeto")
+        return errors
+
+    for group_name, group_cfg in groups.items():
+        if not isinstance(group_cfg, dict):
+            errors.append(f"{site_name}: grupo '{group_name}' deve ser um objeto")
+            continue
+
+        parent = group_cfg.get("parent_group")
+        if parent is not None and parent not in groups:
+            errors.append(f"{site_name}: grupo '{group_name}' referencia parent_group inexistente '{parent}'")
+
+        group_type = group_cfg.get("type", "single")
+        if isinstance(group_type, dict):
+            count = group_type.get("multiple")
+            if not isinstance(count, int) or count <= 0:
+                errors.append(f"{site_name}: grupo '{group_name}' com 'multiple' inválido")
+        elif group_type not in ("single", "all"):
+            errors.append(f"{site_name}: grupo '{group_name}' com tipo desconhecido '{group_type}'")
+
+        if not isinstance(group_cfg.get("members", {}), dict):
+            errors.append(f"{site_name}: grupo '{group_name}' com 'members' inválido")
+
+    for section in ("incremental", "records"):
+        key_cfg = site_cfg.get(section)
+        if key_cfg is None:
+            continue
+        if not isinstance(key_cfg, dict):
+            errors.append(f"{site_name}: '{section}' deve ser um objeto")
+            continue
+
+        key_group = key_cfg.get("key_group")
+        if key_group is not None and (not isinstance(key_group, str) or not isinstance(groups.get(key_group), dict)):
+            errors.append(f"{site_name}: {section}.key_group '{key_group}' não existe em groups")
+        elif key_group is not None and groups[key_group].get("parent_group") is not None:
+            errors.append(f"{site_name}: {section}.key_group deve ser um grupo raiz")
+        elif key_group is not None and key_cfg.get("key_member") not in (None, *groups[key_group].get("members", {})):
+            errors.append(f"{site_name}: {section}.key_member não é membro de '{key_group}'")
+
+    records_cfg = site_cfg.get("records")
+    date_pattern = records_cfg.get("date_pattern") if isinstance(records_cfg, dict) else None
+    if date_pattern is not None and not isinstance(date_pattern, str):
+        errors.append(f"{site_name}: records.date_pattern deve ser uma string")
+    elif date_pattern is not None:
+        try:
+            if re.compile(date_pattern).groups != 3:
+                errors.append(f"{site_name}: records.date_pattern deve ter 3 grupos (dia, mês, ano)")
+        except re.error as e:
+            errors.append(f"{site_name}: records.date_pattern inválido: {e}")
+
+    parser_cfg = site_cfg.get("parser", {})
+    if not isinstance(parser_cfg, dict):
+        errors.append(f"{site_name}: 'parser' deve ser um objeto")
+    else:
+        if parser_cfg.get("backend", "dom") not in ("dom", "stream", "auto"):
+            errors.append(f"{site_name}: parser.backend deve ser 'dom', 'stream' ou 'auto'")
+        threshold = parser_cfg.get("stream_threshold_kb", 1)
+        if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or threshold <= 0:
+            errors.append(f"{site_name}: parser.stream_threshold_kb deve ser um número > 0")
+        for key, minimum in (("max_ancestors", 0), ("max_selectors", 1)):
+            value = parser_cfg.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < minimum):
+                errors.append(f"{site_name}: parser.{key} deve ser um inteiro >= {minimum}")
+        for key in ("ancestor_class_allow", "ancestor_class_deny", "skip_tags"):
+            value = parser_cfg.get(key, [])
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                errors.append(f"{site_name}: parser.{key} deve ser uma lista de strings")
+
+    return errors
+
+
+class SiteProgram:
+    """Configuração de um site já validada, com hash para invalidar caches."""
+
+    def __init__(self, name, cfg):
+        self.name = name
+        self.cfg = cfg
+        self.hash = config_hash(cfg)
+
+
+class CompiledConfig:
+    def __init__(self, raw, sites, errors):
+        self.raw = raw
+        self.settings = raw.get("settings", {})
+        self.sites = sites
+        self.errors = errors
+        self.hash = config_hash(raw)
+
+
+def compile_config(config):
+    sites = {}
+    errors = []
+
+    for site_name, site_cfg in config.get("sites", {}).items():
+        site_errors = validate_site(site_name, site_cfg)
+        if site_errors:
+            errors.extend(site_errors)
+            continue
+        sites[site_name] = SiteProgram(site_name, site_cfg)
+
+    for error in errors:
+        print(f"[-] Config: {error}")
+
+    return CompiledConfig(config, sites, errors)
+
+
+class ConfigStore:
+    """
+    Mantém a configuração compilada atual e a recarrega sem reiniciar o
+    servidor. A troca é atômica: jobs em andamento continuam com o
+    snapshot que pegaram, e um Config.json inválido é rejeitado inteiro.
+    """
+
+    def __init__(self, json_path=None):
+        self.path = json_path or default_config_path()
+        # No executável congelado o Config.json embutido é extraído num temp por execução:
+        # vigiar ou editar esse arquivo não serve de nada, só um --config explícito
+        self.watchable = json_path is not None or not getattr(sys, 'frozen', False)
+        self.raw = load_config(self.path)
+        self.current = None
+        self.lock = threading.Lock()
+        # Watcher e o comando reload_config podem recarregar ao mesmo tempo
+        self.reload_lock = threading.Lock()
+        self.listeners = []
+        self.mtime = self._mtime()
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+    def compile(self):
+        compiled = compile_config(self.raw)
+        with self.lock:
+            self.current = compiled
+        return compiled
+
+    def snapshot(self):
+        with self.lock:
+            return self.current
+
+    def subscribe(self, callback):
+        """callback(old, new, changes) após cada recarga bem-sucedida."""
+        self.listeners.append(callback)
+
+    def reload(self):
+        with self.reload_lock:
+            return self._reload()
+
+    def _reload(self):
+        try:
+            raw = read_config(self.path)
+        except (OSError, json.JSONDecodeError) as e:
+            return {"reloaded": False, "errors": [f"Falha ao ler {self.path}: {e}"]}
+
+        self.mtime = self._mtime()
+
+        errors = validate_root(raw)
+        if not errors:
+            for site_name, site_cfg in raw.get("sites", {}).items():
+                errors.extend(validate_site(site_name, site_cfg))
+        if errors:
+            for error in errors:
+                print(f"[-] Config: {error}")
+            return {"reloaded": False, "errors": errors}
+
+        new = compile_config(raw)
+        with self.lock:
+            old = self.current
+            self.current = new
+            self.raw = raw
+
+        changes = diff_configs(old, new)
+        if changes["unchanged_config"]:
+            return {"reloaded": True, **changes}
+
+        print(f"[+] Config recarregado: {changes}")
+        for callback in self.listeners:
+            try:
+                callback(old, new, changes)
+            except Exception as e:
+                print(f"[-] Erro ao aplicar config recarregado: {e}")
+
+        return {"reloaded": True, **changes}
+
+    def watch(self, interval=2.0):
+        if self.watcher:
+            return
+        if not self.watchable:
+            print("[-] Config embutido no executável: hot reload desabilitado (use --config)")
+            return
+
+        def run():
+            while not self.stop_event.wait(interval):
+                mtime = self._mtime()
+                if mtime is not None and mtime != self.mtime:
+                    print(f"[+] Mudança detectada em {self.path}")
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        # Fica o último config bom; a próxima mudança no arquivo tenta de novo
+                        self.mtime = mtime
+                        print(f"[-] Erro ao recarregar config: {e}")
+
+        self.watcher = threading.Thread(target=run, daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+
+def diff_configs(old, new):
+    old_sites = old.sites if old else {}
+    new_sites = new.sites
+
+    return {
+        "added": [name for name in new_sites if name not in old_sites],
+        "removed": [name for name in old_sites if name not in new_sites],
+        "changed": [name for name, site in new_sites.items()
+                    if name in old_sites and old_sites[name].hash != site.hash],
+        "settings_changed": bool(old) and old.settings != new.settings,
+        "unchanged_config": bool(old) and old.hash == new.hash,
+    }
@@ -0,0 +1,525 @@
+import collections
+import re
+import selectors
+import socket
+import threading
+import time
+
+
+DEFAULTS = {
+    "backlog": 128,
+    "idle_timeout": None,
+    "job_threads": 16,
+    "interactive_threads": 8,
+    "control_threads": 4,
+    "write_buffer_kb": 4096,
+    "max_request_kb": 1024,
+    "max_pending": 32,
+}
+
+_JSON_TOKEN = re.compile(rb'["\\{}\[\]]')
+_STRING_TOKEN = re.compile(rb'["\\]')
+_SPACE = b" \t\r\n"
+
+
+class Connection:
+    """
+    Estado de uma conexão de cliente no ConnectionLoop: buffer de leitura
+    (mensagens JSON sem framing, separadas pelo balanceamento de chaves),
+    fila de mensagens esperando o handler e buffer de escrita.
+
+    `write` pode ser chamado de qualquer thread. Acima de `write_buffer_kb`
+    pendentes, quem escreve espera o loop drenar o socket (controle de
+    fluxo): um cliente lento segura o job dele, não a memória do servidor.
+    """
+
+    def __init__(self, sock, addr, loop):
+        self.socket = sock
+        self.addr = addr
+        self.loop = loop
+        self.cond = threading.Condition()
+        self.inbuf = bytearray()
+        self.inbox = collections.deque()
+        self.busy = False
+        self.out = collections.deque()
+        self.out_bytes = 0
+        self.closed = False
+        self.closing = False
+        self.detached = False
+        self.events = 0
+        self.tokens = set()
+        self.last_activity = time.monotonic()
+        self._scan = (0, 0, False)
+
+    def write(self, data, block=True):
+        if not data:
+            return
+        with self.cond:
+            if self.closed or self.closing:
+                raise ConnectionResetError(f"Conexão com {self.addr} fechada")
+            self.last_activity = time.monotonic()
+
+            if not self.out:
+                # Buffer vazio: tenta mandar direto, sem passar pelo loop
+                try:
+                    sent = self.socket.send(data)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError:
+                    self.loop.request_close(self, "erro de escrita")
+                    raise
+                if sent == len(data):
+                    return
+                data = data[sent:]
+
+            self.out.append(bytes(data))
+            self.out_bytes += len(data)
+
+        self.loop.update(self)
+
+        if block:
+            with self.cond:
+                while self.out_bytes > self.loop.high_water and not self.closed:
+                    self.cond.wait(1.0)
+                if self.closed:
+                    raise ConnectionResetError(f"Conexão com {self.addr} fechada")
+
+    def sendall(self, data):
+        # Mesma assinatura do socket, para ResponseStream e FramedResponseStream
+        self.write(data)
+
+    def watch(self, token):
+        """Cancela o token (motivo "disconnect") se a conexão cair."""
+        with self.cond:
+            if self.closed:
+                token.cancel("disconnect")
+            else:
+                self.tokens.add(token)
+
+    def unwatch(self, token):
+        with self.cond:
+            self.tokens.discard(token)
+
+    def close_after_flush(self):
+        with self.cond:
+            self.closing = True
+        self.loop.update(self)
+
+    def detach(self, timeout=5.0):
+        """
+        Tira a conexão do loop e devolve o socket em modo bloqueante, para
+        quem vai ler dele diretamente (o Coordinator com um WorkerNode).
+        """
+        done = threading.Event()
+        self.loop.call(lambda: self.loop._detach(self, done))
+        if not done.wait(timeout):
+            raise TimeoutError("Loop de conexões não respondeu")
+        return self.socket
+
+    def _flush(self):
+        """Chamado pelo loop quando o socket aceita escrita. Erros de socket sobem para o loop."""
+        with self.cond:
+            while self.out:
+                chunk = self.out[0]
+                try:
+                    sent = self.socket.send(chunk)
+                except (BlockingIOError, InterruptedError):
+                    break
+                self.out_bytes -= sent
+                if sent < len(chunk):
+                    self.out[0] = chunk[sent:]
+                    break
+                self.out.popleft()
+            self.last_activity = time.monotonic()
+            self.cond.notify_all()
+
+    def _messages(self, max_size):
+        """Separa as mensagens completas que já estão no buffer de leitura."""
+        buf = self.inbuf
+        messages = []
+
+        while buf:
+            start = 0
+            while start < len(buf) and buf[start] in _SPACE:
+                start += 1
+            if start == len(buf):
+                buf.clear()
+                break
+            if start:
+                del buf[:start]
+                self._scan = (0, 0, False)
+
+            if buf[0] not in b"{[":
+                # Texto solto (ex.: SHUTDOWN_SERVER de clientes antigos): uma leitura, uma mensagem
+                messages.append(bytes(buf))
+                buf.clear()
+                break
+
+            pos, depth, in_string = self._scan
+            end = None
+            while True:
+                match = (_STRING_TOKEN if in_string else _JSON_TOKEN).search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                pos = match.start()
+                token = buf[pos]
+                if in_string:
+                    if token == 0x5C:  # \
+                        if pos + 1 >= len(buf):
+                            break  # Escape cortado no fim da leitura
+                        pos += 2
+                        continue
+                    in_string = False
+                elif token == 0x22:  # "
+                    in_string = True
+                elif token in b"{[":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        end = pos + 1
+                        break
+                pos += 1
+
+            if end is None:
+                self._scan = (pos, depth, in_string)
+                if len(buf) > max_size:
+                    raise ValueError(f"mensagem maior que {max_size // 1024}KB")
+                break
+
+            messages.append(bytes(buf[:end]))
+            del buf[:end]
+            self._scan = (0, 0, False)
+
+        return messages
+
+
+class ConnectionLoop:
+    """
+    Camada de conexões do Server: um único thread com `selectors` aceita,
+    lê e escreve em todos os sockets, então clientes conectados e ociosos
+    não custam um thread cada. Aceita em vários listeners (TCP e socket
+    Unix local), todos com o mesmo protocolo.
+
+    Cada mensagem recebida vai para `dispatch(conn, data)`, que devolve um
+    Future (o handler roda num pool do Server). As mensagens de uma mesma
+    conexão são tratadas em ordem, uma por vez; as que chegam durante um
+    job ficam na fila da conexão, até `max_pending`, e aí a leitura pausa.
+
+    `idle_timeout` (segundos; 0/null desliga, o padrão) fecha conexões sem
+    tráfego nem job em andamento. A GUI fica conectada ociosa por horas,
+    então só vale ligar em servidores que atendem clientes de script.
+    """
+
+    def __init__(self, listeners, settings=None, dispatch=None, connection_factory=Connection,
+                 on_open=None, on_close=None):
+        self.settings = {**DEFAULTS, **(settings or {})}
+        self.listeners = list(listeners)
+        self.dispatch = dispatch
+        self.connection_factory = connection_factory
+        self.on_open = on_open
+        self.on_close = on_close
+        self.high_water = int(self.settings["write_buffer_kb"]) * 1024
+        self.max_request = int(self.settings["max_request_kb"]) * 1024
+        self.max_pending = int(self.settings["max_pending"])
+        idle_timeout = self.settings["idle_timeout"]
+        self.idle_timeout = float(idle_timeout) if idle_timeout else None
+
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self.calls = collections.deque()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.waker_r, self.waker_w = socket.socketpair()
+        self.waker_r.setblocking(False)
+        self.waker_w.setblocking(False)
+        self.stopping = False
+        self.stop_deadline = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        for listener in self.listeners:
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ, None)
+        self.selector.register(self.waker_r, selectors.EVENT_READ, None)
+
+        try:
+            while not self._finished():
+                for key, mask in self.selector.select(timeout=1.0):
+                    if key.fileobj is self.waker_r:
+                        self._drain_waker()
+                    elif key.data is None:
+                        self._accept(key.fileobj)
+                    else:
+                        conn = key.data
+                        if mask & selectors.EVENT_READ:
+                            self._read(conn)
+                        if mask & selectors.EVENT_WRITE and not conn.closed:
+                            try:
+                                conn._flush()
+                            except OSError as e:
+                                # Cliente resetou no meio da resposta: só essa conexão cai, não o loop
+                                self._close(conn, f"erro de escrita: {e}")
+                                continue
+                            self._refresh(conn)
+
+                self._run_calls()
+                self._expire_idle()
+        finally:
+            for conn in list(self.connections):
+                self._close(conn, "servidor encerrando")
+            for sock in (*self.listeners, self.waker_r):
+                try:
+                    self.selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+            self._close_listeners()
+            self.selector.close()
+            self.waker_r.close()
+            self.waker_w.close()
+            self.stopped.set()
+
+    def _finished(self):
+        if not self.stopping:
+            return False
+        # Encerrando: espera os buffers de saída (aviso de shutdown) até o prazo
+        if time.monotonic() >= self.stop_deadline:
+            return True
+        return not any(conn.out for conn in self.connections)
+
+    def stop(self, timeout=2.0):
+        """Para de aceitar conexões e encerra o loop depois de drenar as saídas (até `timeout`)."""
+        if self.stopped.is_set():
+            return
+        self.call(lambda: self._begin_stop(timeout))
+        self.stopped.wait(timeout + 2.0)
+
+    def _begin_stop(self, timeout):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + timeout
+        for listener in self.listeners:
+            try:
+                self.selector.unregister(listener)
+            except (KeyError, ValueError):
+                pass
+        self._close_listeners()
+
+    def _close_listeners(self):
+        for listener in self.listeners:
+            try:
+                listener.close()
+            except OSError:
+                pass
+
+    # Chamadas de outros threads: enfileiram e acordam o select
+
+    def call(self, fn):
+        self.calls.append(fn)
+        self._wake()
+
+    def update(self, conn):
+        with self.pending_lock:
+            self.pending.add(conn)
+        self._wake()
+
+    def request_close(self, conn, reason):
+        self.call(lambda: self._close(conn, reason))
+
+    def _wake(self):
+        try:
+            self.waker_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            pass  # Já tem byte pendente: o loop vai acordar de qualquer jeito
+        except OSError:
+            pass
+
+    def _drain_waker(self):
+        try:
+            while self.waker_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _run_calls(self):
+        while self.calls:
+            self.calls.popleft()()
+
+        with self.pending_lock:
+            pending, self.pending = self.pending, set()
+        for conn in pending:
+            if not conn.closed:
+                self._refresh(conn)
+
+    # Loop
+
+    def _accept(self, listener):
+        for _ in range(64):
+            try:
+                sock, addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"[-] Erro no accept: {e}")
+                return
+
+            sock.setblocking(False)
+            if not addr:
+                # Socket Unix: o cliente não tem endereço, identifica pelo fd
+                addr = ("unix", sock.fileno())
+            conn = self.connection_factory(sock, addr, self)
+            with self.connections_lock:
+                self.connections.add(conn)
+            self._refresh(conn)
+            if self.on_open:
+                self.on_open(conn)
+
+    def _read(self, conn):
+        try:
+            data = conn.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._close(conn, f"erro de leitura: {e}")
+            return
+
+        if not data:
+            self._close(conn, "cliente desconectou")
+            return
+
+        conn.last_activity = time.monotonic()
+        conn.inbuf += data
+        try:
+            messages = conn._messages(self.max_request)
+        except ValueError as e:
+            print(f"[-] {conn.addr}: {e}")
+            self._close(conn, "requisição grande demais")
+            return
+
+        conn.inbox.extend(messages)
+        self._next(conn)
+        self._refresh(conn)
+
+    def _next(self, conn):
+        if conn.busy or conn.closed or conn.detached or not conn.inbox:
+            return
+        if conn.closing or self.stopping:
+            conn.inbox.clear()
+            return
+
+        conn.busy = True
+        data = conn.inbox.popleft()
+        try:
+            future = self.dispatch(conn, data)
+        except Exception as e:
+            print(f"[-] Falha ao despachar mensagem de {conn.addr}: {e}")
+            conn.busy = False
+            self._close(conn, "erro interno")
+            return
+        future.add_done_callback(lambda f, conn=conn: self.call(lambda: self._done(conn, f)))
+
+    def _done(self, conn, future):
+        conn.busy = False
+        conn.last_activity = time.monotonic()
+        keep_open = True
+        if not future.cancelled() and future.exception() is None:
+            keep_open = future.result() is not False
+
+        if conn.detached:
+            # O handler ficou com o socket (worker remoto) e terminou com ele
+            self._close(conn, "conexão de worker encerrada")
+            return
+        if not keep_open:
+            with conn.cond:
+                conn.closing = True
+        self._next(conn)
+        self._refresh(conn)
+
+    def _refresh(self, conn):
+        """Ajusta os eventos do selector ao estado da conexão (ler, escrever, fechar)."""
+        if conn.closed or conn.detached:
+            return
+        if conn.closing and not conn.out and not conn.busy:
+            self._close(conn, "encerrada pelo servidor")
+            return
+
+        events = 0
+        if not conn.closing and len(conn.inbox) < self.max_pending:
+            events |= selectors.EVENT_READ
+        if conn.out:
+            events |= selectors.EVENT_WRITE
+        if events == conn.events:
+            return
+
+        try:
+            if conn.events == 0:
+                self.selector.register(conn.socket, events, conn)
+            elif events == 0:
+                self.selector.unregister(conn.socket)
+            else:
+                self.selector.modify(conn.socket, events, conn)
+        except (KeyError, ValueError, OSError) as e:
+            self._close(conn, f"erro no selector: {e}")
+            return
+        conn.events = events
+
+    def _expire_idle(self):
+        if not self.idle_timeout:
+            return
+        limit = time.monotonic() - self.idle_timeout
+        for conn in list(self.connections):
+            if not conn.busy and not conn.inbox and not conn.out and not conn.detached and conn.last_activity < limit:
+                self._close(conn, f"ociosa por mais de {self.idle_timeout:.0f}s")
+
+    def _detach(self, conn, done):
+        if conn.events:
+            try:
+                self.selector.unregister(conn.socket)
+            except (KeyError, ValueError):
+                pass
+            conn.events = 0
+        conn.detached = True
+        conn.socket.setblocking(True)
+        done.set()
+
+    def _close(self, conn, reason):
+        if conn.closed:
+            return
+        if conn.events:
+            try:
+                self.selector.unregister(conn.socket)
+            except (KeyError, ValueError):
+                pass
+            conn.events = 0
+
+        with conn.cond:
+            conn.closed = True
+            tokens, conn.tokens = list(conn.tokens), set()
+            conn.out.clear()
+            conn.out_bytes = 0
+            conn.inbox.clear()
+            conn.cond.notify_all()
+
+        for token in tokens:
+            token.cancel("disconnect")
+        try:
+            conn.socket.close()
+        except OSError:
+            pass
+
+        with self.connections_lock:
+            self.connections.discard(conn)
+        if self.on_close:
+            self.on_close(conn, reason)
+
+    def status(self):
+        with self.connections_lock:
+            connections = list(self.connections)
+        return {
+            "open": len(connections),
+            "busy": sum(1 for conn in connections if conn.busy),
+            "buffered_kb": round(sum(conn.out_bytes for conn in connections) / 1024, 1),
+        }
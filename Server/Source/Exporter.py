@@ -0,0 +1,187 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _label(text):
+    return str(text).strip().rstrip(":").strip()
+
+
+def _item_columns(group_name, item, members_cfg):
+    """
+    Colunas de um item. Um membro lista com `not_reorder` apontando para
+    outro membro lista traz os valores dos rótulos desse membro (ex.: os
+    campos da ementa): cada par rótulo/valor vira a coluna grupo:rótulo.
+    As demais listas ficam inteiras numa coluna grupo:membro.
+    """
+    row = {}
+    paired = set()
+    for key, member_value in item.items():
+        labels_key = (members_cfg.get(key) or {}).get("not_reorder")
+        labels = item.get(labels_key)
+        if not (isinstance(member_value, list) and isinstance(labels, list)):
+            continue
+        paired.update((key, labels_key))
+        for label, value in zip(labels, member_value):
+            column = f"{group_name}:{_label(label)}"
+            suffix = 2
+            while column in row:
+                column = f"{group_name}:{_label(label)} ({suffix})"
+                suffix += 1
+            row[column] = value
+
+    for key, member_value in item.items():
+        if key in paired:
+            continue
+        if _is_scalar(member_value) or (isinstance(member_value, list) and all(_is_scalar(v) for v in member_value)):
+            row[f"{group_name}:{key}"] = member_value
+    return row
+
+
+def _expand(group_name, value, groups):
+    """
+    Linhas planas de um valor do DataOrganizer: uma por item folha. Os
+    campos de cada item viram colunas da mesma linha e cada item filho
+    gera uma linha com as colunas do item pai.
+    """
+    if isinstance(value, list):
+        rows = []
+        for element in value:
+            rows.extend(_expand(group_name, element, groups))
+        return rows
+
+    if not isinstance(value, dict):
+        return [{group_name: value}] if value is not None else []
+
+    children = [
+        (key, member_value) for key, member_value in value.items()
+        if key in groups and groups[key].get("parent_group") == group_name
+    ]
+    item = {key: member_value for key, member_value in value.items() if key not in dict(children)}
+    rows = [_item_columns(group_name, item, groups.get(group_name, {}).get("members", {}))]
+
+    for child_name, child_value in children:
+        child_rows = _expand(child_name, child_value, groups)
+        if child_rows:
+            rows = [{**row, **child_row} for row in rows for child_row in child_rows]
+
+    return rows
+
+
+def flatten_rows(site_cfg, organized):
+    """Uma linha por item folha (ex.: a ementa de cada processo), com colunas grupo:membro ou grupo:rótulo."""
+    groups = site_cfg.get("groups", {})
+    for group_name, group_cfg in groups.items():
+        if group_cfg.get("parent_group") is None and group_name in organized:
+            yield from _expand(group_name, organized[group_name], groups)
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def resolve_format(name="auto"):
+    if name == "parquet" and pyarrow is None:
+        raise RuntimeError("Formato 'parquet' requer pyarrow instalado")
+    if name == "auto":
+        return "parquet" if pyarrow is not None else "jsonl"
+    if name not in ("parquet", "jsonl"):
+        raise ValueError(f"Formato de exportação desconhecido: {name}")
+    return name
+
+
+class ChunkedExporter:
+    """
+    Exporta resultados achatados em arquivos part-NNNNN (Parquet com
+    pyarrow, senão JSONL gzip), gravando um arquivo a cada `chunk_rows`
+    linhas para nunca manter o resultado inteiro em memória.
+    """
+
+    def __init__(self, directory, format="auto", chunk_rows=5000):
+        self.format = resolve_format(format)
+        self.directory = directory
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.buffer = []
+        self.files = []
+        self.rows_written = 0
+        self.closed = False
+        # Batches com workers remotos chamam add de várias threads
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, site_name, site_cfg, search_term, organized):
+        rows = [{"site": site_name, "search_term": search_term, **row} for row in flatten_rows(site_cfg, organized)]
+        with self.lock:
+            for row in rows:
+                self.buffer.append(row)
+                if len(self.buffer) >= self.chunk_rows:
+                    self.flush()
+        return len(rows)
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        rows, self.buffer = self.buffer, []
+        extension = "parquet" if self.format == "parquet" else "jsonl.gz"
+        path = os.path.join(self.directory, f"part-{len(self.files):05d}.{extension}")
+
+        if self.format == "parquet":
+            self._write_parquet(path, rows)
+        else:
+            with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as arquivo:
+                for row in rows:
+                    arquivo.write(json.dumps(row, ensure_ascii=False, default=str))
+                    arquivo.write("\n")
+
+        self.files.append(path)
+        self.rows_written += len(rows)
+
+    def _write_parquet(self, path, rows):
+        columns = {}
+        for row in rows:
+            for key in row:
+                columns.setdefault(key, None)
+
+        # Colunas sempre como texto: os sites devolvem strings e o schema
+        # fica estável entre partes (DuckDB/pandas leem com union_by_name)
+        schema = pyarrow.schema([(name, pyarrow.string()) for name in columns])
+        data = {
+            name: [_text(row.get(name)) for row in rows]
+            for name in columns
+        }
+        table = pyarrow.Table.from_pydict(data, schema=schema)
+        pyarrow.parquet.write_table(table, path, compression="zstd")
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.closed = True
+        return {
+            "format": self.format,
+            "directory": self.directory,
+            "files": self.files,
+            "rows": self.rows_written,
+        }
+
+
+def export_dir(base_dir, kind):
+    os.makedirs(base_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}-", dir=base_dir)
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_items (
+    site TEXT NOT NULL,
+    query TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (site, query, item_key)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_query(search_term):
+    return " ".join(search_term.split()).lower()
+
+
+def key_config(site_cfg, section="incremental"):
+    """
+    Grupo raiz e membro cujo texto identifica um item (ex.: o link do
+    processo). Usa site.<section> quando configurado, senão o primeiro
+    membro do primeiro grupo raiz.
+    """
+    groups = site_cfg.get("groups", {})
+    cfg = site_cfg.get(section, {})
+
+    group_name = cfg.get("key_group")
+    if group_name is None:
+        group_name = next((name for name, group in groups.items() if group.get("parent_group") is None), None)
+    if group_name is None:
+        return None, None
+
+    member = cfg.get("key_member")
+    if member is None:
+        member = next(iter(groups.get(group_name, {}).get("members", {})), None)
+
+    return group_name, member
+
+
+def extract_keys(html, site_cfg, key_member):
+    """
+    Chaves de uma página com o mesmo pós-processamento (not, trim, ...)
+    que o DataOrganizer aplica ao membro, para comparar com as guardadas.
+    """
+    # ParserEngine só é importado no primeiro job, para não atrasar o bind do socket
+    from ParserEngine import UniversalParser, DataOrganizer
+
+    parser = UniversalParser(site_cfg)
+    parser.feed(html)
+    return [key for key in DataOrganizer(site_cfg).member_texts(parser.result(), key_member) if key]
+
+
+def filter_new(organized, group_name, member, known):
+    """Remove do grupo raiz os itens cuja chave já foi vista. Retorna (resultado, chaves novas)."""
+    items = organized.get(group_name)
+    if not isinstance(items, list):
+        return organized, []
+
+    fresh = []
+    new_keys = []
+    for item in items:
+        key = item.get(member) if isinstance(item, dict) else None
+        if key and (key in known or key in new_keys):
+            continue
+        fresh.append(item)
+        if key:
+            new_keys.append(key)
+
+    return {**organized, group_name: fresh}, new_keys
+
+
+class SeenIndex:
+    """
+    Índice local das chaves já entregues por (site, consulta), usado pelo
+    modo incremental para parar a paginação e devolver só itens novos.
+    O banco só é criado no primeiro uso (primeiro job incremental).
+    """
+
+    def __init__(self, path="state/seen_items.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def conn(self):
+        # Chamado com self.lock já adquirido
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def known(self, site_name, search_term, keys=None):
+        query = normalize_query(search_term)
+        with self.lock:
+            if keys is None:
+                rows = self.conn.execute(
+                    "SELECT item_key FROM seen_items WHERE site = ? AND query = ?", (site_name, query)
+                ).fetchall()
+            else:
+                keys = list(keys)
+                rows = []
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows += self.conn.execute(
+                        f"SELECT item_key FROM seen_items WHERE site = ? AND query = ? AND item_key IN ({marks})",
+                        (site_name, query, *chunk)
+                    ).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, site_name, search_term, keys):
+        query = normalize_query(search_term)
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_items (site, query, item_key, first_seen) VALUES (?, ?, ?, ?)",
+                [(site_name, query, key, now) for key in keys]
+            )
+            self.conn.commit()
+
+    def forget(self, site_name, search_term):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM seen_items WHERE site = ? AND query = ?", (site_name, normalize_query(search_term))
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
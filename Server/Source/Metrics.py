@@ -0,0 +1,246 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        for idx, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[idx] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 6),
+            "avg_s": round(self.total / self.count, 6) if self.count else None,
+            "min_s": round(self.min, 6) if self.min is not None else None,
+            "max_s": round(self.max, 6),
+        }
+
+
+class Metrics:
+    """
+    Registro de spans por estágio e contadores do servidor.
+
+    Cada requisição abre um RequestTrace; os spans dele alimentam as
+    estatísticas agregadas por estágio e o trace completo fica nos
+    últimos `keep_traces` registros.
+    """
+
+    def __init__(self, keep_traces=50):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.labeled_gauges = {}
+        self.traces = deque(maxlen=keep_traces)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.observe(seconds)
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            if labels:
+                # Uma série por combinação de labels, com o nome da métrica fixo
+                self.labeled_gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+            else:
+                self.gauges[name] = value
+
+    def trace(self, kind, **info):
+        return RequestTrace(self, kind, **info)
+
+    def record_trace(self, trace):
+        with self.lock:
+            self.traces.append(trace)
+
+    def snapshot(self, traces=10):
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started_at, 3),
+                "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "gauges": {
+                    **self.gauges,
+                    **{
+                        name: {",".join(f"{key}={val}" for key, val in labels): value
+                               for labels, value in series.items()}
+                        for name, series in self.labeled_gauges.items()
+                    },
+                },
+                "recent": list(self.traces)[-traces:] if traces else [],
+            }
+
+    def prometheus(self, prefix="jurisdata"):
+        lines = []
+        with self.lock:
+            lines.append(f"# TYPE {prefix}_uptime_seconds gauge")
+            lines.append(f"{prefix}_uptime_seconds {time.time() - self.started_at:.3f}")
+
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for name, stats in sorted(self.stages.items()):
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats.total:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats.count}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+
+            for name, series in sorted(self.labeled_gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                for labels, value in sorted(series.items()):
+                    rendered = ",".join(f'{key}="{label_value(val)}"' for key, val in labels)
+                    lines.append(f"{prefix}_{name}{{{rendered}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    def __init__(self, metrics, kind, **info):
+        self.metrics = metrics
+        self.kind = kind
+        self.info = info
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.finished = False
+
+    @contextmanager
+    def span(self, name, **info):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, **info)
+
+    def add(self, name, seconds, **info):
+        entry = {"stage": name, "s": round(seconds, 6)}
+        if info:
+            entry.update(info)
+        self.spans.append(entry)
+        if self.metrics:
+            self.metrics.observe(name, seconds)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self.metrics:
+            self.metrics.incr(name, value)
+
+    def finish(self, success=True):
+        if self.finished:
+            return self.to_dict()
+        self.finished = True
+
+        total = time.perf_counter() - self.started
+        if self.metrics:
+            self.metrics.observe(f"{self.kind}_total", total)
+            self.metrics.incr(f"{self.kind}_{'ok' if success else 'failed'}")
+            self.metrics.record_trace(self.to_dict(total, success))
+        return self.to_dict(total, success)
+
+    def to_dict(self, total=None, success=None):
+        return {
+            "kind": self.kind,
+            **self.info,
+            "total_s": round(total if total is not None else time.perf_counter() - self.started, 6),
+            "success": success,
+            "spans": list(self.spans),
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        totals = {}
+        for entry in self.spans:
+            totals[entry["stage"]] = totals.get(entry["stage"], 0.0) + entry["s"]
+        return ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in totals.items())
+
+
+def span(trace, name, **info):
+    """Span opcional: sem trace vira um contexto vazio."""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, **info)
+
+
+def count(trace, name, value=1):
+    if trace is not None:
+        trace.count(name, value)
+
+
+def _metrics_handler():
+    # http.server só é importado quando o endpoint é habilitado
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+
+            body = self.server.metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+class MetricsHttpServer:
+    """Endpoint texto no formato do Prometheus, só em localhost."""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        from http.server import ThreadingHTTPServer
+
+        self.httpd = ThreadingHTTPServer((host, port), _metrics_handler())
+        self.httpd.daemon_threads = True
+        self.httpd.metrics = metrics
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        host, port = self.httpd.server_address[:2]
+        print(f"[+] Métricas em http://{host}:{port}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULTS = {
+    "max_entries": 512,
+    "max_mb": 256,
+    "dir": None,
+    "max_age_hours": 168,
+    "max_pending_writes": 64,
+}
+
+# Muda quando o formato em disco muda; o marshal também depende da versão do Python
+DISK_FORMAT = (1, sys.version_info[0], sys.version_info[1])
+
+
+class PageFragment:
+    """
+    Selector map de uma página: chaves na ordem de aparição, tabela de
+    textos deduplicada e, por chave, o array de índices nessa tabela.
+    Imutável depois de criado (é compartilhado entre jobs pelo cache).
+    """
+
+    __slots__ = ("keys", "texts", "ids", "size")
+
+    def __init__(self, keys, texts, ids):
+        self.keys = keys
+        self.texts = texts
+        self.ids = ids
+        # Estimativa grosseira do que o fragmento ocupa em memória
+        self.size = (
+            sum(len(text) + 50 for text in texts)
+            + sum(len(key) + 60 + ids_.itemsize * len(ids_) for key, ids_ in zip(keys, ids))
+        )
+
+    def to_bytes(self):
+        payload = (DISK_FORMAT, list(self.keys), list(self.texts), [ids.tobytes() for ids in self.ids])
+        return zlib.compress(marshal.dumps(payload), 6)
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, keys, texts, raw_ids = marshal.loads(zlib.decompress(data))
+        if tuple(version) != DISK_FORMAT:
+            raise ValueError(f"formato {version} incompatível")
+        ids = []
+        for raw in raw_ids:
+            values = array("I")
+            values.frombytes(raw)
+            ids.append(values)
+        return cls(tuple(sys.intern(key) for key in keys), texts, ids)
+
+
+def options_hash(options):
+    canonical = json.dumps(options, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class ParseCache:
+    """
+    Cache do selector map de cada página, pela hash do conteúdo mais as
+    opções do parser que mudam o resultado. Refazer a mesma busca (ou a
+    mesma com outros `groups`) só roda de novo o DataOrganizer.
+
+    Em memória é um LRU limitado por entradas e por MB estimados; com
+    `dir`, cada fragmento também vai para disco (marshal + zlib) e
+    sobrevive a reinícios, até `max_age_hours`. A gravação (marshal + zlib
+    + escrita) roda numa thread própria, fora do parse da requisição; com
+    mais de `max_pending_writes` na fila, a página só fica em memória.
+    """
+
+    def __init__(self, settings=None, metrics=None):
+        self.settings = {**DEFAULTS, **(settings or {})}
+        self.max_entries = int(self.settings["max_entries"])
+        self.max_bytes = int(self.settings["max_mb"] * 1024 * 1024)
+        self.dir = self.settings["dir"]
+        self.max_age = self.settings["max_age_hours"] * 3600
+        self.metrics = metrics
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writer = None
+        self.pending_writes = threading.BoundedSemaphore(max(1, int(self.settings["max_pending_writes"])))
+
+        if self.dir:
+            os.makedirs(self.dir, exist_ok=True)
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse-cache-write")
+
+    def key(self, html, options):
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+        digest = hashlib.blake2b(html, digest_size=16)
+        digest.update(options.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            fragment = self.entries.get(key)
+            if fragment is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if fragment is not None:
+            self._incr("parse_cache_hits")
+            return fragment
+
+        fragment = self._load(key)
+        if fragment is None:
+            with self.lock:
+                self.misses += 1
+            self._incr("parse_cache_misses")
+            return None
+
+        with self.lock:
+            self.disk_hits += 1
+        self._incr("parse_cache_disk_hits")
+        self._remember(key, fragment)
+        return fragment
+
+    def put(self, key, fragment):
+        self._remember(key, fragment)
+        if self.writer is None:
+            return
+        if not self.pending_writes.acquire(blocking=False):
+            self._incr("parse_cache_writes_skipped")
+            return
+        try:
+            self.writer.submit(self._store_pending, key, fragment)
+        except RuntimeError:
+            self.pending_writes.release()  # Cache já fechado
+
+    def _store_pending(self, key, fragment):
+        try:
+            self._store(key, fragment)
+        finally:
+            self.pending_writes.release()
+
+    def _remember(self, key, fragment):
+        if fragment.size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self.entries[key] = fragment
+            self.bytes += fragment.size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+
+    def _path(self, key):
+        return os.path.join(self.dir, f"{key}.bin")
+
+    def _load(self, key):
+        if not self.dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                fragment = PageFragment.from_bytes(f.read())
+            # Usado agora: o prune por idade conta a partir do último acesso
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass  # O prune em background levou o arquivo; o fragmento já está lido
+            return fragment
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, EOFError, zlib.error) as e:
+            print(f"[-] Cache de parse corrompido ({key}): {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _store(self, key, fragment):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(fragment.to_bytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[-] Falha ao gravar cache de parse: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def prune(self):
+        if not self.dir or not self.max_age:
+            return 0
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for entry in os.scandir(self.dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def prune_in_background(self):
+        """Varre o diretório numa thread: com muitos arquivos o scandir atrasaria o boot."""
+        if not self.dir or not self.max_age:
+            return None
+
+        def run():
+            removed = self.prune()
+            if removed:
+                print(f"[+] Cache de parse: {removed} arquivos expirados removidos")
+
+        thread = threading.Thread(target=run, name="parse-cache-prune", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Espera as gravações pendentes (chamado no stop do Server)."""
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+
+    def _incr(self, name):
+        if self.metrics:
+            self.metrics.incr(name)
+
+    def status(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "mb": round(self.bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "dir": self.dir,
+            }
@@ -1,115 +1,505 @@
-from parsel import Selector
+import threading
+from array import array
+from collections import ChainMap
+from collections.abc import Mapping
+import sys
 import time
 import re
 import os
 import json
 
+from lxml import etree
+import lxml.html
+
+from Metrics import span, count
+from ParseCache import PageFragment, options_hash
+
+
+_local = threading.local()
+
+STREAM_CHUNK = 64 * 1024
+
+# site.parser: "dom" (árvore inteira), "stream" (HTMLPullParser) ou "auto"
+# (stream só para páginas a partir de stream_threshold_kb)
+DEFAULT_PARSER = {
+    "backend": "dom",
+    "stream_threshold_kb": 2048,
+    # Limites da combinação elemento x ancestrais (None / [] = sem limite).
+    # Seletores usados em groups (membros, not, not_reorder) nunca são cortados.
+    "max_ancestors": None,
+    "ancestor_class_allow": [],
+    "ancestor_class_deny": [],
+    "skip_tags": [],
+    "max_selectors": None,
+}
+
+# Versão do selector map guardado no ParseCache: mudar quando a extração mudar
+PARSE_CACHE_VERSION = 1
+
+# normalize-space do XPath só trata espaço, tab, CR e LF (o &nbsp; continua no texto)
+_SPACE_RUN = re.compile(r"[ \t\r\n]+")
+
+
+def _normalize_space(element):
+    # XPath compilado uma vez por thread (avaliadores do lxml não são compartilháveis entre threads)
+    xpath = getattr(_local, "normalize_space", None)
+    if xpath is None:
+        xpath = _local.normalize_space = etree.XPath("normalize-space(.)", smart_strings=False)
+    return xpath(element)
+
+
+def _string_value(element):
+    xpath = getattr(_local, "string_value", None)
+    if xpath is None:
+        xpath = _local.string_value = etree.XPath("string(.)", smart_strings=False)
+    return xpath(element)
+
+
+def html_root(html):
+    """
+    Árvore lxml de uma página, parseada direto dos bytes UTF-8 (o mesmo
+    parser HTML que o parsel usa, sem a cópia em str). Aceita str também.
+    """
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    if b"\x00" in html:
+        html = html.replace(b"\x00", b"")
+    if not html or html.isspace():
+        html = b"<html/>"
+
+    parser = lxml.html.HTMLParser(recover=True, encoding="utf-8", huge_tree=True)
+    root = etree.fromstring(html, parser=parser)
+    return root if root is not None else etree.fromstring(b"<html/>", parser=parser)
+
+
+class SelectorMap(Mapping):
+    """
+    Selector map compacto: cada seletor guarda um array de índices numa
+    tabela de textos deduplicada, em vez de uma lista de strings.
+
+    Para quem lê é um Mapping comum (seletor -> lista de textos); a lista é
+    montada no primeiro acesso ao seletor e reaproveitada nos seguintes.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.text_ids = {}
+        self.entries = {}
+        self._lists = {}
+
+    def text_id(self, text):
+        text_id = self.text_ids.get(text)
+        if text_id is None:
+            text_id = self.text_ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+
+    def add(self, key, text_id):
+        ids = self.entries.get(key)
+        if ids is None:
+            self.entries[key] = array("I", (text_id,))
+        else:
+            ids.append(text_id)
+
+    def extend(self, key, text_ids):
+        ids = self.entries.get(key)
+        if ids is None:
+            self.entries[key] = array("I", text_ids)
+        else:
+            ids.extend(text_ids)
+        self._lists.pop(key, None)
+
+    def fragment(self):
+        return PageFragment(tuple(self.entries), self.texts, list(self.entries.values()))
+
+    def merge(self, fragment):
+        """Acrescenta o selector map de uma página (PageFragment) depois do que já existe."""
+        remap = [self.text_id(text) for text in fragment.texts]
+        for key, ids in zip(fragment.keys, fragment.ids):
+            self.extend(key, [remap[i] for i in ids])
+
+    def texts_for(self, key):
+        """Lista nova com os textos do seletor, sem guardar no cache de listas."""
+        texts = self.texts
+        return [texts[i] for i in self.entries[key]]
+
+    def __getitem__(self, key):
+        texts = self._lists.get(key)
+        if texts is None:
+            texts = self._lists[key] = self.texts_for(key)
+        return texts
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {
+            "keys": len(self.entries),
+            "entries": sum(len(ids) for ids in self.entries.values()),
+            "distinct_texts": len(self.texts),
+        }
+
+    def dump(self, file):
+        """Mesmo JSON do json.dump(..., indent=4), escrito um seletor por vez."""
+        if not self.entries:
+            file.write("{}")
+            return
+        file.write("{\n")
+        for position, key in enumerate(self.entries):
+            if position:
+                file.write(",\n")
+            file.write(json.dumps({key: self.texts_for(key)}, indent=4)[2:-2])
+        file.write("\n}")
+
+
+def configured_selectors(site_cfg):
+    """Seletores que o DataOrganizer lê: membros dos grupos e alvos de not/not_reorder."""
+    selectors = set()
+    for group_cfg in site_cfg.get("groups", {}).values():
+        for member, member_cfg in group_cfg.get("members", {}).items():
+            selectors.add(member)
+            if isinstance(member_cfg, dict):
+                for option in ("not", "not_reorder"):
+                    if member_cfg.get(option):
+                        selectors.add(member_cfg[option])
+    return selectors
+
 
 class UniversalParser:
-    def __init__(self, site_cfg):
+    def __init__(self, site_cfg, cache=None):
         self.cfg = site_cfg
         self.url = site_cfg.get("url", "")
+        self.parser_cfg = cfg = {**DEFAULT_PARSER, **site_cfg.get("parser", {})}
+
+        self.max_ancestors = cfg["max_ancestors"]
+        self.class_allow = set(cfg["ancestor_class_allow"])
+        self.class_deny = set(cfg["ancestor_class_deny"])
+        self.skip_tags = set(cfg["skip_tags"])
+        self.max_selectors = cfg["max_selectors"]
+        self.limit_ancestors = self.max_ancestors is not None or bool(self.class_allow or self.class_deny)
+
+        self.protected = configured_selectors(site_cfg)
+        # Ancestral de uma chave configurada ("#a td" -> "#a") passa por todos os filtros
+        self.protected_ancestors = {selector.split(" ", 1)[0] for selector in self.protected if " " in selector}
+
+        self.cache = cache
+        self.cache_options = None
+        if cache is not None and self.max_selectors is None:
+            # Com max_selectors o map de uma página depende das anteriores: não dá para cachear
+            options = {k: v for k, v in cfg.items() if k not in ("backend", "stream_threshold_kb")}
+            if self.limit_ancestors or self.skip_tags:
+                options["protected"] = sorted(self.protected)
+            options["version"] = PARSE_CACHE_VERSION
+            self.cache_options = options_hash(options)
+        self.reset()
+
+    def reset(self):
+        self.selector_map = SelectorMap()
+        self.pages_fed = 0
+        # Cadeias de seletores ancestrais (id 0 = sem ancestrais) e chaves já
+        # montadas, reaproveitadas por elementos com os mesmos atributos
+        self._chains = [()]
+        self._chain_ids = {(): 0}
+        self._child_chains = {}
+        self._keys = {}
+        self._limited = {}
+        self._admitted = set()
+        self.dropped = 0
+        self.cache_hits = 0
 
     async def parse(self, pages_html):
-        selector_map = {}
-        element_order = {}
-        
+        self.reset()
         for html in pages_html:
-            sel = Selector(html)
-            elements = sel.xpath("//*")
-
-            for idx, element in enumerate(elements):
-                root = element.root
-                selector = self._build_selector(element)
-                
-                text = element.xpath("normalize-space(.)").get()
-                if not text:
-                    continue
+            self.feed(html)
+        return self.result()
 
-                element_order.setdefault(selector, []).append(idx)
-
-                if selector not in selector_map:
-                    selector_map[selector] = []
-                selector_map[selector].append(text)
-
-                ancestral_selectors = self._find_ancestral_selectors_in_order(root)
-                
-                for ancestral in ancestral_selectors:
-                    if ancestral:
-                        combined_tag = f"{ancestral} {root.tag}"
-                        if combined_tag not in selector_map:
-                            selector_map[combined_tag] = []
-                        selector_map[combined_tag].append(text)
-                        
-                        if selector.startswith(".") or selector.startswith("#"):
-                            combined_selector = f"{ancestral} {selector}"
-                            if combined_selector not in selector_map:
-                                selector_map[combined_selector] = []
-                            selector_map[combined_selector].append(text)
-
-                        attrs = root.attrib
-                        raw_classes = (attrs.get("class") or "").strip()
-                        classes = [c for c in raw_classes.split() if c.strip()] if raw_classes else []
-                        
-                        if classes:
-                            for cls in classes:
-                                combined_class = f"{ancestral} .{cls}"
-                                if combined_class not in selector_map:
-                                    selector_map[combined_class] = []
-                                selector_map[combined_class].append(text)
-
-        ordered_selector_map = self._order_selectors_by_appearance(selector_map, element_order)
-        
-        return ordered_selector_map
+    def feed(self, html, page_no=None):
+        """
+        Mescla uma página no selector map. A árvore lxml só vive durante a
+        chamada, então quem chama pode descartar o HTML logo em seguida.
 
-    def _order_selectors_by_appearance(self, selector_map, element_order):
-        ordered_map = {}
-        
-        for selector, texts in selector_map.items():
-            if selector in element_order:
-                order_indices = element_order[selector]
-                
-                if len(texts) == len(order_indices):
-                    ordered_map[selector] = texts
-                else:
-                    ordered_map[selector] = texts
-            else:
-                ordered_map[selector] = texts
-        
-        return ordered_map
+        Com `page_no`, páginas já mescladas (reenviadas por retry ou retomada
+        de checkpoint) são ignoradas e o retorno é False.
+        """
+        if page_no is not None:
+            if page_no <= self.pages_fed:
+                return False
+            self.pages_fed = page_no
+        else:
+            self.pages_fed += 1
+
+        if isinstance(html, dict):
+            # Página já extraída no navegador (extraction_script)
+            selector_map = self.selector_map
+            for selector, texts in html.items():
+                selector_map.extend(sys.intern(selector), [selector_map.text_id(text) for text in texts])
+            return True
+
+        if self.cache_options is None:
+            self._merge_page(html, self.selector_map)
+            return True
+
+        key = self.cache.key(html, self.cache_options)
+        fragment = self.cache.get(key)
+        if fragment is None:
+            page_map = SelectorMap()
+            self._merge_page(html, page_map)
+            fragment = page_map.fragment()
+            self.cache.put(key, fragment)
+        else:
+            self.cache_hits += 1
+        self.selector_map.merge(fragment)
+        return True
+
+    def _merge_page(self, html, selector_map):
+        if self._use_stream(html):
+            self._merge_stream(html, selector_map)
+        else:
+            self._merge_tree(html_root(html), selector_map)
+
+    def _use_stream(self, html):
+        backend = self.parser_cfg["backend"]
+        if backend == "auto":
+            return len(html) >= self.parser_cfg["stream_threshold_kb"] * 1024
+        return backend == "stream"
+
+    def result(self):
+        return self.selector_map
+
+    def stats(self):
+        """Tamanho do selector map, chaves descartadas pelos limites do site e páginas vindas do cache."""
+        return {**self.selector_map.stats(), "dropped": self.dropped, "cache_hits": self.cache_hits}
+
+    def _merge_tree(self, tree, selector_map):
+        skip_tags = self.skip_tags
+        chains = [0]
+
+        for event, element in etree.iterwalk(tree, events=("start", "end")):
+            if event == "end":
+                chains.pop()
+                continue
+
+            chain = chains[-1]
+            chains.append(self._child_chain(chain, element))
+
+            # Contêiner de layout só passa se tiver chave configurada em groups
+            if element.tag in skip_tags and not self._element_keys(chain, element):
+                continue
+            text = _normalize_space(element)
+            if not text:
+                continue
+
+            text_id = selector_map.text_id(text)
+            for key in self._element_keys(chain, element):
+                selector_map.add(key, text_id)
+
+    def _merge_stream(self, html, selector_map):
+        """
+        Backend de streaming: alimenta o HTMLPullParser em blocos e trata cada
+        elemento no evento "end". Depois de registrado, o elemento é colapsado
+        num nó só com o próprio texto (string-value), então os ancestrais
+        calculam o mesmo texto sem manter a subárvore: a árvore viva fica
+        limitada ao caminho aberto e aos filhos diretos dele.
+
+        Os registros chegam em pós-ordem; as listas que ficaram fora da ordem
+        de abertura (elementos aninhados com a mesma chave) são reordenadas,
+        e o selector map fica igual ao do backend DOM.
+        """
+        if isinstance(html, str):
+            html = html.encode("utf-8")
+        if b"\x00" in html:
+            html = html.replace(b"\x00", b"")
+        if not html or html.isspace():
+            html = b"<html/>"
+
+        parser = etree.HTMLPullParser(events=("start", "end"), encoding="utf-8", recover=True, huge_tree=True)
+        state = {"idx": 0, "open": [], "records": {}, "first": {}, "map": selector_map}
+
+        view = memoryview(html)
+        for offset in range(0, len(html), STREAM_CHUNK):
+            parser.feed(bytes(view[offset:offset + STREAM_CHUNK]))
+            self._stream_events(parser.read_events(), state)
+        parser.close()
+        self._stream_events(parser.read_events(), state)
+
+        records = state["records"]
+        for key in sorted(records, key=state["first"].__getitem__):
+            text_ids, positions, in_order = records.pop(key)
+            if not in_order:
+                permutation = sorted(range(len(text_ids)), key=positions.__getitem__)
+                text_ids = [text_ids[i] for i in permutation]
+            selector_map.extend(key, text_ids)
+
+    def _stream_events(self, events, state):
+        open_elements = state["open"]
+
+        for event, element in events:
+            if event == "start":
+                chain = open_elements[-1][2] if open_elements else 0
+                open_elements.append((state["idx"], chain, self._child_chain(chain, element)))
+                state["idx"] += 1
+                continue
+
+            idx, chain, _ = open_elements.pop()
+            # Espaços já colapsados (sem aparar as pontas): colapsar de novo no
+            # pai dá o mesmo normalize-space e o nó guardado fica menor
+            collapsed = _SPACE_RUN.sub(" ", _string_value(element))
+            text = collapsed.strip(" ")
+            if text:
+                self._stream_record(element, idx, chain, text, state)
+
+            element.clear(keep_tail=True)
+            if collapsed:
+                element.text = collapsed
+
+    def _stream_record(self, element, idx, chain, text, state):
+        keys = self._element_keys(chain, element)
+        if not keys:
+            return
+
+        records = state["records"]
+        first = state["first"]
+        text_id = state["map"].text_id(text)
+
+        for position, key in enumerate(keys):
+            record = records.get(key)
+            if record is None:
+                records[key] = [array("I", (text_id,)), array("l", (idx,)), True]
+                first[key] = (idx, position)
+                continue
+
+            positions = record[1]
+            if idx < positions[-1]:
+                # Elemento que contém outro com a mesma chave: fechou depois dele
+                record[2] = False
+                if (idx, position) < first[key]:
+                    first[key] = (idx, position)
+            record[0].append(text_id)
+            positions.append(idx)
+
+    def _child_chain(self, chain, element):
+        """
+        Id da cadeia de seletores ancestrais que os filhos de `element`
+        enxergam: os do próprio elemento (#id, classes completas e primeira
+        classe) seguidos dos da cadeia `chain`, do mais próximo ao mais
+        distante e sem repetição.
+        """
+        element_id = element.get("id")
+        raw_classes = element.get("class")
+        if not (element_id and element_id.strip()) and not (raw_classes and raw_classes.strip()):
+            return chain
+
+        signature = (chain, element_id, raw_classes)
+        child = self._child_chains.get(signature)
+        if child is not None:
+            return child
 
-    def _find_ancestral_selectors_in_order(self, element):
         ancestors = []
-        parent = element.getparent()
-        
-        while parent is not None:
-            attrib = parent.attrib
+        if element_id and element_id.strip():
+            ancestors.append(f"#{element_id.strip()}")
+        if raw_classes and raw_classes.strip():
+            cls_list = [c for c in raw_classes.split() if c.strip()]
+            if cls_list:
+                ancestors.append("." + ".".join(cls_list))
+                if len(cls_list) > 1:
+                    ancestors.append(f".{cls_list[0]}")
+        ancestors.extend(a for a in self._chains[chain] if a not in ancestors)
+
+        ancestors = tuple(ancestors)
+        child = self._chain_ids.get(ancestors)
+        if child is None:
+            child = self._chain_ids[ancestors] = len(self._chains)
+            self._chains.append(ancestors)
+        self._child_chains[signature] = child
+        return child
+
+    def _element_keys(self, chain, element):
+        """
+        Chaves do selector map que recebem o texto do elemento, na ordem de
+        inserção. As strings são montadas uma vez por combinação de cadeia de
+        ancestrais, tag, id e classes, e internadas.
+        """
+        tag = element.tag
+        signature = (chain, tag, element.get("id"), element.get("class"))
+        keys = self._keys.get(signature)
+        if keys is not None:
+            return keys
 
-            if "id" in attrib and attrib["id"].strip():
-                id_selector = f"#{attrib['id'].strip()}"
-                if id_selector not in ancestors:
-                    ancestors.append(id_selector)
-            
-            if "class" in attrib and attrib["class"].strip():
-                cls_list = [c for c in attrib["class"].split() if c.strip()]
-                if cls_list:
-                    full_class_selector = "." + ".".join(cls_list)
-                    if full_class_selector not in ancestors:
-                        ancestors.append(full_class_selector)
-                    
-                    if len(cls_list) > 1:
-                        first_class_selector = f".{cls_list[0]}"
-                        if first_class_selector not in ancestors:
-                            ancestors.append(first_class_selector)
-            
-            parent = parent.getparent()
-        
-        return ancestors
+        selector = sys.intern(self._build_selector(element))
+        keys = [selector]
+
+        prefixed = selector.startswith(".") or selector.startswith("#")
+        raw_classes = (element.get("class") or "").strip()
+        classes = [c for c in raw_classes.split() if c.strip()] if raw_classes else []
+
+        ancestors = self._limited_ancestors(chain) if self.limit_ancestors else self._chains[chain]
+        for ancestral in ancestors:
+            keys.append(sys.intern(f"{ancestral} {tag}"))
+            if prefixed:
+                keys.append(sys.intern(f"{ancestral} {selector}"))
+            for cls in classes:
+                keys.append(sys.intern(f"{ancestral} .{cls}"))
+
+        if tag in self.skip_tags:
+            keys = [key for key in keys if key in self.protected]
+        elif self.max_selectors is not None:
+            keys = self._admit(keys)
+
+        keys = self._keys[signature] = tuple(keys)
+        return keys
+
+    def _limited_ancestors(self, chain):
+        """
+        Ancestrais da cadeia que entram nas combinações: filtrados pelas
+        listas de classes e cortados nos `max_ancestors` mais próximos.
+        """
+        limited = self._limited.get(chain)
+        if limited is not None:
+            return limited
+
+        limited = []
+        kept = 0
+        for ancestral in self._chains[chain]:
+            if ancestral in self.protected_ancestors:
+                limited.append(ancestral)
+                kept += 1
+            elif (self.max_ancestors is None or kept < self.max_ancestors) and self._ancestor_allowed(ancestral):
+                limited.append(ancestral)
+                kept += 1
+
+        limited = self._limited[chain] = tuple(limited)
+        return limited
+
+    def _ancestor_allowed(self, ancestral):
+        if not ancestral.startswith("."):
+            return True
+        classes = ancestral[1:].split(".")
+        if self.class_deny and any(cls in self.class_deny for cls in classes):
+            return False
+        return not self.class_allow or any(cls in self.class_allow for cls in classes)
+
+    def _admit(self, keys):
+        """Depois de `max_selectors` chaves distintas, só as configuradas em groups entram no map."""
+        admitted = self._admitted
+        kept = []
+        for key in keys:
+            if key not in admitted:
+                if len(admitted) >= self.max_selectors and key not in self.protected:
+                    self.dropped += 1
+                    continue
+                admitted.add(key)
+            kept.append(key)
+        return kept
 
     def _build_selector(self, element):
-        root = element.root
-        tag = root.tag
-        attrs = root.attrib
+        tag = element.tag
+        attrs = element.attrib
 
         element_id = (attrs.get("id") or "").strip()
         raw_classes = (attrs.get("class") or "").strip()
@@ -133,11 +523,19 @@ class DataOrganizer:
         self.first_cyclic_blocks = {}
 
 
+    def member_texts(self, selector_map, member):
+        """Textos de um membro já pós-processados, como entram nos itens organizados."""
+        self._preprocess_selector_map(selector_map)
+        return self.processed_selector_map_cache.get(member, [])
+
+
     async def organize(self, selector_map):
         self._preprocess_selector_map(selector_map)
         
         hierarchy = self._build_groups_hierarchy()
-        organized_data = self._process_groups_hierarchically(hierarchy, self.processed_selector_map_cache)
+        # Membros saem do cache pré-processado; os demais seletores são lidos do selector map, sem cópia
+        selector_map = ChainMap(self.processed_selector_map_cache, selector_map)
+        organized_data = self._process_groups_hierarchically(hierarchy, selector_map)
         return organized_data
 
 
@@ -178,10 +576,6 @@ class DataOrganizer:
                             self.first_cyclic_blocks[member] = processed_texts.copy()
                     
                     self.processed_selector_map_cache[member] = processed_texts
-        
-        for selector, texts in selector_map.items():
-            if selector not in self.processed_selector_map_cache:
-                self.processed_selector_map_cache[selector] = texts.copy() if texts else []
 
 
     def _apply_not_reorder(self, member_texts, target_selector, selector_map):
@@ -682,18 +1076,47 @@ class DataOrganizer:
 
 
 class ParserEngine:
-    def __init__(self, site_cfg):
+    def __init__(self, site_cfg, trace=None, cache=None):
         self.site_cfg = site_cfg
+        self.trace = trace
+        self.cache = cache
+        self.parser = UniversalParser(site_cfg, cache)
+
+    def feed(self, html, page_no=None):
+        """Parseia uma página assim que ela é baixada (ver UniversalParser.feed)."""
+        with span(self.trace, "parse"):
+            return self.parser.feed(html, page_no)
+
+    async def finish(self):
+        selector_map = self.parser.result()
+        stats = self.parser.stats()
+        count(self.trace, "selectors", stats["keys"])
+        count(self.trace, "selector_entries", stats["entries"])
+        count(self.trace, "selector_texts", stats["distinct_texts"])
+        if stats["dropped"]:
+            count(self.trace, "selectors_dropped", stats["dropped"])
+        if stats["cache_hits"]:
+            count(self.trace, "parse_cache_hits", stats["cache_hits"])
+        print(
+            f"[+] Selector map: {stats['keys']} seletores, {stats['entries']} entradas, "
+            f"{stats['distinct_texts']} textos distintos"
+            + (f", {stats['dropped']} chaves descartadas pelos limites" if stats["dropped"] else "")
+            + (f", {stats['cache_hits']} páginas do cache" if stats["cache_hits"] else "")
+        )
 
-    async def parse(self, pages_html):
-        parser = UniversalParser(self.site_cfg)
         organizer = DataOrganizer(self.site_cfg)
-
-        selector_map = await parser.parse(pages_html)
-        result = await organizer.organize(selector_map)
+        with span(self.trace, "organize"):
+            result = await organizer.organize(selector_map)
+        count(self.trace, "items", sum(len(items) for items in result.values() if isinstance(items, list)))
 
         os.makedirs("debug", exist_ok=True)
         with open("debug/debug_selector_map.json", "w", encoding="utf-8") as json_file:
-            json.dump(selector_map, json_file, indent=4)
+            selector_map.dump(json_file)
+
+        return result
 
-        return result
\ No newline at end of file
+    async def parse(self, pages_html):
+        self.parser = UniversalParser(self.site_cfg, self.cache)
+        for html in pages_html:
+            self.feed(html)
+        return await self.finish()
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+
+
+DEFAULTS = {
+    "initial_concurrency": 1,
+    "min_concurrency": 1,
+    "max_concurrency": 4,
+    "initial_delay": 1.3,
+    "min_delay": 0.5,
+    "max_delay": 30.0,
+    "delay_step": 0.1,
+    "fast_seconds": 2.0,
+    "slow_seconds": 8.0,
+    "backoff_factor": 0.5,
+    # Widgets de captcha aparecem em páginas normais (formulário de busca): só contam com HTTP de erro
+    "captcha_markers": ["g-recaptcha", "h-captcha", "hcaptcha"],
+    # Marcadores de página de desafio anti-bot, que substitui o resultado: contam sozinhos
+    "challenge_markers": ["cf-challenge", "cf_chl_opt", "/cdn-cgi/challenge-platform/", "captcha-delivery.com"],
+}
+
+BACKOFF_STATUS = (429, 503)
+
+
+class SiteController:
+    """
+    Controle AIMD de um site: a concorrência cresce 1/janela a cada página
+    rápida e cai pela metade (com o atraso entre páginas dobrando) em sinais
+    de sobrecarga: HTTP 429/503, captcha, timeout ou resposta lenta.
+    """
+
+    def __init__(self, site_name, cfg):
+        self.site = site_name
+        self.cfg = cfg
+        self.window = float(cfg["initial_concurrency"])
+        self.delay = float(cfg["initial_delay"])
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.fast = 0
+        self.backoffs = 0
+        self.last_signal = None
+
+    @property
+    def limit(self):
+        return max(int(self.cfg["min_concurrency"]), int(self.window))
+
+    def acquire(self, timeout=None, token=None):
+        """Espera vaga no site; False se `timeout` vencer, JobCancelled se o token for cancelado."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while self.in_flight >= self.limit:
+                if token:
+                    token.check()
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Em fatias, para notar o cancelamento do token (cliente desconectou)
+                if token:
+                    remaining = 0.25 if remaining is None else min(remaining, 0.25)
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def pause(self):
+        """Atraso antes da próxima ação na página, com jitter para não parecer robô."""
+        with self.condition:
+            delay = self.delay
+        return delay * random.uniform(0.8, 1.3)
+
+    def observe(self, seconds=None, status=None, html=None, timeout=False):
+        reason = None
+        if timeout:
+            reason = "timeout"
+        elif status in BACKOFF_STATUS:
+            reason = f"HTTP {status}"
+        elif isinstance(html, (str, bytes)) and self._has_marker(html, "challenge_markers"):
+            reason = "desafio anti-bot"
+        elif status is not None and status >= 400 and isinstance(html, (str, bytes)) \
+                and self._has_marker(html, "captcha_markers"):
+            reason = f"captcha (HTTP {status})"
+        elif seconds is not None and seconds >= self.cfg["slow_seconds"]:
+            reason = f"lento ({seconds:.1f}s)"
+
+        with self.condition:
+            if reason:
+                self.window = max(float(self.cfg["min_concurrency"]), self.window * self.cfg["backoff_factor"])
+                self.delay = min(self.cfg["max_delay"], max(self.delay, self.cfg["min_delay"]) * 2)
+                self.backoffs += 1
+                self.last_signal = reason
+            elif seconds is not None and seconds <= self.cfg["fast_seconds"]:
+                self.window = min(float(self.cfg["max_concurrency"]), self.window + 1.0 / max(self.window, 1.0))
+                self.delay = max(self.cfg["min_delay"], self.delay - self.cfg["delay_step"])
+                self.fast += 1
+            self.condition.notify_all()
+
+        if reason:
+            print(f"[-] {self.site}: recuando ({reason}), concorrência {self.limit}, atraso {self.delay:.1f}s")
+        return reason
+
+    def _has_marker(self, html, option):
+        markers = self.cfg[option]
+        if isinstance(html, bytes):
+            return any(marker.encode("utf-8") in html for marker in markers)
+        return any(marker in html for marker in markers)
+
+    def reconfigure(self, cfg):
+        # Mantém in_flight: os jobs em andamento ainda vão dar release neste controlador
+        with self.condition:
+            self.cfg = cfg
+            self.window = float(cfg["initial_concurrency"])
+            self.delay = float(cfg["initial_delay"])
+            self.condition.notify_all()
+
+    def to_dict(self):
+        with self.condition:
+            return {
+                "concurrency": self.limit,
+                "window": round(self.window, 2),
+                "delay_s": round(self.delay, 2),
+                "in_flight": self.in_flight,
+                "fast_pages": self.fast,
+                "backoffs": self.backoffs,
+                "last_signal": self.last_signal,
+            }
+
+
+class RateLimiter:
+    """
+    Controladores AIMD por site, entre a fila de jobs e o PlaywrightWorker.
+    settings.rate_limit define os padrões e site.rate_limit sobrescreve.
+    """
+
+    def __init__(self, settings=None, metrics=None):
+        self.settings = {**DEFAULTS, **(settings or {})}
+        self.metrics = metrics
+        self.controllers = {}
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def controller(self, site_name, site_cfg=None):
+        with self.lock:
+            controller = self.controllers.get(site_name)
+            if controller is None:
+                controller = self.controllers[site_name] = SiteController(site_name, self._site_cfg(site_cfg))
+            elif site_name in self.stale and site_cfg is not None:
+                self.stale.discard(site_name)
+                controller.reconfigure(self._site_cfg(site_cfg))
+            return controller
+
+    def _site_cfg(self, site_cfg):
+        return {**self.settings, **((site_cfg or {}).get("rate_limit") or {})}
+
+    def publish(self, site_name):
+        if not self.metrics:
+            return
+        state = self.controller(site_name).to_dict()
+        self.metrics.gauge("rate_concurrency", state["concurrency"], site=site_name)
+        self.metrics.gauge("rate_delay_seconds", state["delay_s"], site=site_name)
+
+    def invalidate_site(self, site_name):
+        # Config do site mudou: recomeça com os novos limites no próximo uso, no mesmo controlador
+        with self.lock:
+            if site_name in self.controllers:
+                self.stale.add(site_name)
+
+    def status(self):
+        with self.lock:
+            controllers = dict(self.controllers)
+        return {name: controller.to_dict() for name, controller in controllers.items()}
@@ -0,0 +1,213 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from Incremental import key_config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    search_term TEXT NOT NULL,
+    processo TEXT,
+    item_date TEXT,
+    ementa TEXT NOT NULL,
+    data TEXT NOT NULL,
+    harvested_at REAL NOT NULL,
+    UNIQUE (site, processo)
+);
+CREATE INDEX IF NOT EXISTS idx_results_processo ON results (processo);
+CREATE INDEX IF NOT EXISTS idx_results_date ON results (item_date);
+CREATE INDEX IF NOT EXISTS idx_results_site_date ON results (site, item_date);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+    ementa, content='results', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts (rowid, ementa) VALUES (new.id, new.ementa);
+END;
+CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, ementa) VALUES ('delete', old.id, old.ementa);
+END;
+CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE ON results BEGIN
+    INSERT INTO results_fts (results_fts, rowid, ementa) VALUES ('delete', old.id, old.ementa);
+    INSERT INTO results_fts (rowid, ementa) VALUES (new.id, new.ementa);
+END;
+"""
+
+DATE_PATTERN = r"(\d{2})/(\d{2})/(\d{4})"
+
+
+def _texts(value):
+    if isinstance(value, str):
+        if value:
+            yield value
+    elif isinstance(value, dict):
+        for child in value.values():
+            yield from _texts(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _texts(child)
+
+
+def fts_query(text):
+    """Cada palavra vira uma string FTS5 ("art. 5", "dano-moral" e "CPC/2015" não são sintaxe)."""
+    return " ".join('"' + token.replace('"', '""') + '"' for token in text.split())
+
+
+def flatten_records(site_cfg, organized):
+    """
+    Achata a saída do DataOrganizer em um registro por item do grupo raiz
+    (processo), com o texto dos grupos filhos (ementa) juntado em ordem.
+
+    site.records pode definir key_group, key_member e date_pattern; por
+    padrão vale o primeiro grupo raiz e o primeiro membro dele. Itens sem
+    a chave ficam de fora: sem ela não há como reconhecê-los na próxima busca.
+    """
+    groups = site_cfg.get("groups", {})
+    cfg = site_cfg.get("records", {})
+
+    group_name, key_member = key_config(site_cfg, "records")
+    items = organized.get(group_name)
+    if not isinstance(items, list):
+        return
+
+    children = [name for name, group in groups.items() if group.get("parent_group") == group_name]
+    date_re = re.compile(cfg.get("date_pattern", DATE_PATTERN))
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        key = item.get(key_member)
+        if not isinstance(key, str) or not key.strip():
+            continue
+
+        texts = [text for child in children for text in _texts(item.get(child))]
+        if not texts:
+            texts = [text for member, value in item.items() if member != key_member for text in _texts(value)]
+        ementa = "\n".join(texts)
+
+        item_date = None
+        match = date_re.search(ementa)
+        if match and len(match.groups()) == 3:
+            day, month, year = match.groups()
+            item_date = f"{year}-{month}-{day}"
+
+        yield {
+            "processo": key,
+            "date": item_date,
+            "ementa": ementa,
+            "data": item,
+        }
+
+
+class ResultStore:
+    """
+    Resultados organizados persistidos em SQLite, com índice FTS5 sobre o
+    texto das ementas e índices por processo e data, para o comando
+    query_local responder sem acessar o tribunal.
+    """
+
+    def __init__(self, path="state/results.db"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            # SQLite compilado sem FTS5: a busca textual cai para LIKE
+            print(f"[-] FTS5 indisponível ({e}), usando busca simples")
+            self.fts = False
+
+    def save(self, site_name, site_cfg, search_term, organized):
+        now = time.time()
+        rows = [
+            (site_name, search_term, record["processo"], record["date"], record["ementa"],
+             json.dumps(record["data"], ensure_ascii=False), now)
+            for record in flatten_records(site_cfg, organized)
+        ]
+
+        with self.lock:
+            self.conn.executemany(
+                """INSERT INTO results (site, search_term, processo, item_date, ementa, data, harvested_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (site, processo) DO UPDATE SET
+                       search_term = excluded.search_term, item_date = excluded.item_date,
+                       ementa = excluded.ementa, data = excluded.data, harvested_at = excluded.harvested_at""",
+                rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def query(self, text=None, site=None, processo=None, date_from=None, date_to=None, limit=50, offset=0,
+              fts_syntax=False):
+        """`text` é buscado palavra por palavra; com fts_syntax vai cru para o MATCH do FTS5."""
+        where = []
+        params = []
+        order = "r.item_date DESC, r.id DESC"
+        source = "results r"
+        columns = "r.site, r.search_term, r.processo, r.item_date, r.ementa, r.data"
+
+        if text:
+            if self.fts:
+                source = "results_fts JOIN results r ON r.id = results_fts.rowid"
+                columns += ", snippet(results_fts, 0, '[', ']', '...', 16)"
+                where.append("results_fts MATCH ?")
+                params.append(text if fts_syntax else fts_query(text))
+                order = "bm25(results_fts)"
+            else:
+                where.append("r.ementa LIKE ?")
+                params.append(f"%{text}%")
+        if site:
+            where.append("r.site = ?")
+            params.append(site)
+        if processo:
+            where.append("r.processo = ?")
+            params.append(processo)
+        if date_from:
+            where.append("r.item_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("r.item_date <= ?")
+            params.append(date_to)
+
+        filters = f" WHERE {' AND '.join(where)}" if where else ""
+
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {source}{filters}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM {source}{filters} ORDER BY {order} LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+
+        results = []
+        for row in rows:
+            result = {
+                "site": row[0],
+                "search_term": row[1],
+                "processo": row[2],
+                "date": row[3],
+                "ementa": row[4],
+                "data": json.loads(row[5]),
+            }
+            if len(row) > 6:
+                result["snippet"] = row[6]
+            results.append(result)
+
+        return {"total": total, "results": results}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
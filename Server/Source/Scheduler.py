@@ -0,0 +1,133 @@
+import itertools
+import math
+import threading
+
+
+DEFAULTS = {
+    "interactive_share": 0.25,
+    "weights": {"interactive": 4, "batch": 1},
+}
+
+PRIORITIES = ("interactive", "batch")
+
+
+class Ticket:
+    """Pedido de vaga de um cliente; depois de concedido, é o que se devolve no release."""
+
+    __slots__ = ("client", "priority", "tag", "seq")
+
+    def __init__(self, client, priority, tag, seq):
+        self.client = client
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+
+
+class JobScheduler:
+    """
+    Vagas de job (settings.max_concurrent_jobs) divididas entre classes de
+    prioridade. Uma fração das vagas (`interactive_share`) nunca vai para
+    batch, então uma busca avulsa não espera um batch de 500 termos acabar.
+
+    Entre quem espera, a vez segue weighted fair queuing por conexão: cada
+    pedido recebe a etiqueta max(relógio virtual, última etiqueta do
+    cliente) + 1/peso da classe, e a vaga livre vai para a menor etiqueta.
+    Clientes da mesma classe se alternam; interactive anda mais rápido.
+    """
+
+    def __init__(self, capacity, settings=None, metrics=None):
+        self.settings = {**DEFAULTS, **(settings or {})}
+        self.weights = {**DEFAULTS["weights"], **(self.settings.get("weights") or {})}
+        self.capacity = int(capacity)
+        share = float(self.settings["interactive_share"] or 0)
+        # Batch fica com pelo menos uma vaga, senão nunca roda
+        self.reserved = min(self.capacity - 1, math.ceil(self.capacity * share)) if share > 0 else 0
+        self.metrics = metrics
+        self.condition = threading.Condition()
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self.waiting = []
+        self.finish = {}
+        self.vtime = 0.0
+        self.seq = itertools.count()
+        self.granted = {priority: 0 for priority in PRIORITIES}
+
+    def acquire(self, client, priority, token=None):
+        """
+        Espera a vez do cliente na classe `priority` e devolve o Ticket.
+        Com token, desiste (JobCancelled) se ele for cancelado ou vencer.
+        """
+        with self.condition:
+            tag = max(self.vtime, self.finish.get(client, 0.0)) + 1.0 / self.weights[priority]
+            self.finish[client] = tag
+            ticket = Ticket(client, priority, tag, next(self.seq))
+            self.waiting.append(ticket)
+            self._publish()
+
+            try:
+                while not self._turn(ticket):
+                    if token:
+                        token.check()
+                    # Release acorda na hora; o timeout só serve para notar o cancelamento do token
+                    self.condition.wait(0.25 if token else None)
+            except BaseException:
+                self.waiting.remove(ticket)
+                self._forget(client)
+                self.condition.notify_all()
+                self._publish()
+                raise
+
+            self.waiting.remove(ticket)
+            self.running[priority] += 1
+            self.granted[priority] += 1
+            self.vtime = max(self.vtime, tag)
+            # Pode ter sobrado vaga para outro da fila (ex.: a reservada, com batch no limite)
+            self.condition.notify_all()
+            self._publish()
+            return ticket
+
+    def release(self, ticket):
+        with self.condition:
+            self.running[ticket.priority] -= 1
+            self._forget(ticket.client)
+            self.condition.notify_all()
+            self._publish()
+
+    def _eligible(self, ticket):
+        if sum(self.running.values()) >= self.capacity:
+            return False
+        if ticket.priority == "batch" and self.running["batch"] >= self.capacity - self.reserved:
+            return False
+        return True
+
+    def _turn(self, ticket):
+        if not self._eligible(ticket):
+            return False
+        best = min((waiting for waiting in self.waiting if self._eligible(waiting)),
+                   key=lambda waiting: (waiting.tag, waiting.seq))
+        return best is ticket
+
+    def _forget(self, client):
+        # Cliente sem nada pendente e com etiqueta vencida não tem mais crédito a guardar
+        if self.finish.get(client, 0.0) <= self.vtime and not any(t.client is client for t in self.waiting):
+            self.finish.pop(client, None)
+
+    def _publish(self):
+        if not self.metrics:
+            return
+        for priority in PRIORITIES:
+            self.metrics.gauge(f"jobs_running_{priority}", self.running[priority])
+            self.metrics.gauge(f"jobs_waiting_{priority}", sum(1 for t in self.waiting if t.priority == priority))
+
+    def status(self):
+        with self.condition:
+            return {
+                "capacity": self.capacity,
+                "reserved_interactive": self.reserved,
+                "weights": dict(self.weights),
+                "running": dict(self.running),
+                "waiting": {
+                    priority: sum(1 for t in self.waiting if t.priority == priority) for priority in PRIORITIES
+                },
+                "clients_waiting": len({id(t.client) for t in self.waiting}),
+                "granted": dict(self.granted),
+            }
@@ -0,0 +1,265 @@
+import json
+import struct
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+FRAME_HEADER = struct.Struct(">I")
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, default=str, ensure_ascii=False).encode("utf-8")
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # O que o orjson recusa (ex.: inteiro acima de 64 bits) o json da stdlib ainda codifica
+        return _json_dumps(obj)
+
+
+def resolve_backend(name="auto"):
+    if name in (None, "auto"):
+        return "orjson" if orjson is not None else "json"
+
+    if name == "orjson" and orjson is None:
+        print("[-] orjson não disponível, usando json da stdlib")
+        return "json"
+
+    if name not in ("orjson", "json"):
+        print(f"[-] Serializador desconhecido '{name}', usando json da stdlib")
+        return "json"
+
+    return name
+
+
+class StreamEncoder:
+    """
+    Codifica objetos em pedaços de bytes sem montar a string inteira.
+
+    Dicts e listas são percorridos recursivamente; cada dict dentro de uma
+    lista (um item organizado) é codificado de uma vez pelo backend.
+    """
+
+    def __init__(self, backend="auto"):
+        self.backend = resolve_backend(backend)
+        self.dumps = _orjson_dumps if self.backend == "orjson" else _json_dumps
+
+    def iter_encode(self, obj):
+        if isinstance(obj, dict):
+            yield b"{"
+            first = True
+            for key, value in obj.items():
+                if not first:
+                    yield b","
+                first = False
+                yield self.dumps(str(key))
+                yield b":"
+                yield from self.iter_encode(value)
+            yield b"}"
+
+        elif isinstance(obj, (list, tuple)):
+            yield b"["
+            for idx, value in enumerate(obj):
+                if idx:
+                    yield b","
+                if isinstance(value, dict):
+                    yield self.dumps(value)
+                else:
+                    yield from self.iter_encode(value)
+            yield b"]"
+
+        else:
+            yield self.dumps(obj)
+
+
+class ResponseStream:
+    """
+    Escreve uma resposta no mesmo formato de Server.create_response,
+    mas enviando o conteúdo entrada por entrada conforme fica pronto:
+
+        {"type": ..., "content": {<nome>: <valor>, ...}, "success": ..., "timestamp": ...}
+    """
+
+    def __init__(self, write, type, encoder=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.write = write
+        self.type = type
+        self.encoder = encoder or StreamEncoder()
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.entries = 0
+        self.opened = False
+
+    def open(self):
+        self._emit(b'{"type":')
+        self._emit(self.encoder.dumps(self.type))
+        self._emit(b',"content":{')
+        self.opened = True
+
+    def add(self, name, value):
+        if not self.opened:
+            self.open()
+
+        if self.entries:
+            self._emit(b",")
+        self._emit(self.encoder.dumps(str(name)))
+        self._emit(b":")
+        for chunk in self.encoder.iter_encode(value):
+            self._emit(chunk)
+
+        self.entries += 1
+        self.flush()
+
+    def close(self, success=True):
+        if not self.opened:
+            self.open()
+
+        self._emit(b'},"success":')
+        self._emit(b"true" if success else b"false")
+        self._emit(b',"timestamp":')
+        self._emit(self.encoder.dumps(time.time()))
+        self._emit(b"}")
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write(bytes(self.buffer))
+            self.bytes_written += len(self.buffer)
+            self.buffer.clear()
+
+    def _emit(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+
+def encode_response(response, encoder=None):
+    encoder = encoder or StreamEncoder()
+    return b"".join(encoder.iter_encode(response))
+
+
+def available_formats():
+    formats = ["json"]
+    if msgpack is not None:
+        formats.insert(0, "msgpack")
+    return formats
+
+
+def negotiate_format(requested):
+    """Escolhe o primeiro formato da lista do cliente que o servidor suporta."""
+    supported = available_formats()
+    for fmt in requested or []:
+        if fmt in supported:
+            return fmt
+    return "json"
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if not n:
+            return None
+        received += n
+    return bytes(buffer)
+
+
+def read_frame(sock, max_size=256 * 1024 * 1024):
+    """Lê um frame com prefixo de tamanho. Retorna None se a conexão fechou."""
+    header = _recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > max_size:
+        raise ValueError(f"Frame de {size} bytes excede o limite de {max_size}")
+    return _recv_exact(sock, size) if size else b""
+
+
+def to_columnar(obj):
+    """
+    Converte listas de dicts com as mesmas chaves (itens de um grupo) em
+    tabelas por coluna, para que as chaves dos membros apareçam uma vez só:
+
+        [{"a": 1, "b": 2}, {"a": 3, "b": 4}]
+        -> {"$columns": ["a", "b"], "$rows": 2, "$data": [[1, 3], [2, 4]]}
+    """
+    if isinstance(obj, dict):
+        return {key: to_columnar(value) for key, value in obj.items()}
+
+    if isinstance(obj, (list, tuple)):
+        if len(obj) > 1 and all(isinstance(item, dict) for item in obj):
+            columns = list(obj[0].keys())
+            if all(list(item.keys()) == columns for item in obj[1:]):
+                return {
+                    "$columns": columns,
+                    "$rows": len(obj),
+                    "$data": [[to_columnar(item[col]) for item in obj] for col in columns],
+                }
+        return [to_columnar(item) for item in obj]
+
+    return obj
+
+
+class MsgPackEncoder:
+    def __init__(self, columnar=True):
+        if msgpack is None:
+            raise RuntimeError("msgpack não disponível")
+        self.columnar = columnar
+
+    def dumps(self, obj):
+        if self.columnar:
+            obj = to_columnar(obj)
+        return msgpack.packb(obj, default=str, use_bin_type=True)
+
+
+class FramedResponseStream:
+    """
+    Equivalente binário do ResponseStream. Cada entrada do conteúdo vai num
+    frame próprio (prefixo de 4 bytes big-endian com o tamanho):
+
+        {"type": "partial", "name": <nome>, "content": <valor>}
+        ...
+        {"type": <tipo>, "content": [<nomes>], "success": ..., "timestamp": ...}
+    """
+
+    def __init__(self, write, type, encoder):
+        self.write = write
+        self.type = type
+        self.encoder = encoder
+        self.names = []
+        self.bytes_written = 0
+        self.opened = False
+
+    def open(self):
+        self.opened = True
+
+    def add(self, name, value):
+        self.opened = True
+        self._send({"type": "partial", "name": name, "content": value})
+        self.names.append(name)
+
+    def close(self, success=True):
+        self._send({"type": self.type, "content": self.names, "success": success, "timestamp": time.time()})
+
+    def _send(self, message):
+        data = frame(self.encoder.dumps(message))
+        self.write(data)
+        self.bytes_written += len(data)
@@ -1,162 +1,879 @@
+import time
+
+BOOT_STARTED = time.perf_counter()
+
 import socket
 import json
 import os
-import time
+import stat
 import threading
 from typing import Dict, Any
 import sys
 import multiprocessing
-import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor, Future
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError as e:
-    print(f"[-] Playwright não disponível: {e}")
-    sys.exit(1)
+from ConfigLoader import ConfigStore
 
-try:
-    from Worker import PlaywrightWorker
-except ImportError as e:
-    print(f"[-] Falha ao importar Worker: {e}")
-    sys.exit(1)
+from Checkpoint import CheckpointStore
 
-try:
-    from ParserEngine import ParserEngine
-except ImportError as e:
-    print(f"[-] Falha ao importar ParserEngine: {e}")
-    sys.exit(1)
+from Incremental import SeenIndex, key_config, extract_keys, filter_new
 
+from ResultStore import ResultStore
 
+from ParseCache import ParseCache
 
+from RateLimiter import RateLimiter
 
-def load_config():
-    try:
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS
-        else:
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        json_path = os.path.join(base_path, 'Config.json')
-        
-        with open(json_path, 'r', encoding='utf-8') as arquivo:
-            return json.load(arquivo)
-            
-    except FileNotFoundError:
-        print(f"Arquivo de Config não encontrado em: {json_path}")
-        return {}
-    except json.JSONDecodeError:
-        print("Erro ao decodificar o JSON de config")
-        return {}
+from Scheduler import JobScheduler, PRIORITIES
+
+from Cancellation import CancelToken, JobCancelled, run_guarded
+
+from Connections import Connection, ConnectionLoop
+
+from Cluster import Coordinator
+
+from Metrics import Metrics, MetricsHttpServer
+
+from Serializer import (
+    StreamEncoder, ResponseStream, FramedResponseStream, MsgPackEncoder,
+    encode_response, negotiate_format, frame
+)
+
+PAGE_BREAK = b"\n<!-- PAGE BREAK -->\n"
+
+# Carregados em segundo plano por Server.warm_up, depois que o socket já está ouvindo
+asyncio = None
+PlaywrightWorker = None
+ParserEngine = None
+
+
+# Comandos longos e a classe de prioridade padrão de cada um; o resto vai para o pool de controle
+JOB_COMMANDS = {"scrape_request": "interactive", "batch_request": "batch"}
+
+
+class ClientSession(Connection):
+    def __init__(self, client_socket, client_addr, loop):
+        super().__init__(client_socket, client_addr, loop)
+        self.wire_format = "json"
+        self.binary_encoder = None
+        self.node_id = None
 
 
 class Server:
-    def __init__(self, host="localhost", port=8082):
+    def __init__(self, host="localhost", port=8082, config_path=None, unix_socket=None):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_addr = (host, port)
-        self.data_payload = 10240
         self.clients = []
         self.lock = threading.Lock()
         self.shutdown_cmd = "SHUTDOWN_SERVER"
-        self.config = load_config();
+        self.config_store = ConfigStore(config_path)
+        self.config_store.subscribe(self.on_config_reloaded)
+        self.config = self.config_store.raw
+        self.site_caches = []
+        self.state = "starting"
+        self.state_error = None
+        self.ready = threading.Event()
+        self.startup_profile = {}
+        self.encoder = StreamEncoder(self.config.get("settings", {}).get("serializer", "auto"))
+        self.metrics = Metrics()
+        self.metrics_http = None
+        self.browser_pool = None
+
+        checkpoint_cfg = self.config.get("settings", {}).get("checkpoints", {})
+        self.checkpoints = None
+        if checkpoint_cfg.get("enabled", False):
+            self.checkpoints = CheckpointStore(
+                checkpoint_cfg.get("path", "state/checkpoints.db"),
+                checkpoint_cfg.get("max_age_hours", 24)
+            )
+
+        incremental_cfg = self.config.get("settings", {}).get("incremental", {})
+        self.seen_index = SeenIndex(incremental_cfg.get("path", "state/seen_items.db"))
+
+        store_cfg = self.config.get("settings", {}).get("result_store", {})
+        self.result_store = None
+        if store_cfg.get("enabled", False):
+            self.result_store = ResultStore(store_cfg.get("path", "state/results.db"))
+
+        parse_cache_cfg = self.config.get("settings", {}).get("parse_cache", {})
+        self.parse_cache = None
+        if parse_cache_cfg.get("enabled", False):
+            self.parse_cache = ParseCache(parse_cache_cfg, self.metrics)
+
+        rate_cfg = self.config.get("settings", {}).get("rate_limit", {})
+        self.rate_limiter = None
+        if rate_cfg.get("enabled", False):
+            self.rate_limiter = RateLimiter(rate_cfg, self.metrics)
+            self.site_caches.append(self.rate_limiter)
+
+        cluster_cfg = self.config.get("settings", {}).get("cluster", {})
+        self.coordinator = None
+        if cluster_cfg.get("enabled", False):
+            self.coordinator = Coordinator(cluster_cfg, self.metrics).start()
+
+        max_jobs = self.config.get("settings", {}).get("max_concurrent_jobs")
+        scheduler_cfg = self.config.get("settings", {}).get("scheduler", {})
+        self.scheduler = JobScheduler(max_jobs, scheduler_cfg, self.metrics) if max_jobs else None
+
+        self.connection_cfg = self.config.get("settings", {}).get("connections", {})
+        self.unix_socket_path = unix_socket or self.connection_cfg.get("unix_socket")
+        self.unix_socket = None
+        self.connections = None
+        self.job_pool = None
+        self.interactive_pool = None
+        self.control_pool = None
 
     def create_response(self, type: str, content: Any, success: bool = True) -> Dict[str, Any]:
         return {"type": type, "content": content, "success": success, "timestamp": time.time()}
 
-    def handle_request(self, client, json_data: Dict[str, Any]) -> None:
+    def encode(self, session: ClientSession, response: Dict[str, Any]) -> bytes:
+        if session.binary_encoder:
+            return frame(session.binary_encoder.dumps(response))
+        return encode_response(response, self.encoder)
+
+    def send_response(self, session: ClientSession, response: Dict[str, Any]) -> None:
+        session.write(self.encode(session, response))
+
+    def open_stream(self, session: ClientSession, type: str):
+        if session.binary_encoder:
+            return FramedResponseStream(session.write, type, session.binary_encoder)
+        return ResponseStream(session.write, type, self.encoder)
+
+    def handle_hello(self, session: ClientSession, json_data: Dict[str, Any]) -> None:
+        wire_format = negotiate_format(json_data.get("formats"))
+        columnar = bool(json_data.get("columnar", True))
+
+        response = self.create_response("hello", {
+            "format": wire_format,
+            "framing": "length_prefixed" if wire_format != "json" else "none",
+            "columnar": columnar if wire_format != "json" else False,
+            "server": self.status(),
+        })
+        self.send_response(session, response)
+
+        session.wire_format = wire_format
+        session.binary_encoder = MsgPackEncoder(columnar) if wire_format == "msgpack" else None
+        print(f"[+] Formato negociado com {session.addr}: {wire_format}")
+
+    def record_startup(self, stage: str, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.startup_profile[stage] = round(elapsed, 4)
+        self.metrics.gauge(f"startup_{stage}_seconds", round(elapsed, 4))
+
+    def warm_up(self) -> None:
+        global asyncio, PlaywrightWorker, ParserEngine
+
         try:
-            result = {}
-                   
-            os.makedirs("debug", exist_ok=True)
-            for site_name, site_cfg in self.config["sites"].items():
-                worker = PlaywrightWorker(site_cfg)
-                pages_html = asyncio.run(worker.execute(json_data["search_term"]))
+            started = time.perf_counter()
+            import asyncio
+            import playwright.async_api  # noqa: F401
+            self.record_startup("import_playwright", started)
+
+            started = time.perf_counter()
+            from Worker import PlaywrightWorker
+            self.record_startup("import_worker", started)
+
+            started = time.perf_counter()
+            from ParserEngine import ParserEngine
+            self.record_startup("import_parser", started)
+
+            started = time.perf_counter()
+            self.config_store.compile()
+            self.record_startup("compile_config", started)
+
+            settings = self.config.get("settings", {})
+            pool_cfg = settings.get("browser_pool", {})
+            if pool_cfg.get("enabled", False):
+                started = time.perf_counter()
+                try:
+                    from BrowserPool import BrowserPool
+                    self.browser_pool = BrowserPool(
+                        {"headless": settings.get("headless", True), **pool_cfg}, self.metrics
+                    ).start()
+                except Exception as e:
+                    # Sem pool cada job lança o próprio navegador, como antes
+                    self.browser_pool = None
+                    print(f"[-] Pool de navegadores indisponível: {e}")
+                self.record_startup("browser_pool", started)
+
+            if settings.get("watch_config", False):
+                self.config_store.watch(settings.get("config_watch_interval", 2.0))
+
+            self.state = "ready"
+            self.record_startup("time_to_ready", BOOT_STARTED)
+            print(f"[+] Servidor pronto: {self.startup_profile}")
+
+        except Exception as e:
+            self.state = "failed"
+            self.state_error = str(e)
+            print(f"[-] Falha ao inicializar subsistemas: {e}")
+        finally:
+            self.ready.set()
+
+    def on_config_reloaded(self, old, new, changes: Dict[str, Any]) -> None:
+        for site_name in changes["changed"] + changes["removed"]:
+            for cache in self.site_caches:
+                cache.invalidate_site(site_name)
+
+        if changes["settings_changed"]:
+            self.encoder = StreamEncoder(new.settings.get("serializer", "auto"))
+            print("[+] Settings recarregados (porta, host e limites de jobs exigem reinício)")
+
+        self.config = new.raw
+        self.metrics.incr("config_reloads")
+
+    def handle_reload_config(self, session: ClientSession) -> None:
+        if self.state != "ready":
+            response = self.create_response("reload_config", "Servidor ainda inicializando", False)
+        else:
+            result = self.config_store.reload()
+            response = self.create_response("reload_config", result, result["reloaded"])
+        self.send_response(session, response)
+
+    def status(self) -> Dict[str, Any]:
+        compiled = self.config_store.snapshot()
+        return {
+            "state": self.state,
+            "error": self.state_error,
+            "startup": dict(self.startup_profile),
+            "config_hash": compiled.hash[:16] if compiled else None,
+            "sites": list(compiled.sites) if compiled else [],
+            "browser_pool": self.browser_pool.status() if self.browser_pool else None,
+            "rate_limits": self.rate_limiter.status() if self.rate_limiter else None,
+            "cluster": self.coordinator.status() if self.coordinator else None,
+            "parse_cache": self.parse_cache.status() if self.parse_cache else None,
+            "scheduler": self.scheduler.status() if self.scheduler else None,
+            "connections": self.connections.status() if self.connections else None,
+            "unix_socket": self.unix_socket_path if self.unix_socket else None,
+        }
+
+    def site_timeouts(self, site, settings) -> Dict[str, Any]:
+        return {**settings.get("timeouts", {}), **site.cfg.get("timeouts", {})}
+
+    def run_worker(self, site, search_term: str, trace, settings, checkpoint=None, stop_when=None, token=None,
+                   on_page=None):
+        controller = self.rate_limiter.controller(site.name, site.cfg) if self.rate_limiter else None
+        timeouts = self.site_timeouts(site, settings)
+        worker = PlaywrightWorker(
+            site.cfg, trace, checkpoint, stop_when, self.browser_pool, controller, timeouts, on_page,
+            settings.get("headless", True)
+        )
+
+        if controller:
+            with trace.span("rate_wait", site=site.name):
+                if not controller.acquire(token.remaining() if token else None, token):
+                    raise JobCancelled("deadline")
+        try:
+            job = run_guarded(worker.execute(search_term), token, timeouts.get("site"))
+            if self.browser_pool:
+                pages_html = self.browser_pool.run(job)
+            else:
+                pages_html = asyncio.run(job)
+        finally:
+            if controller:
+                controller.release()
+                self.rate_limiter.publish(site.name)
+
+        return worker, pages_html
+
+    def crawl_site(self, site, search_term: str, trace, settings, checkpoint=None, stop_when=None, token=None,
+                   on_page=None):
+        retries = settings.get("crawl_retries", 0)
+
+        for attempt in range(retries + 1):
+            try:
+                worker, pages_html = self.run_worker(
+                    site, search_term, trace, settings, checkpoint, stop_when, token, on_page
+                )
+            except JobCancelled:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                print(f"[-] Falha no crawl de {site.name} ({e}), tentativa {attempt + 2}/{retries + 1}")
+                trace.count("crawl_retries")
+                continue
+
+            if not worker.interrupted or attempt == retries:
+                return pages_html
+
+            resume_page = checkpoint.last_page + 1 if checkpoint else 1
+            print(f"[-] Crawl de {site.name} interrompido ({worker.error}), retomando da página {resume_page}")
+            trace.count("crawl_retries")
+
+    def scrape_site(self, site, search_term: str, trace, keep_checkpoint: bool = False, debug: bool = False,
+                    incremental: bool = False, exporter=None, token=None, seen=None, settings=None):
+        """
+        No modo incremental as chaves novas vão para `seen` e só entram no
+        SeenIndex via commit_seen, depois que a entrada chegou ao cliente.
+
+        `settings` é o snapshot pego no início do job: um reload no meio
+        não muda timeouts, retries nem rate limit de quem já está rodando.
+        """
+        if settings is None:
+            settings = self.config.get("settings", {})
+        stop_when = None
+        checkpoint = None
+        known = None
+        key_member = None
+
+        if incremental:
+            key_group, key_member = key_config(site.cfg)
+            if not key_member:
+                raise ValueError(f"{site.name}: sem chave de item para o modo incremental")
+            known = self.seen_index.known(site.name, search_term)
+
+            def stop_when(html):
+                keys = extract_keys(html, site.cfg, key_member)
+                return bool(keys) and all(key in known for key in keys)
+
+        parsed = None
+        if self.coordinator:
+            # None: nenhum worker remoto atende o site e o crawl fica local
+            parsed = self.coordinator.run(
+                site, search_term, token, trace, self.site_timeouts(site, settings), known, key_member,
+                self.remote_rate_limit(settings), settings.get("crawl_retries", 0)
+            )
+
+        if parsed is None:
+            if not incremental and self.checkpoints:
+                checkpoint = self.checkpoints.open(site.name, search_term, site.hash)
+
+            parser = ParserEngine(site.cfg, trace, self.parse_cache)
+            pages_file = open(f"debug/{site.name}_debug_pages.html", "wb") if debug else None
+
+            def on_page(page_no, html):
+                # Cada página é parseada assim que chega: o job não guarda o HTML de todas
+                if not parser.feed(html, page_no) or not pages_file:
+                    return
+                if page_no > 1:
+                    pages_file.write(PAGE_BREAK)
+                pages_file.write(html if isinstance(html, bytes) else json.dumps(html, ensure_ascii=False).encode("utf-8"))
+
+            try:
+                self.crawl_site(site, search_term, trace, settings, checkpoint, stop_when, token, on_page)
+            finally:
+                if pages_file:
+                    pages_file.close()
+            if token:
+                token.check()
+
+            parsed = asyncio.run(parser.finish())
+
+        if token:
+            token.check()
+
+        if incremental:
+            parsed, new_keys = filter_new(parsed, key_group, key_member, known)
+            if seen is None:
+                self.seen_index.add(site.name, search_term, new_keys)
+            else:
+                seen.append((site.name, search_term, new_keys))
+            trace.count("new_items", len(new_keys))
+            print(f"[+] {site.name}: {len(new_keys)} itens novos para '{search_term}'")
+
+        if self.result_store:
+            try:
+                with trace.span("store_results", site=site.name):
+                    stored = self.result_store.save(site.name, site.cfg, search_term, parsed)
+                trace.count("stored_items", stored)
+            except Exception as e:
+                print(f"[-] Falha ao gravar resultados de {site.name}: {e}")
+
+        if exporter:
+            with trace.span("export", site=site.name):
+                exported = exporter.add(site.name, site.cfg, search_term, parsed)
+            trace.count("exported_rows", exported)
+
+        if checkpoint and not keep_checkpoint:
+            checkpoint.clear()
+
+        return parsed
+
+    def clear_completed_checkpoints(self, sites, terms) -> None:
+        # Job falhou: um crawl já concluído não pode ser repetido do checkpoint sem ir ao site
+        if not self.checkpoints:
+            return
+        for term in terms:
+            for site in sites:
+                self.checkpoints.clear_completed(site.name, term, site.hash)
+
+    def commit_seen(self, seen) -> None:
+        for site_name, search_term, keys in seen:
+            self.seen_index.add(site_name, search_term, keys)
+        seen.clear()
+
+    def remote_rate_limit(self, settings):
+        # Cada worker remoto aplica o próprio AIMD por site com os mesmos parâmetros
+        rate_cfg = settings.get("rate_limit", {})
+        return rate_cfg if rate_cfg.get("enabled", False) else None
+
+    def open_exporter(self, kind: str, json_data: Dict[str, Any]):
+        """Exportador pedido via "export": true ou {"format", "chunk_rows"} na requisição."""
+        options = json_data.get("export")
+        if not options:
+            return None
+        if not isinstance(options, dict):
+            options = {}
+
+        # pyarrow é pesado: só é importado quando alguém pede exportação
+        from Exporter import ChunkedExporter, export_dir
+
+        settings = self.config.get("settings", {}).get("export", {})
+        return ChunkedExporter(
+            export_dir(settings.get("dir", "exports"), kind),
+            options.get("format", settings.get("format", "auto")),
+            options.get("chunk_rows", settings.get("chunk_rows", 5000))
+        )
+
+    def priority(self, json_data: Dict[str, Any], default: str) -> str:
+        priority = json_data.get("priority", default)
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority deve ser um de {', '.join(PRIORITIES)}")
+        return priority
+
+    def run_job(self, session: ClientSession, kind: str, entries, debug: bool = False, exporter=None,
+                timeout: float = None, priority: str = None) -> bool:
+        """
+        Executa um job e transmite cada entrada (nome, função) assim que fica
+        pronta. Se a primeira entrada falhar num job de debug (scrape simples),
+        responde com erro como antes; depois disso o erro vai na própria entrada.
+        Com exportador, o resumo dos arquivos vai na entrada "$export".
+
+        Cada entrada pode trazer um terceiro item, chamado depois que ela foi
+        escrita no stream (ex.: gravar as chaves do modo incremental).
+
+        Com `priority`, o job inteiro ocupa uma vaga do scheduler dessa classe;
+        sem, as próprias entradas pegam vagas (batch pega uma por termo).
+
+        O job inteiro tem um prazo (`timeout` ou settings.timeouts.request) e é
+        cancelado se o cliente desconectar, liberando navegador e vagas.
+        """
+        stream = self.open_stream(session, "finished")
+        trace = self.metrics.trace(kind, client=str(session.addr))
+        success = True
+        slot = None
+        debug_file = None
+
+        if timeout is None:
+            timeout = self.config.get("settings", {}).get("timeouts", {}).get("request")
+        token = CancelToken(timeout)
+        session.watch(token)
+
+        try:
+            with trace.span("warm_up_wait"):
+                self.ready.wait(token.remaining())
+            token.check()
+            if self.state != "ready":
+                raise RuntimeError(f"Servidor não inicializou: {self.state_error}")
+
+            if priority and self.scheduler:
+                with trace.span("queue_wait"):
+                    slot = self.scheduler.acquire(session, priority, token)
+
+            if debug:
+                os.makedirs("debug", exist_ok=True)
+                debug_file = open("debug/debug_parsed.json", "w", encoding="utf-8")
+                debug_file.write("{")
+            else:
+                stream.open()
+
+            compiled = self.config_store.snapshot()
+            for idx, (name, produce, *delivered) in enumerate(entries(compiled, trace, token)):
+                token.check()
+                try:
+                    value = produce()
+                except Exception as e:
+                    if not stream.opened or token.cancelled:
+                        raise
+
+                    print(f"[-] Erro em {name}: {e}")
+                    value = {"error": str(e)}
+                    success = False
+                    delivered = ()
 
-                open(f"debug/{site_name}_debug_pages.html", "w", encoding="utf-8").write("\n<!-- PAGE BREAK -->\n".join(pages_html))
+                if debug_file:
+                    debug_file.write(",\n" if idx else "\n")
+                    debug_file.write(f"{json.dumps(name, ensure_ascii=False)}: ")
+                    json.dump(value, debug_file, indent=4, ensure_ascii=False)
 
-                parser = ParserEngine(site_cfg)
-                parsed = asyncio.run(parser.parse(pages_html))
+                with trace.span("serialize", entry=name):
+                    stream.add(name, value)
+                del value
+                for callback in delivered:
+                    callback()
 
-                result[site_name] = parsed
-     
-            open("debug/debug_parsed.json", "w", encoding="utf-8").write(json.dumps(result, indent=4, ensure_ascii=False))
+            if debug_file:
+                debug_file.write("\n}")
 
-            response = self.create_response("finished", result)
-            client.send(json.dumps(response, default=str).encode('utf-8'))
+            if exporter:
+                with trace.span("export"):
+                    summary = exporter.close()
+                print(f"[+] Exportadas {summary['rows']} linhas em {summary['directory']}")
+                stream.add("$export", summary)
+
+            with trace.span("serialize"):
+                stream.close(success)
+            trace.count("bytes_sent", stream.bytes_written)
 
         except Exception as e:
+            success = False
             print(f"[-] Erro no handle_request: {e}")
-            response = self.create_response("error", str(e), False)
+            if isinstance(e, JobCancelled):
+                trace.count(f"cancelled_{e.reason}")
+
             try:
-                client.send(json.dumps(response).encode('utf-8'))
+                if isinstance(e, JobCancelled) and e.reason == "disconnect":
+                    pass
+                elif stream.opened:
+                    # Entradas já enviadas: fecha o objeto para o cliente receber um JSON válido
+                    stream.close(False)
+                else:
+                    self.send_response(session, self.create_response("error", str(e), False))
             except:
                 pass
-    
-    def handle_client(self, client_socket, client_addr):
-        print(f"[+] Conexão estabelecida com {client_addr}")
-        
+        finally:
+            session.unwatch(token)
+            if debug_file:
+                debug_file.close()
+            if exporter and not exporter.closed:
+                # Job falhou no meio: o que já foi achatado ainda vai para disco
+                exporter.close()
+            if slot:
+                self.scheduler.release(slot)
+            trace.finish(success)
+            print(f"[+] Requisição de {session.addr} em {trace.to_dict()['total_s']:.2f}s ({trace.summary()})")
+
+        return success
+
+    def handle_request(self, session: ClientSession, json_data: Dict[str, Any]) -> None:
+        search_term = json_data.get("search_term")
+        incremental = json_data.get("mode") == "incremental"
+
         try:
-            while True:
-                data = client_socket.recv(self.data_payload)
-                if not data:
-                    break
-                
+            if not isinstance(search_term, str) or not search_term.strip():
+                raise ValueError("search_term ausente")
+            priority = self.priority(json_data, JOB_COMMANDS["scrape_request"])
+            exporter = self.open_exporter("scrape", json_data)
+        except Exception as e:
+            self.send_response(session, self.create_response("error", str(e), False))
+            return
+
+        def scrape(site, settings, trace, token, seen):
+            try:
+                return self.scrape_site(
+                    site, search_term, trace, debug=True, incremental=incremental, exporter=exporter, token=token,
+                    seen=seen, settings=settings
+                )
+            except BaseException:
+                self.clear_completed_checkpoints([site], [search_term])
+                raise
+
+        def entries(compiled, trace, token):
+            for site_name, site in compiled.sites.items():
+                seen = []
+                yield site_name, lambda site=site, seen=seen: scrape(site, compiled.settings, trace, token, seen), \
+                    lambda seen=seen: self.commit_seen(seen)
+
+        self.run_job(
+            session, "scrape", entries, debug=True, exporter=exporter, timeout=json_data.get("timeout"),
+            priority=priority
+        )
+
+    def handle_batch(self, session: ClientSession, json_data: Dict[str, Any]) -> None:
+        terms = [term for term in json_data.get("search_terms", []) if isinstance(term, str) and term.strip()]
+        if not terms:
+            self.send_response(session, self.create_response("error", "search_terms vazio", False))
+            return
+
+        # Os checkpoints de cada termo ficam até o fim do batch: se ele for
+        # interrompido, reenviar o mesmo batch reaproveita o que já foi baixado
+        used_sites = {}
+        incremental = json_data.get("mode") == "incremental"
+
+        try:
+            priority = self.priority(json_data, JOB_COMMANDS["batch_request"])
+            exporter = self.open_exporter("batch", json_data)
+        except Exception as e:
+            self.send_response(session, self.create_response("error", str(e), False))
+            return
+
+        def entries(compiled, trace, token):
+            used_sites.update(compiled.sites)
+
+            def scrape(term, seen):
+                return {
+                    site_name: self.scrape_site(
+                        site, term, trace, keep_checkpoint=True, incremental=incremental, exporter=exporter,
+                        token=token, seen=seen, settings=compiled.settings
+                    )
+                    for site_name, site in compiled.sites.items()
+                }
+
+            def acquire():
+                if not self.scheduler:
+                    return None
+                with trace.span("queue_wait"):
+                    return self.scheduler.acquire(session, priority, token)
+
+            def scrape_in_slot(term, seen):
+                # Uma vaga por termo: entre um termo e outro, buscas de outros clientes passam
+                slot = acquire()
                 try:
-                    json_data = json.loads(data.decode('utf-8'))
-                    print(f"[+] Recebido comando: {json_data.get('type')}")
-
-                    if json_data.get('type') == 'command' and json_data.get('content') == self.shutdown_cmd:
-                        print("[-] Shutdown command received")
-                        response = self.create_response("command", self.shutdown_cmd)
-                        client_socket.send(json.dumps(response).encode('utf-8'))
-                        break           
-                    elif json_data.get('type') == 'scrape_request':
-                        self.handle_request(client_socket, json_data)
-                    else:
-                        response = self.create_response("error", "Comando desconhecido", False)
-                        client_socket.send(json.dumps(response).encode('utf-8'))
-
-                except json.JSONDecodeError as e:
-                    message = data.decode('utf-8', errors='ignore')
-                    print(f"[-] JSON decode error from {client_addr}: {e}")
-                    
-                    if message == self.shutdown_cmd:
-                        break
-                    
-                    response = self.create_response("error", "JSON inválido", False)
-                    client_socket.send(json.dumps(response).encode('utf-8'))
-                    
+                    return scrape(term, seen)
+                finally:
+                    if slot:
+                        self.scheduler.release(slot)
+
+            capacity = self.coordinator.capacity() if self.coordinator else 0
+            if capacity <= 1 or len(terms) == 1:
+                for term in terms:
+                    seen = []
+                    yield term, lambda term=term, seen=seen: scrape_in_slot(term, seen), \
+                        lambda seen=seen: self.commit_seen(seen)
+                return
+
+            # Com workers remotos os termos rodam em paralelo até a capacidade
+            # do cluster, ocupando uma única vaga local; as entradas continuam
+            # saindo na ordem do batch
+            slot = acquire()
+            executor = ThreadPoolExecutor(max_workers=min(capacity, len(terms)))
+            futures = []
+            for term in terms:
+                seen = []
+                futures.append((term, seen, executor.submit(scrape, term, seen)))
+            try:
+                for term, seen, future in futures:
+                    yield term, future.result, lambda seen=seen: self.commit_seen(seen)
+            finally:
+                for _, _, future in futures:
+                    future.cancel()
+                executor.shutdown(wait=False)
+                if slot:
+                    self.scheduler.release(slot)
+
+        success = self.run_job(session, "batch", entries, exporter=exporter, timeout=json_data.get("timeout"))
+
+        if success and self.checkpoints:
+            for term in terms:
+                for site in used_sites.values():
+                    self.checkpoints.open(site.name, term, site.hash).clear()
+        elif not success:
+            # Os incompletos ficam para o batch repetido continuar de onde parou
+            self.clear_completed_checkpoints(used_sites.values(), terms)
+
+    def handle_query_local(self, session: ClientSession, json_data: Dict[str, Any]) -> None:
+        if not self.result_store:
+            self.send_response(session, self.create_response("query_local", "result_store desabilitado", False))
+            return
+
+        trace = self.metrics.trace("query_local", client=str(session.addr))
+        success = True
+        try:
+            with trace.span("query"):
+                content = self.result_store.query(
+                    text=json_data.get("query"),
+                    site=json_data.get("site"),
+                    processo=json_data.get("processo"),
+                    date_from=json_data.get("date_from"),
+                    date_to=json_data.get("date_to"),
+                    limit=int(json_data.get("limit", 50)),
+                    offset=int(json_data.get("offset", 0)),
+                    fts_syntax=bool(json_data.get("fts_syntax", False))
+                )
+            response = self.create_response("query_local", content)
         except Exception as e:
-            print(f"[-] Erro com cliente {client_addr}: {e}")
+            success = False
+            response = self.create_response("query_local", f"Consulta inválida: {e}", False)
         finally:
-            with self.lock:
-                if client_socket in self.clients:
-                    self.clients.remove(client_socket)
-            
-            client_socket.close()
-            print(f"[-] Conexão com {client_addr} fechada")
+            trace.finish(success)
+
+        self.send_response(session, response)
+
+    def handle_metrics(self, session: ClientSession, json_data: Dict[str, Any]) -> None:
+        if json_data.get("format") == "prometheus":
+            content = self.metrics.prometheus()
+        else:
+            content = self.metrics.snapshot(json_data.get("traces", 10))
+        self.send_response(session, self.create_response("metrics", content))
     
+    def on_open(self, session: ClientSession) -> None:
+        with self.lock:
+            self.clients.append(session)
+        self.metrics.gauge("clients_connected", len(self.clients))
+        print(f"[+] Conexão estabelecida com {session.addr}")
+
+    def on_close(self, session: ClientSession, reason: str) -> None:
+        with self.lock:
+            if session in self.clients:
+                self.clients.remove(session)
+        self.metrics.gauge("clients_connected", len(self.clients))
+        print(f"[-] Conexão com {session.addr} fechada ({reason})")
+
+    def dispatch(self, session: ClientSession, data: bytes) -> Future:
+        """Escolhe onde a mensagem roda (chamado pelo loop de conexões, não pode bloquear)."""
+        try:
+            json_data = json.loads(data.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            json_data, error = None, e
+        else:
+            error = None
+        kind = json_data.get('type') if isinstance(json_data, dict) else None
+
+        if kind == 'register_worker':
+            # A conexão passa a ser do worker até ele desconectar: thread próprio, fora dos pools
+            future = Future()
+
+            def serve():
+                try:
+                    future.set_result(self.handle_message(session, data, json_data, error))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=serve, name=f"worker-{session.addr}", daemon=True).start()
+            return future
+
+        pool = self.control_pool
+        if kind in JOB_COMMANDS:
+            # Interactive tem threads próprios: batches esperando vaga no scheduler
+            # não impedem uma busca avulsa de chegar até ele
+            priority = json_data.get("priority", JOB_COMMANDS[kind])
+            pool = self.interactive_pool if priority == "interactive" else self.job_pool
+        return pool.submit(self.handle_message, session, data, json_data, error)
+
+    def handle_message(self, session: ClientSession, data: bytes, json_data, error) -> bool:
+        """Trata uma mensagem do cliente. Retorna False para fechar a conexão."""
+        client_addr = session.addr
+        try:
+            if error is not None:
+                message = data.decode('utf-8', errors='ignore')
+                print(f"[-] JSON decode error from {client_addr}: {error}")
+
+                if message == self.shutdown_cmd:
+                    return False
+
+                response = self.create_response("error", "JSON inválido", False)
+                self.send_response(session, response)
+                return True
+
+            print(f"[+] Recebido comando: {json_data.get('type')}")
+
+            if json_data.get('type') == 'command' and json_data.get('content') == self.shutdown_cmd:
+                print("[-] Shutdown command received")
+                response = self.create_response("command", self.shutdown_cmd)
+                self.send_response(session, response)
+                return False
+            elif json_data.get('type') == 'hello':
+                self.handle_hello(session, json_data)
+            elif json_data.get('type') == 'scrape_request':
+                self.handle_request(session, json_data)
+            elif json_data.get('type') == 'batch_request':
+                self.handle_batch(session, json_data)
+            elif json_data.get('type') == 'query_local':
+                self.handle_query_local(session, json_data)
+            elif json_data.get('type') == 'metrics':
+                self.handle_metrics(session, json_data)
+            elif json_data.get('type') == 'reload_config':
+                self.handle_reload_config(session)
+            elif json_data.get('type') == 'register_worker':
+                if not self.coordinator:
+                    response = self.create_response("register_worker", "Modo cluster desabilitado", False)
+                    session.write(frame(self.encoder.dumps(response)))
+                    return False
+                session.detach()
+                self.coordinator.serve(session, json_data)
+                return False
+            elif json_data.get('type') == 'status':
+                self.send_response(session, self.create_response("status", self.status()))
+            else:
+                response = self.create_response("error", "Comando desconhecido", False)
+                self.send_response(session, response)
+            return True
+
+        except Exception as e:
+            print(f"[-] Erro com cliente {client_addr}: {e}")
+            return False
+
+    def open_unix_socket(self, path):
+        """Socket Unix para clientes na mesma máquina: mesmo protocolo do TCP, sem a pilha de rede."""
+        if not hasattr(socket, "AF_UNIX"):
+            print("[-] Socket Unix não suportado nesta plataforma, ouvindo só em TCP")
+            return None
+
+        if os.path.exists(path):
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                print(f"[-] {path} existe e não é um socket, ouvindo só em TCP")
+                return None
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                print(f"[-] Outro servidor já ouve em {path}, ouvindo só em TCP")
+                return None
+            except OSError:
+                os.remove(path)  # Sobra de um servidor que não fechou direito
+            finally:
+                probe.close()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+            os.chmod(path, 0o600)
+        except OSError as e:
+            sock.close()
+            print(f"[-] Falha ao abrir socket Unix em {path}: {e}")
+            return None
+        return sock
+
     def start(self):
         self.server_socket.bind(self.server_addr)
-        self.server_socket.listen(5)
+        listeners = [self.server_socket]
+        if self.unix_socket_path:
+            self.unix_socket = self.open_unix_socket(self.unix_socket_path)
+            if self.unix_socket:
+                listeners.append(self.unix_socket)
+
+        self.connections = ConnectionLoop(
+            listeners, self.connection_cfg, self.dispatch, ClientSession, self.on_open, self.on_close
+        )
+        for listener in listeners:
+            listener.listen(int(self.connections.settings["backlog"]))
+        self.record_startup("time_to_listen", BOOT_STARTED)
         print(f"[+] Servidor ouvindo em {self.server_addr}")
+        if self.unix_socket:
+            print(f"[+] Servidor ouvindo em {self.unix_socket_path} (socket Unix)")
+
+        # Clientes ociosos não ocupam thread: só as mensagens em tratamento usam os pools
+        self.job_pool = ThreadPoolExecutor(
+            max_workers=int(self.connections.settings["job_threads"]), thread_name_prefix="job"
+        )
+        self.interactive_pool = ThreadPoolExecutor(
+            max_workers=int(self.connections.settings["interactive_threads"]), thread_name_prefix="interactive"
+        )
+        self.control_pool = ThreadPoolExecutor(
+            max_workers=int(self.connections.settings["control_threads"]), thread_name_prefix="control"
+        )
+
+        threading.Thread(target=self.warm_up, daemon=True).start()
+        if self.parse_cache:
+            self.parse_cache.prune_in_background()
+
+        metrics_port = self.config.get("settings", {}).get("metrics_port")
+        if metrics_port:
+            try:
+                self.metrics_http = MetricsHttpServer(self.metrics, metrics_port).start()
+            except OSError as e:
+                print(f"[-] Falha ao abrir endpoint de métricas na porta {metrics_port}: {e}")
         print("[+] Digite 'exit' para parar o servidor.")
        
         threading.Thread(target=self.monitor_exit, daemon=True).start()
-        
-        while True:
-            try:
-                client_socket, client_addr = self.server_socket.accept()            
-                with self.lock:
-                    self.clients.append(client_socket)
-                
-                threading.Thread(
-                    target=self.handle_client, 
-                    args=(client_socket, client_addr), 
-                    daemon=True
-                ).start()
-            except OSError:
-                break  # Socket fechado
+
+        self.connections.run()
 
     def monitor_exit(self):
         while True:
@@ -170,20 +887,61 @@ class Server:
                 break
 
     def stop(self):
+        if self.coordinator:
+            self.coordinator.stop(self.shutdown_cmd)
+
         with self.lock:
-            for client in self.clients:
-                try:
-                    shutdown_msg = self.create_response("system", self.shutdown_cmd)
-                    client.send(json.dumps(shutdown_msg).encode('utf-8'))
-                    client.close()
-                except:
-                    pass
-            self.clients.clear()
-        
-        try:
-            self.server_socket.close()
-        except:
-            pass
+            sessions = list(self.clients)
+        for session in sessions:
+            if session.node_id:
+                continue  # Workers remotos já foram avisados pelo coordenador
+            try:
+                shutdown_msg = self.create_response("system", self.shutdown_cmd)
+                session.write(self.encode(session, shutdown_msg), block=False)
+                session.close_after_flush()
+            except OSError:
+                pass
+
+        if self.connections:
+            # Drena os avisos de shutdown e fecha os listeners e as conexões
+            self.connections.stop()
+        else:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+
+        if self.unix_socket:
+            try:
+                os.remove(self.unix_socket_path)
+            except OSError:
+                pass
+            self.unix_socket = None
+
+        for pool in (self.job_pool, self.interactive_pool, self.control_pool):
+            if pool:
+                pool.shutdown(wait=False)
+
+        self.config_store.stop()
+
+        if self.browser_pool:
+            self.browser_pool.close()
+
+        if self.checkpoints:
+            self.checkpoints.close()
+
+        self.seen_index.close()
+
+        if self.parse_cache:
+            self.parse_cache.close()
+
+        if self.result_store:
+            self.result_store.close()
+
+        if self.metrics_http:
+            self.metrics_http.stop()
+            self.metrics_http = None
+        self.browser_pool = None
 
 def delete_cookies_file():
     file_to_delete = "cookies.json"
@@ -198,11 +956,20 @@ def delete_cookies_file():
     else:
         print(f"O arquivo '{file_to_delete}' não existe.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="JurisData Server")
+    parser.add_argument("--host", default="localhost", help="Endereço de escuta")
+    parser.add_argument("--port", type=int, default=8082, help="Porta de escuta")
+    parser.add_argument("--config", help="Caminho do Config.json (padrão: o embutido)")
+    parser.add_argument("--unix-socket", help="Também ouvir neste socket Unix (padrão: settings.connections.unix_socket)")
+    return parser.parse_args()
+
 def main():
     if sys.platform.startswith('win'):
         multiprocessing.freeze_support()
 
-    server = Server()
+    args = parse_args()
+    server = Server(args.host, args.port, args.config, args.unix_socket)
     try:
         server.start()
     except KeyboardInterrupt:
@@ -2,55 +2,278 @@ import asyncio
 import random
 import json
 import os
-from playwright.async_api import async_playwright
+import re
+import time
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+from Metrics import span, count
+from Cancellation import DEFAULT_TIMEOUTS
 
 COOKIE_FILE = "cookies.json"
 
 
 class PlaywrightWorker:
-    def __init__(self, site_cfg):
+    def __init__(self, site_cfg, trace=None, checkpoint=None, stop_when=None, pool=None, limiter=None,
+                 timeouts=None, on_page=None, headless=True):
         self.cfg = site_cfg
+        # Mesmo valor (settings.headless) que o BrowserPool usa, para os dois caminhos abrirem igual
+        self.headless = headless
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.pool = pool
+        # SiteController do RateLimiter: dita o atraso entre páginas e recebe os sinais de cada resposta
+        self.limiter = limiter
+        self.last_status = None
         self.search_cfg = site_cfg["search_config"]
+        self.trace = trace
+        self.checkpoint = checkpoint
+        # stop_when(html) -> True encerra a paginação depois dessa página (modo incremental)
+        self.stop_when = stop_when
+        # on_page(page_no, html) recebe cada página assim que ela é baixada (o servidor já
+        # parseia e descarta); sem ele as páginas voltam todas na lista de execute()
+        self.on_page = on_page
+        self.pages_emitted = 0
+        self.stopped_early = False
+        self.interrupted = False
+        self.error = None
 
     async def execute(self, search_text):
-        async with async_playwright() as pw:
-            browser = await pw.chromium.launch(
-                headless=self.cfg.get("settings", {}).get("headless", True)
-            )
+        checkpoint = self.checkpoint
+        if checkpoint and checkpoint.completed:
+            print(f"[+] Crawl já concluído em checkpoint, reaproveitando {checkpoint.last_page} páginas")
+            pages_html = []
+            for html in checkpoint.iter_pages():
+                await self._emit(pages_html, html)
+            return pages_html
 
-            context = await self._create_context(browser)
+        if self.pool:
+            async with self.pool.browser(self.trace) as pooled:
+                served = self.pages_emitted
+                try:
+                    return await self._crawl(pooled.browser, search_text)
+                finally:
+                    pooled.pages_served += self.pages_emitted - served
 
+        async with async_playwright() as pw:
+            with span(self.trace, "browser_acquire"):
+                browser = await pw.chromium.launch(
+                    headless=self.headless
+                )
+            try:
+                return await self._crawl(browser, search_text)
+            finally:
+                await browser.close()
+
+    async def _crawl(self, browser, search_text):
+        checkpoint = self.checkpoint
+        resume_from = checkpoint.last_page if checkpoint else 0
+
+        with span(self.trace, "context_setup"):
+            storage_state = checkpoint.storage_state if resume_from else None
+            context = await self._create_context(browser, storage_state)
+            # Cliques e seletores sem timeout explícito herdam estes limites
+            context.set_default_timeout(self._ms("selector"))
+            context.set_default_navigation_timeout(self._ms("navigation"))
+
+        # Com o pool o navegador sobrevive ao job, então o contexto precisa ser fechado aqui
+        try:
             page = await context.new_page()
-
+            page.on("response", self._on_response)
             await self._apply_stealth(page)
-
             await page.mouse.move(50, 50, steps=10)
 
-            await page.goto(self.cfg["url"], wait_until="domcontentloaded")
-            await page.wait_for_timeout(random.randint(500, 1200))
-
-            method = self.search_cfg.get("method")
-
-            if method == "form_fill":
-                await self._handle_form_fill(page, search_text)
-
-            pages_html = [await page.content()]
+            pages_html = []
+            last_html = None
+            if resume_from:
+                print(f"[+] Retomando crawl a partir da página {resume_from + 1}")
+                for last_html in checkpoint.iter_pages():
+                    await self._emit(pages_html, last_html)
+                await self._resume(page, search_text, resume_from)
+            else:
+                try:
+                    response_time = await self._search(page, search_text)
+                except PlaywrightTimeoutError:
+                    self._observe(timeout=True)
+                    raise
+                last_html = await self._page_content(page)
+                self._observe(response_time, last_html)
+                await self._record(context, page, 1, last_html)
+                await self._emit(pages_html, last_html)
 
             max_pages = self.search_cfg.get("pagination", {}).get("max_pages", 1)
-            if max_pages:
-                pages_html += await self._handle_pagination(page, max_pages)
+            if last_html is not None and self._should_stop(last_html):
+                print("[+] Nenhum item novo na primeira página, paginação ignorada")
+            elif max_pages:
+                last_html = None
+                await self._handle_pagination(page, max_pages, self.pages_emitted, context, pages_html)
 
-            await context.storage_state(path=COOKIE_FILE)
+            if checkpoint and not self.interrupted:
+                checkpoint.mark_completed()
 
-            await browser.close()
+            await context.storage_state(path=COOKIE_FILE)
             return pages_html
+        finally:
+            await context.close()
+
+    async def _search(self, page, search_text):
+        """Faz a busca e devolve só o tempo esperando o site (sem digitação e pausas "humanas")."""
+        with span(self.trace, "navigation"):
+            started = time.perf_counter()
+            await page.goto(self.cfg["url"], wait_until="domcontentloaded", timeout=self._ms("navigation"))
+            response_time = time.perf_counter() - started
+        await page.wait_for_timeout(random.randint(500, 1200))
+
+        method = self.search_cfg.get("method")
+
+        if method == "form_fill":
+            with span(self.trace, "form_fill"):
+                response_time += await self._handle_form_fill(page, search_text)
+
+        return response_time
+
+    async def _resume(self, page, search_text, page_no):
+        """
+        Posiciona o navegador na última página concluída do checkpoint.
+
+        Usa pagination.resume_url_template ({page}) quando configurado; senão
+        a URL salva, mas só se pagination.current_page_selector confirmar que
+        ela abre a página (em paginação AJAX/POST a URL muda sem carregar o
+        número da página); em último caso refaz a busca avançando com
+        next_selector sem baixar o conteúdo.
+        """
+        cfg = self.search_cfg.get("pagination", {})
+        template = cfg.get("resume_url_template")
+
+        with span(self.trace, "resume", page=page_no):
+            if template:
+                await page.goto(
+                    template.format(page=page_no), wait_until="domcontentloaded", timeout=self._ms("navigation")
+                )
+                return
+
+            page_selector = cfg.get("current_page_selector")
+            if page_selector and self.checkpoint.url and self.checkpoint.url != self.cfg["url"]:
+                await page.goto(self.checkpoint.url, wait_until="domcontentloaded", timeout=self._ms("navigation"))
+                if await self._current_page(page, page_selector) == page_no:
+                    return
+                print(f"[-] URL salva não abre a página {page_no}, refazendo a paginação")
+
+            await self._search(page, search_text)
+            for _ in range(page_no - 1):
+                btn = await page.query_selector(cfg.get("next_selector"))
+                if not btn:
+                    raise RuntimeError(f"Não foi possível avançar até a página {page_no} para retomar")
+                await asyncio.sleep(self._pause(0.8, 1.8))
+                await btn.click(delay=random.randint(60, 150))
+                await asyncio.sleep(random.uniform(1.0, 2.0))
+                await page.wait_for_load_state("domcontentloaded", timeout=self._ms("load_state"))
+
+    async def _current_page(self, page, selector):
+        element = await page.query_selector(selector)
+        if not element:
+            return None
+        match = re.search(r"\d+", await element.inner_text())
+        return int(match.group()) if match else None
+
+    async def _record(self, context, page, page_no, html):
+        if not self.checkpoint:
+            return
+        storage_state = await context.storage_state()
+        self.checkpoint.record(page_no, html, page.url, storage_state)
+
+    async def _emit(self, pages_html, html):
+        self.pages_emitted += 1
+        if self.on_page is None:
+            pages_html.append(html)
+            return
+        # O parse é CPU puro: roda fora do event loop, que o pool compartilha entre jobs
+        await asyncio.get_running_loop().run_in_executor(None, self.on_page, self.pages_emitted, html)
+
+    def _on_response(self, response):
+        request = response.request
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            self.last_status = response.status
+
+    def _ms(self, step):
+        return self.timeouts[step] * 1000
+
+    def _pause(self, low, high):
+        return self.limiter.pause() if self.limiter else random.uniform(low, high)
+
+    def _observe(self, seconds=None, html=None, timeout=False):
+        if not self.limiter:
+            return
+        status, self.last_status = self.last_status, None
+        if self.limiter.observe(seconds, status, html, timeout):
+            count(self.trace, "rate_backoffs")
+
+    def _should_stop(self, html):
+        if not self.stop_when or not self.stop_when(html):
+            return False
+        self.stopped_early = True
+        count(self.trace, "incremental_stops")
+        return True
+
+    async def _page_content(self, page):
+        """
+        Conteúdo de uma página de resultados. Com `extraction_script` o
+        navegador já devolve um selector map parcial ({seletor: [textos]});
+        com `result_root_selector` só o outerHTML do contêiner de resultados
+        atravessa o CDP. Sem nenhum dos dois (ou se o contêiner não existir,
+        ex.: página de captcha), serializa o DOM inteiro como antes.
+        """
+        root_selector = self.cfg.get("result_root_selector")
+        script = self.cfg.get("extraction_script")
+
+        with span(self.trace, "page_content"):
+            content = None
+            if script:
+                content = await self._run_extraction_script(page, script, root_selector)
+            elif root_selector:
+                fragments = await page.eval_on_selector_all(root_selector, "els => els.map(e => e.outerHTML)")
+                if fragments:
+                    content = ("<html><body>" + "\n".join(fragments) + "</body></html>").encode("utf-8")
+
+            if content is None:
+                if root_selector or script:
+                    count(self.trace, "result_root_miss")
+                # Bytes UTF-8 da CDP direto para o lxml, sem manter a str
+                content = (await page.content()).encode("utf-8")
+
+        count(self.trace, "pages")
+        count(self.trace, "html_bytes", len(content) if isinstance(content, bytes) else len(json.dumps(content)))
+        return content
+
+    async def _run_extraction_script(self, page, script, root_selector=None):
+        if root_selector:
+            if not await page.query_selector(root_selector):
+                return None
+            data = await page.eval_on_selector(root_selector, script)
+        else:
+            data = await page.evaluate(script)
+
+        if not isinstance(data, dict):
+            raise RuntimeError("extraction_script deve retornar um objeto {seletor: [textos]}")
+
+        selector_map = {}
+        for selector, texts in data.items():
+            if isinstance(texts, str):
+                texts = [texts]
+            selector_map[selector] = [" ".join(str(text).split()) for text in texts or [] if text is not None]
+        return selector_map
 
-    async def _create_context(self, browser):
+    async def _create_context(self, browser, storage_state=None):
         ua = (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
             "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         )
 
+        if storage_state:
+            return await browser.new_context(
+                user_agent=ua,
+                viewport={"width": 1280, "height": 720},
+                storage_state=storage_state
+            )
+
         if os.path.exists(COOKIE_FILE):
             return await browser.new_context(
                 user_agent=ua,
@@ -73,7 +296,7 @@ class PlaywrightWorker:
     async def _handle_form_fill(self, page, search_text):
         cfg = self.search_cfg
 
-        await page.wait_for_selector(cfg["input_selector"], state="visible")
+        await page.wait_for_selector(cfg["input_selector"], state="visible", timeout=self._ms("selector"))
         await asyncio.sleep(random.uniform(0.3, 0.8))
 
         await page.type(cfg["input_selector"], search_text,
@@ -81,6 +304,8 @@ class PlaywrightWorker:
 
         await asyncio.sleep(random.uniform(0.2, 1.0))
 
+        settle = random.uniform(1.0, 2.0)
+        started = time.perf_counter()
         if cfg.get("aspnet") and cfg.get("submit_method") == "postback":
             try:
                 await page.click(cfg["submit_selector"], delay=random.randint(50, 150))
@@ -91,29 +316,48 @@ class PlaywrightWorker:
         else:
             await page.click(cfg["submit_selector"], delay=random.randint(50, 150))
 
-        await asyncio.sleep(random.uniform(1.0, 2.0))
-        await page.wait_for_load_state("domcontentloaded")
+        await asyncio.sleep(settle)
+        await page.wait_for_load_state("domcontentloaded", timeout=self._ms("load_state"))
+        # Como na paginação: o settle é pausa nossa, não lentidão do site
+        return time.perf_counter() - started - settle
 
-    async def _handle_pagination(self, page, max_pages):
+    async def _handle_pagination(self, page, max_pages, current_page=1, context=None, pages=None):
         cfg = self.search_cfg["pagination"]
         next_sel = cfg.get("next_selector")
-        pages = []
+        pages = [] if pages is None else pages
 
-        for _ in range(max_pages - 1):
+        for page_no in range(current_page + 1, max_pages + 1):
             try:
                 btn = await page.query_selector(next_sel)
                 if not btn:
                     break
 
-                await asyncio.sleep(random.uniform(0.8, 1.8))
-                await btn.click(delay=random.randint(60, 150))
-
-                await asyncio.sleep(random.uniform(1.0, 2.0))
-                await page.wait_for_load_state("domcontentloaded")
-
-                pages.append(await page.content())
+                await asyncio.sleep(self._pause(0.8, 1.8))
+                with span(self.trace, "pagination_step", page=page_no):
+                    settle = random.uniform(1.0, 2.0)
+                    started = time.perf_counter()
+                    await btn.click(delay=random.randint(60, 150))
+
+                    await asyncio.sleep(settle)
+                    await page.wait_for_load_state("domcontentloaded", timeout=self._ms("load_state"))
+
+                html = await self._page_content(page)
+                self._observe(time.perf_counter() - started - settle, html)
+                await self._record(context, page, page_no, html)
+
+            except Exception as e:
+                if isinstance(e, PlaywrightTimeoutError):
+                    self._observe(timeout=True)
+                print(f"[-] Paginação interrompida na página {page_no}: {e}")
+                self.interrupted = True
+                self.error = str(e)
+                break
 
-            except Exception:
+            await self._emit(pages, html)
+            stop = self._should_stop(html)
+            del html
+            if stop:
+                print(f"[+] Só itens já vistos na página {page_no}, paginação encerrada")
                 break
 
         return pages
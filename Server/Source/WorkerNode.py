@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from Cancellation import CancelToken, JobCancelled, run_guarded
+from Cluster import send_message, read_message
+from Incremental import extract_keys
+from Metrics import Metrics
+from RateLimiter import RateLimiter
+from Serializer import StreamEncoder
+from Worker import PlaywrightWorker
+from ParserEngine import ParserEngine
+
+
+class WorkerNode:
+    """
+    Processo de scraping remoto. Registra-se num Server com o modo cluster
+    ligado, anuncia a capacidade (jobs simultâneos) e executa crawl + parse
+    dos jobs que o coordenador mandar, devolvendo o resultado organizado.
+
+    Se a conexão cair, os jobs em andamento são cancelados (o coordenador
+    já os redistribuiu) e o worker tenta se registrar de novo.
+    """
+
+    def __init__(self, host="localhost", port=8082, node_id=None, capacity=2, sites=None, pool_settings=None,
+                 headless=True):
+        self.coordinator_addr = (host, port)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.capacity = max(1, capacity)
+        self.sites = sites or []
+        self.pool_settings = pool_settings
+        self.headless = headless
+        self.encoder = StreamEncoder("auto")
+        self.metrics = Metrics()
+        self.rate_limiter = None
+        self.browser_pool = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.socket = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        if self.pool_settings is not None:
+            try:
+                from BrowserPool import BrowserPool
+                self.browser_pool = BrowserPool(
+                    {"size": self.capacity, "headless": self.headless, **self.pool_settings}, self.metrics
+                ).start()
+            except Exception as e:
+                self.browser_pool = None
+                print(f"[-] Pool de navegadores indisponível: {e}")
+        return self
+
+    def connect(self):
+        sock = socket.create_connection(self.coordinator_addr, timeout=10)
+        sock.settimeout(None)
+        register = {"type": "register_worker", "node_id": self.node_id, "capacity": self.capacity, "sites": self.sites}
+        sock.sendall(json.dumps(register).encode("utf-8"))
+
+        reply = read_message(sock)
+        if not reply or not reply.get("success"):
+            sock.close()
+            raise ConnectionError(f"Registro recusado: {reply.get('content') if reply else 'conexão fechada'}")
+        return sock, reply["content"]
+
+    def run(self):
+        backoff = 1.0
+        while not self.stopping.is_set():
+            try:
+                sock, info = self.connect()
+            except (OSError, ValueError) as e:
+                print(f"[-] Coordenador {self.coordinator_addr} indisponível ({e}), nova tentativa em {backoff:.0f}s")
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            self.socket = sock
+            print(f"[+] Registrado como {info['node_id']} em {self.coordinator_addr} (capacidade {self.capacity})")
+            threading.Thread(
+                target=self._heartbeat, args=(sock, info.get("heartbeat_interval", 5.0)), daemon=True
+            ).start()
+
+            try:
+                self._serve(sock)
+            except (OSError, ValueError) as e:
+                print(f"[-] Erro na conexão com o coordenador: {e}")
+            finally:
+                self.socket = None
+                self._cancel_all("coordenador desconectado")
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+    def _serve(self, sock):
+        while not self.stopping.is_set():
+            message = read_message(sock)
+            if message is None:
+                print("[-] Conexão com o coordenador perdida")
+                return
+
+            kind = message.get("type")
+            if kind == "job":
+                threading.Thread(target=self._run_job, args=(sock, message), daemon=True).start()
+            elif kind == "cancel":
+                with self.lock:
+                    token = self.jobs.get(message.get("job_id"))
+                if token:
+                    token.cancel(message.get("reason") or "coordenador")
+            elif kind == "system":
+                print("[-] Coordenador encerrando")
+                return
+
+    def _heartbeat(self, sock, interval):
+        while self.socket is sock and not self.stopping.wait(interval):
+            with self.lock:
+                in_flight = len(self.jobs)
+            try:
+                send_message(sock, {
+                    "type": "heartbeat", "capacity": self.capacity, "in_flight": in_flight, "timestamp": time.time()
+                }, self.encoder, self.send_lock)
+            except OSError:
+                return
+
+    def _run_job(self, sock, message):
+        job_id = message.get("job_id")
+        token = CancelToken(message.get("timeout"))
+        with self.lock:
+            self.jobs[job_id] = token
+
+        try:
+            with self.slots:
+                content = self.scrape(message, token)
+            reply = {"type": "result", "job_id": job_id, "success": True, "content": content}
+        except Exception as e:
+            print(f"[-] Job {job_id} ({message.get('site')}) falhou: {e}")
+            reply = {"type": "result", "job_id": job_id, "success": False, "content": str(e)}
+        finally:
+            with self.lock:
+                self.jobs.pop(job_id, None)
+
+        if token.cancelled:
+            return  # O coordenador já desistiu do job
+
+        try:
+            send_message(sock, reply, self.encoder, self.send_lock)
+        except OSError as e:
+            print(f"[-] Resultado do job {job_id} perdido: {e}")
+
+    def scrape(self, message, token):
+        site_name = message["site"]
+        site_cfg = message["site_cfg"]
+        search_term = message["search_term"]
+        timeouts = message.get("timeouts") or {}
+        trace = self.metrics.trace("remote_job", site=site_name)
+
+        stop_when = None
+        if message.get("known") is not None and message.get("key_member"):
+            known = set(message["known"])
+            key_member = message["key_member"]
+
+            def stop_when(html):
+                keys = extract_keys(html, site_cfg, key_member)
+                return bool(keys) and all(key in known for key in keys)
+
+        controller = None
+        if message.get("rate_limit"):
+            if self.rate_limiter is None:
+                self.rate_limiter = RateLimiter(message["rate_limit"], self.metrics)
+            controller = self.rate_limiter.controller(site_name, site_cfg)
+
+        parser = ParserEngine(site_cfg, trace)
+        success = False
+        try:
+            retries = message.get("retries", 0)
+            for attempt in range(retries + 1):
+                # Páginas parseadas conforme chegam; num retry as já mescladas são ignoradas
+                worker = PlaywrightWorker(
+                    site_cfg, trace, None, stop_when, self.browser_pool, controller, timeouts,
+                    lambda page_no, html: parser.feed(html, page_no), self.headless
+                )
+                try:
+                    self._crawl(worker, search_term, controller, token, timeouts)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    if attempt == retries:
+                        raise
+                    print(f"[-] Falha no crawl de {site_name} ({e}), tentativa {attempt + 2}/{retries + 1}")
+                    trace.count("crawl_retries")
+                    continue
+
+                # Sem checkpoint no worker remoto: crawl interrompido recomeça do início
+                if not worker.interrupted or attempt == retries:
+                    break
+                trace.count("crawl_retries")
+
+            token.check()
+            parsed = asyncio.run(parser.finish())
+            success = True
+            return parsed
+        finally:
+            trace.finish(success)
+            print(f"[+] Job {site_name} '{search_term}' em {trace.to_dict()['total_s']:.2f}s ({trace.summary()})")
+
+    def _crawl(self, worker, search_term, controller, token, timeouts):
+        if controller and not controller.acquire(token.remaining()):
+            raise JobCancelled("deadline")
+        try:
+            job = run_guarded(worker.execute(search_term), token, timeouts.get("site"))
+            if self.browser_pool:
+                return self.browser_pool.run(job)
+            return asyncio.run(job)
+        finally:
+            if controller:
+                controller.release()
+
+    def _cancel_all(self, reason):
+        with self.lock:
+            tokens = list(self.jobs.values())
+        for token in tokens:
+            token.cancel(reason)
+
+    def stop(self):
+        self.stopping.set()
+        self._cancel_all("worker encerrando")
+        sock = self.socket
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.browser_pool:
+            self.browser_pool.close()
+            self.browser_pool = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="JurisData Worker (nó remoto do modo cluster)")
+    parser.add_argument("--coordinator", default="localhost:8082", help="host:porta do Server coordenador")
+    parser.add_argument("--node-id", help="Identificador do worker (padrão: hostname-pid)")
+    parser.add_argument("--capacity", type=int, default=2, help="Jobs simultâneos anunciados ao coordenador")
+    parser.add_argument("--sites", help="Sites atendidos, separados por vírgula (padrão: todos)")
+    parser.add_argument("--pool", action="store_true", help="Reaproveita navegadores entre jobs (BrowserPool)")
+    parser.add_argument("--headed", action="store_true", help="Navegadores com janela (com ou sem pool)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    host, _, port = args.coordinator.rpartition(":")
+    sites = [name.strip() for name in args.sites.split(",") if name.strip()] if args.sites else None
+    pool_settings = {} if args.pool else None
+
+    node = WorkerNode(
+        host or "localhost", int(port), args.node_id, args.capacity, sites, pool_settings, not args.headed
+    ).start()
+    try:
+        node.run()
+    except KeyboardInterrupt:
+        print("\n[-] Worker interrompido pelo usuário.")
+    finally:
+        node.stop()
+        print("[-] Worker desligado")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
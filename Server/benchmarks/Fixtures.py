@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Páginas de resultado usadas pelos benchmarks e pelo teste de carga.
+
+As páginas gravadas vêm dos dumps debug/<site>_debug_pages.html que o
+servidor escreve a cada busca. Quando não há dumps, gera páginas
+sintéticas no formato de resultados do TJSP (cjsg), escaláveis em número
+de itens.
+"""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+SOURCE_DIR = SERVER_DIR / "Source"
+PAGE_BREAK = "\n<!-- PAGE BREAK -->\n"
+
+if str(SOURCE_DIR) not in sys.path:
+    sys.path.insert(0, str(SOURCE_DIR))
+
+
+EMENTA_FIELDS = [
+    "Classe/Assunto:",
+    "Relator(a):",
+    "Comarca:",
+    "Órgão julgador:",
+    "Data do julgamento:",
+    "Data de publicação:",
+    "Ementa:",
+]
+
+WORDS = (
+    "apelação cível recurso provido parcialmente sentença mantida dano moral "
+    "indenização contrato bancário revisão juros abusividade prescrição "
+    "responsabilidade civil consumidor fornecedor prova pericial honorários"
+).split()
+
+
+def load_config(config_path=None):
+    config_path = Path(config_path) if config_path else SOURCE_DIR / "Config.json"
+    with open(config_path, "r", encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def load_recorded_pages(debug_dir="debug"):
+    """Retorna {site: [html, ...]} a partir dos dumps de debug existentes."""
+    recorded = {}
+    for path in sorted(Path(debug_dir).glob("*_debug_pages.html")):
+        site_name = path.name[: -len("_debug_pages.html")]
+        content = path.read_text(encoding="utf-8")
+        recorded[site_name] = [page for page in content.split(PAGE_BREAK) if page.strip()]
+    return recorded
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_item(rng, number):
+    processo = f"{rng.randint(1000000, 9999999)}-{rng.randint(10, 99)}.20{rng.randint(10, 25)}.8.26.{rng.randint(1, 9999):04d}"
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2015, 2025)
+
+    values = [
+        f"Apelação Cível / {_sentence(rng, 3)}",
+        f"Des. {rng.choice(['Ana', 'Carlos', 'Marcos', 'Paula'])} {rng.choice(['Souza', 'Lima', 'Rocha'])}",
+        rng.choice(["São Paulo", "Campinas", "Santos", "Sorocaba"]),
+        f"{rng.randint(1, 38)}ª Câmara de Direito Privado",
+        f"{day:02d}/{month:02d}/{year}",
+        f"{day:02d}/{month:02d}/{year}",
+        " ".join(_sentence(rng, rng.randint(12, 40)) for _ in range(rng.randint(2, 6))),
+    ]
+
+    rows = "\n".join(
+        f'<tr class="ementaClass2"><td colspan="2"><strong>{label}</strong> {value}</td></tr>'
+        for label, value in zip(EMENTA_FIELDS, values)
+    )
+
+    return f"""
+<tr class="fundocinza1">
+  <td class="tdResultados">{number}</td>
+  <td>
+    <table class="resultadoCompleto">
+      <tr class="ementaClass">
+        <td><a class="esajLinkLogin downloadEmenta" href="#" data-id="{number}">{processo}</a></td>
+      </tr>
+      {rows}
+    </table>
+  </td>
+</tr>"""
+
+
+def synthetic_page(items=20, page=1, seed=0, next_href=None):
+    rng = random.Random(seed * 100003 + page)
+    body = "\n".join(synthetic_item(rng, (page - 1) * items + i + 1) for i in range(items))
+    next_link = f'<a title="Próxima página" href="{next_href}">&gt;</a>' if next_href else ""
+
+    return f"""<!DOCTYPE html>
+<html>
+<head><title>Consulta de Jurisprudência</title><script>var esaj = {{}};</script></head>
+<body>
+  <div id="header"><ul class="menu"><li><a href="#">Início</a></li><li><a href="#">Consultas</a></li></ul></div>
+  <div id="divDadosResultado">
+    <div class="paginacao">Resultados {(page - 1) * items + 1} a {page * items} {next_link}</div>
+    <table class="resultados">
+{body}
+    </table>
+  </div>
+  <div id="footer"><p class="rodape">Tribunal de Justiça do Estado de São Paulo</p></div>
+</body>
+</html>"""
+
+
+def synthetic_pages(scale=1, pages=1, items_per_page=20, seed=0):
+    """Gera `pages` páginas com `items_per_page * scale` itens cada."""
+    return [synthetic_page(items_per_page * scale, page + 1, seed) for page in range(pages)]
+
+
+def trim_to_root(pages_html, root_selector):
+    """Equivalente offline do result_root_selector do worker: só o outerHTML do contêiner."""
+    from parsel import Selector
+
+    trimmed = []
+    for html in pages_html:
+        fragments = Selector(html).css(root_selector).getall()
+        trimmed.append("<html><body>" + "\n".join(fragments) + "</body></html>" if fragments else html)
+    return trimmed
+
+
+def fixture_sets(scales=(1, 10, 100), debug_dir="debug", pages=1):
+    """Retorna [(nome, site, [html, ...])] com gravações e páginas sintéticas."""
+    sets = []
+    for site_name, pages_html in load_recorded_pages(debug_dir).items():
+        sets.append((f"recorded:{site_name}", site_name, pages_html))
+        for scale in scales:
+            if scale > 1:
+                sets.append((f"recorded:{site_name}x{scale}", site_name, pages_html * scale))
+
+    for scale in scales:
+        sets.append((f"synthetic:x{scale}", "TJSP", synthetic_pages(scale, pages)))
+
+    return sets
+
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Teste de carga ponta a ponta do Server contra o tribunal falso local.
+
+Sobe o MockTribunal, inicia o Server com um Config.json apontando para ele
+(ou usa um servidor já rodando via --server) e abre vários clientes de
+socket concorrentes enviando scrape_request. Reporta vazão, latência
+p50/p95/p99 e, ao longo do tempo, quantidade de navegadores e memória do
+processo do servidor.
+
+Usage:
+    python benchmarks/LoadTest.py --clients 4 --requests 3
+    python benchmarks/LoadTest.py --clients 16 --pages 3 --save load.json
+    python benchmarks/LoadTest.py --server localhost:8082 --clients 8
+    python benchmarks/LoadTest.py --unix-socket --clients 8
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from Fixtures import SOURCE_DIR
+from MockTribunal import MockTribunal
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+BROWSER_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+class ResponseReader:
+    """Lê uma resposta JSON sem framing, contando chaves como o cliente C++."""
+
+    def __init__(self, sock, buffer_size=65536):
+        self.sock = sock
+        self.buffer_size = buffer_size
+
+    def read(self):
+        depth = 0
+        in_string = False
+        escaped = False
+        started = False
+        received = bytearray()
+
+        while True:
+            data = self.sock.recv(self.buffer_size)
+            if not data:
+                raise ConnectionError("Conexão fechada pelo servidor")
+
+            received += data
+            for byte in data:
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif byte == 0x5C:  # \
+                        escaped = True
+                    elif byte == 0x22:  # "
+                        in_string = False
+                elif byte == 0x22:
+                    in_string = True
+                elif byte in (0x7B, 0x5B):  # { [
+                    depth += 1
+                    started = True
+                elif byte in (0x7D, 0x5D):  # } ]
+                    depth -= 1
+
+            if started and depth == 0 and not in_string:
+                return bytes(received)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def process_tree(pid):
+    if psutil is None or pid is None:
+        return []
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            browsers = 0
+            rss = 0
+            for proc in process_tree(self.pid):
+                try:
+                    name = proc.name().lower()
+                    rss += proc.memory_info().rss
+                    if any(browser in name for browser in BROWSER_NAMES) and "--type=" not in " ".join(proc.cmdline()):
+                        browsers += 1
+                except psutil.Error:
+                    continue
+
+            self.samples.append({
+                "t": round(time.perf_counter() - start, 3),
+                "browsers": browsers,
+                "rss_mb": round(rss / (1024 * 1024), 2),
+            })
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def connect(server_addr, timeout=None):
+    """(host, porta) abre TCP; um caminho abre o socket Unix do servidor."""
+    if isinstance(server_addr, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(server_addr)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection(server_addr, timeout=timeout)
+
+
+def client_worker(server_addr, terms, results, lock):
+    for term in terms:
+        start = time.perf_counter()
+        entry = {"term": term, "ok": False, "bytes": 0}
+        try:
+            with connect(server_addr) as sock:
+                request = {"type": "scrape_request", "search_term": term}
+                sock.sendall(json.dumps(request).encode("utf-8"))
+                payload = ResponseReader(sock).read()
+                response = json.loads(payload)
+                entry["ok"] = bool(response.get("success"))
+                entry["bytes"] = len(payload)
+                if not entry["ok"]:
+                    entry["error"] = str(response.get("content"))[:200]
+        except Exception as e:
+            entry["error"] = str(e)
+
+        entry["latency_s"] = time.perf_counter() - start
+        with lock:
+            results.append(entry)
+
+
+def fetch_server_metrics(server_addr):
+    try:
+        with connect(server_addr, timeout=10) as sock:
+            sock.sendall(json.dumps({"type": "metrics", "traces": 0}).encode("utf-8"))
+            response = json.loads(ResponseReader(sock).read())
+            return response.get("content")
+    except Exception as e:
+        print(f"[-] Falha ao obter métricas do servidor: {e}")
+        return None
+
+
+def wait_for_port(addr, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with connect(addr, timeout=1.0):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(config_path, port, workdir, unix_socket=None):
+    cmd = [sys.executable, str(SOURCE_DIR / "Server.py"), "--host", "127.0.0.1",
+           "--port", str(port), "--config", config_path]
+    if unix_socket:
+        cmd += ["--unix-socket", unix_socket]
+    log = open(os.path.join(workdir, "server.log"), "w", encoding="utf-8")
+    return subprocess.Popen(cmd, cwd=workdir, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_server(process):
+    try:
+        process.stdin.write(b"exit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    except Exception:
+        process.kill()
+
+
+def summarize(results, elapsed, samples):
+    latencies = [entry["latency_s"] for entry in results if entry["ok"]]
+    failures = [entry for entry in results if not entry["ok"]]
+
+    return {
+        "requests": len(results),
+        "succeeded": len(latencies),
+        "failed": len(failures),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 4) if elapsed else None,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "bytes_received": sum(entry["bytes"] for entry in results),
+        "max_browsers": max((sample["browsers"] for sample in samples), default=None),
+        "max_rss_mb": max((sample["rss_mb"] for sample in samples), default=None),
+        "errors": sorted({entry.get("error", "") for entry in failures})[:10],
+        "samples": samples,
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="jurisdata_load_")
+    tribunal = MockTribunal(port=args.tribunal_port, pages=args.pages, items=args.items, latency=args.latency).start()
+    server_process = None
+
+    try:
+        if args.server:
+            host, port = args.server.rsplit(":", 1)
+            server_addr = (host, int(port))
+            server_pid = args.server_pid
+        else:
+            config_path = tribunal.write_config(os.path.join(workdir, "Config.json"))
+            server_addr = ("127.0.0.1", free_port())
+            if args.unix_socket == "":
+                args.unix_socket = os.path.join(workdir, "server.sock")
+            server_process = start_server(config_path, server_addr[1], workdir, args.unix_socket)
+            server_pid = server_process.pid
+
+        if args.unix_socket:
+            # Clientes pelo socket Unix do servidor em vez do TCP
+            server_addr = args.unix_socket
+
+        if not wait_for_port(server_addr, args.startup_timeout):
+            raise RuntimeError(f"Servidor não respondeu em {server_addr}")
+
+        print(f"[+] Tribunal falso: {tribunal.base_url}  Servidor: {server_addr}  Workdir: {workdir}")
+        print(f"[+] {args.clients} clientes x {args.requests} requisições, {args.pages} páginas de {args.items} itens")
+
+        sampler = ResourceSampler(server_pid, args.sample_interval)
+        sampler.start()
+
+        results = []
+        lock = threading.Lock()
+        threads = []
+        start = time.perf_counter()
+        for client_idx in range(args.clients):
+            terms = [f"dano moral {client_idx}-{req_idx}" for req_idx in range(args.requests)]
+            thread = threading.Thread(target=client_worker, args=(server_addr, terms, results, lock), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        sampler.stop()
+        report = summarize(results, elapsed, sampler.samples)
+        report["tribunal_requests"] = tribunal.requests
+        report["server_metrics"] = fetch_server_metrics(server_addr)
+        report["settings"] = {
+            "clients": args.clients, "requests": args.requests,
+            "pages": args.pages, "items": args.items, "latency": args.latency,
+        }
+        return report
+
+    finally:
+        if server_process:
+            stop_server(server_process)
+        tribunal.stop()
+
+
+def print_report(report):
+    latency = report["latency_s"]
+    fmt = lambda value: f"{value:.2f}s" if value is not None else "-"
+
+    print(f"\nRequisições: {report['succeeded']}/{report['requests']} ok em {report['elapsed_s']}s")
+    print(f"Vazão: {report['throughput_rps']} req/s")
+    print(f"Latência: p50 {fmt(latency['p50'])}  p95 {fmt(latency['p95'])}  p99 {fmt(latency['p99'])}  max {fmt(latency['max'])}")
+    print(f"Navegadores (máx): {report['max_browsers']}  RSS do servidor (máx): {report['max_rss_mb']} MB")
+    print(f"Requisições ao tribunal falso: {report['tribunal_requests']}")
+    for error in report["errors"]:
+        print(f"  [-] {error}")
+
+    stages = (report.get("server_metrics") or {}).get("stages", {})
+    if stages:
+        print("Estágios no servidor (média):")
+        for name, stats in stages.items():
+            print(f"  {name:<20} {fmt(stats['avg_s'])} x{stats['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do JurisData Server")
+    parser.add_argument("--clients", type=int, default=4, help="Clientes concorrentes")
+    parser.add_argument("--requests", type=int, default=2, help="Requisições por cliente")
+    parser.add_argument("--pages", type=int, default=3, help="Páginas de resultado por busca")
+    parser.add_argument("--items", type=int, default=20, help="Itens por página")
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso do tribunal falso por resposta (s)")
+    parser.add_argument("--server", help="host:porta de um servidor já rodando (precisa usar o config do mock)")
+    parser.add_argument("--unix-socket", nargs="?", const="",
+                        help="Conecta pelo socket Unix (sem valor: um no workdir do servidor iniciado aqui)")
+    parser.add_argument("--tribunal-port", type=int, default=0, help="Porta fixa do tribunal falso (0 = livre)")
+    parser.add_argument("--server-pid", type=int, help="PID do servidor externo, para amostrar memória")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Intervalo de amostragem (s)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="Espera pelo servidor (s)")
+    parser.add_argument("--save", help="Salva o relatório JSON neste caminho")
+    args = parser.parse_args()
+    if args.server and args.unix_socket == "":
+        parser.error("com --server, informe o caminho do socket Unix em --unix-socket")
+
+    if psutil is None:
+        print("[-] psutil não instalado: navegadores e memória não serão amostrados")
+
+    report = run(args)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as arquivo:
+            json.dump(report, arquivo, indent=4)
+        print(f"[+] Relatório salvo em {args.save}")
+
+
+if __name__ == "__main__":
+    main()
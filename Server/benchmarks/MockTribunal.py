@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Site local que imita a consulta de jurisprudência do TJSP para testes offline.
+
+Serve o formulário de busca (input_selector/submit_selector do Config.json)
+e páginas de resultado sintéticas com o link "Próxima página" usado pelo
+next_selector, para que o PlaywrightWorker rode sem tocar no tribunal.
+
+Usage:
+    python benchmarks/MockTribunal.py --port 8090 --pages 5 --items 20
+"""
+
+import argparse
+import copy
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote_plus
+
+from Fixtures import load_config, synthetic_page
+
+SEARCH_PATH = "/cjsg/resultadoCompleta.do"
+RESULT_PATH = "/cjsg/resultado"
+
+SEARCH_FORM = """<!DOCTYPE html>
+<html>
+<head><title>Consulta de Jurisprudência</title></head>
+<body>
+  <form action="{action}" method="get">
+    <input type="text" id="iddados.buscaInteiroTeor" name="q">
+    <input type="submit" id="pbSubmit" value="Consultar">
+  </form>
+</body>
+</html>"""
+
+
+class MockTribunalHandler(BaseHTTPRequestHandler):
+    server_version = "MockTribunal/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        settings = self.server.settings
+
+        if settings["latency"]:
+            time.sleep(settings["latency"])
+
+        if url.path == SEARCH_PATH:
+            self._send(SEARCH_FORM.format(action=RESULT_PATH))
+        elif url.path == RESULT_PATH:
+            term = query.get("q", [""])[0]
+            page = int(query.get("page", ["1"])[0])
+            next_href = None
+            if page < settings["pages"]:
+                next_href = f"{RESULT_PATH}?q={quote_plus(term)}&page={page + 1}"
+            seed = sum(map(ord, term))
+            self._send(synthetic_page(settings["items"], page, seed, next_href))
+        else:
+            self.send_error(404)
+
+        with self.server.lock:
+            self.server.requests += 1
+
+    def _send(self, html):
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockTribunal:
+    def __init__(self, host="127.0.0.1", port=0, pages=5, items=20, latency=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), MockTribunalHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.settings = {"pages": pages, "items": items, "latency": latency}
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def site_config(self, base_config=None, site_name="TJSP", max_pages=None):
+        """Config.json com o site apontado para este servidor local."""
+        config = copy.deepcopy(base_config or load_config())
+        site_cfg = config["sites"][site_name]
+        config["sites"] = {site_name: site_cfg}
+        config.setdefault("settings", {})["headless"] = True
+
+        site_cfg["url"] = self.base_url + SEARCH_PATH
+        pagination = site_cfg["search_config"].setdefault("pagination", {})
+        pagination["max_pages"] = max_pages or self.httpd.settings["pages"]
+        return config
+
+    def write_config(self, path, **kwargs):
+        with open(path, "w", encoding="utf-8") as arquivo:
+            json.dump(self.site_config(**kwargs), arquivo, indent=4, ensure_ascii=False)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tribunal falso local para testes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--pages", type=int, default=5, help="Páginas de resultado por busca")
+    parser.add_argument("--items", type=int, default=20, help="Itens por página")
+    parser.add_argument("--latency", type=float, default=0.0, help="Atraso por resposta (s)")
+    parser.add_argument("--write-config", help="Escreve um Config.json apontando para o mock")
+    args = parser.parse_args()
+
+    tribunal = MockTribunal(args.host, args.port, args.pages, args.items, args.latency)
+    if args.write_config:
+        tribunal.write_config(args.write_config)
+        print(f"[+] Config escrito em {args.write_config}")
+
+    print(f"[+] Tribunal falso em {tribunal.base_url}{SEARCH_PATH}")
+    try:
+        tribunal.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tribunal.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
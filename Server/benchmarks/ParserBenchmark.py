@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark do ParserEngine sobre páginas de resultado gravadas/sintéticas.
+
+Mede, por estágio (UniversalParser.parse, DataOrganizer.organize e
+ParserEngine.parse): tempo de parede, variação de RSS durante o estágio (amostrada), alocações (tracemalloc)
+e tamanho do selector map.
+
+Usage:
+    python benchmarks/ParserBenchmark.py
+    python benchmarks/ParserBenchmark.py --scales 1 10 --repeat 5
+    python benchmarks/ParserBenchmark.py --save benchmarks/baselines/main.json
+    python benchmarks/ParserBenchmark.py --compare benchmarks/baselines/main.json
+    python benchmarks/ParserBenchmark.py --result-root "#divDadosResultado"
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from Fixtures import SERVER_DIR, fixture_sets, load_config, trim_to_root
+
+from ParserEngine import UniversalParser, DataOrganizer, ParserEngine
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RSS_SAMPLE_SECONDS = 0.005
+
+
+def current_rss_mb():
+    # RSS atual, não o pico da vida do processo (ru_maxrss só sobe e mistura estágios)
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm", "r") as arquivo:
+            pages = int(arquivo.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class RssSampler:
+    """Amostra o RSS numa thread durante o estágio para achar o pico acima do início."""
+
+    def __init__(self):
+        self.before = current_rss_mb()
+        self.peak = self.before
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        if self.before is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+        self.after = current_rss_mb()
+        if self.after is not None and self.peak is not None:
+            self.peak = max(self.peak, self.after)
+
+    def _run(self):
+        while not self.stop_event.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss_mb() or 0.0)
+
+    def metrics(self):
+        if self.before is None or self.after is None:
+            return {"rss_peak_delta_mb": None, "rss_retained_mb": None}
+        return {
+            "rss_peak_delta_mb": round(self.peak - self.before, 3),
+            "rss_retained_mb": round(self.after - self.before, 3),
+        }
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVER_DIR, capture_output=True, text=True
+        )
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def measure(fn, trace=False):
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+
+    metrics = {"wall_s": round(elapsed, 6), **rss.metrics()}
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics["alloc_peak_mb"] = round(peak / (1024 * 1024), 3)
+        metrics["alloc_retained_mb"] = round(current / (1024 * 1024), 3)
+
+    return result, metrics
+
+
+def selector_map_stats(selector_map):
+    stats = selector_map.stats()
+    return {
+        "selector_keys": stats["keys"],
+        "selector_texts": stats["entries"],
+        "distinct_texts": stats["distinct_texts"],
+    }
+
+
+def bench_fixture(site_cfg, pages_html, repeat):
+    runs = {"UniversalParser.parse": [], "DataOrganizer.organize": [], "ParserEngine.parse": []}
+    stats = {}
+
+    # A primeira rodada roda sob tracemalloc (só alocações); as demais medem tempo
+    for iteration in range(repeat + 1):
+        trace = iteration == 0
+
+        parser = UniversalParser(site_cfg)
+        selector_map, metrics = measure(lambda: asyncio.run(parser.parse(pages_html)), trace)
+        runs["UniversalParser.parse"].append(metrics)
+        stats = selector_map_stats(selector_map)
+
+        organizer = DataOrganizer(site_cfg)
+        organized, metrics = measure(lambda: asyncio.run(organizer.organize(selector_map)), trace)
+        runs["DataOrganizer.organize"].append(metrics)
+        stats["root_items"] = sum(len(items) for items in organized.values() if isinstance(items, list))
+        del selector_map, organized
+
+        engine = ParserEngine(site_cfg)
+        _, metrics = measure(lambda: asyncio.run(engine.parse(pages_html)), trace)
+        runs["ParserEngine.parse"].append(metrics)
+
+    stages = {}
+    for stage, samples in runs.items():
+        traced, timed = samples[0], samples[1:] or samples
+        walls = sorted(sample["wall_s"] for sample in timed)
+        # RSS só das rodadas sem tracemalloc, que infla a memória
+        rss_peaks = [sample["rss_peak_delta_mb"] for sample in timed if sample["rss_peak_delta_mb"] is not None]
+        rss_retained = [sample["rss_retained_mb"] for sample in timed if sample["rss_retained_mb"] is not None]
+        stages[stage] = {
+            "wall_s_min": walls[0],
+            "wall_s_median": walls[len(walls) // 2],
+            "alloc_peak_mb": traced["alloc_peak_mb"],
+            "alloc_retained_mb": traced["alloc_retained_mb"],
+            "rss_peak_delta_mb": max(rss_peaks) if rss_peaks else None,
+            "rss_retained_mb": max(rss_retained) if rss_retained else None,
+        }
+
+    return {
+        "pages": len(pages_html),
+        "html_mb": round(sum(len(html) for html in pages_html) / (1024 * 1024), 3),
+        "stages": stages,
+        **stats,
+    }
+
+
+def run(args):
+    config = load_config(args.config)
+    sites = config.get("sites", {})
+    results = {}
+
+    debug_dir = os.path.abspath(args.debug_dir)
+    fixtures = fixture_sets(args.scales, debug_dir, args.pages)
+
+    # ParserEngine.parse escreve debug/debug_selector_map.json no diretório atual
+    with tempfile.TemporaryDirectory() as workdir:
+        original_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name, site_name, pages_html in fixtures:
+                if site_name not in sites:
+                    print(f"[-] {name}: site '{site_name}' não está no config, ignorado")
+                    continue
+
+                if args.result_root:
+                    pages_html = trim_to_root(pages_html, args.result_root)
+
+                print(f"[+] {name}: {len(pages_html)} páginas")
+                results[name] = bench_fixture(sites[site_name], pages_html, args.repeat)
+                print_fixture(results[name])
+        finally:
+            os.chdir(original_cwd)
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "fixtures": results,
+    }
+
+
+def print_fixture(result):
+    print(f"    html: {result['html_mb']} MB, selectors: {result['selector_keys']}, "
+          f"textos: {result['selector_texts']} ({result['distinct_texts']} distintos), itens: {result['root_items']}")
+    for stage, metrics in result["stages"].items():
+        rss = metrics["rss_peak_delta_mb"]
+        rss_text = f"{rss:>+8.2f} MB" if rss is not None else "     n/d"
+        print(f"    {stage:<24} {metrics['wall_s_median'] * 1000:>10.2f} ms  "
+              f"alloc {metrics['alloc_peak_mb']:>8.2f} MB  Δrss pico {rss_text}")
+
+
+def compare(report, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as arquivo:
+        baseline = json.load(arquivo)
+
+    print(f"\nComparando com {baseline_path} (revisão {baseline.get('revision')})")
+    regressions = 0
+
+    for name, result in report["fixtures"].items():
+        base = baseline.get("fixtures", {}).get(name)
+        if not base:
+            continue
+
+        for stage, metrics in result["stages"].items():
+            base_metrics = base["stages"].get(stage)
+            if not base_metrics or not base_metrics["wall_s_median"]:
+                continue
+
+            delta = metrics["wall_s_median"] / base_metrics["wall_s_median"] - 1.0
+            alloc_delta = metrics["alloc_peak_mb"] - base_metrics["alloc_peak_mb"]
+            flag = ""
+            if delta > threshold:
+                flag = "  <-- REGRESSÃO"
+                regressions += 1
+            print(f"  {name:<24} {stage:<24} tempo {delta * 100:+7.1f}%  alloc {alloc_delta:+8.2f} MB{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do ParserEngine")
+    parser.add_argument("--config", help="Config.json (padrão: Source/Config.json)")
+    parser.add_argument("--debug-dir", default="debug", help="Diretório com *_debug_pages.html gravados")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Fatores de escala")
+    parser.add_argument("--pages", type=int, default=1, help="Páginas por fixture sintética")
+    parser.add_argument("--result-root", help="Mede só o contêiner de resultados (result_root_selector)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por fixture")
+    parser.add_argument("--save", help="Salva o relatório JSON (baseline) neste caminho")
+    parser.add_argument("--compare", help="Compara com um baseline JSON salvo")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Regressão de tempo tolerada (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as arquivo:
+            json.dump(report, arquivo, indent=4)
+        print(f"\n[+] Baseline salvo em {args.save}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        if regressions:
+            print(f"[-] {regressions} regressões acima de {args.threshold * 100:.0f}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 from PyInstaller.utils.hooks import collect_all, collect_data_files, collect_submodules, exec_statement
 import os
+import json
+import hashlib
+import tempfile
 from pathlib import Path
 
+MANIFEST_NAME = "browsers_manifest.json"
+BROWSER_EXECUTABLES = ("chrome.exe", "chrome", "headless_shell.exe", "headless_shell", "chrome-headless-shell.exe", "chrome-headless-shell")
+
 
 hiddenimports = collect_submodules('playwright')
 
@@ -38,15 +44,60 @@ def collect_playwright_browsers():
             break
     
     if browsers_path and browsers_path.exists():
+        browser_dirs = []
         for browser_dir in browsers_path.iterdir():
             if browser_dir.is_dir():
                 dest_path = f"playwright/driver/package/.local-browsers/{browser_dir.name}"
 
                 browser_datas.append((str(browser_dir), dest_path))
+                browser_dirs.append(browser_dir)
                 print(f"[HOOK-PLAYWRIGHT]   [+] {browser_dir.name}")
+
+        manifest_path = write_browsers_manifest(browsers_path, browser_dirs)
+        if manifest_path:
+            browser_datas.append((str(manifest_path), "playwright/driver/package/.local-browsers"))
     
     return browser_datas
 
+
+def write_browsers_manifest(browsers_path, browser_dirs):
+    """
+    Gera o manifesto usado pelo runtime hook para validar o cache de
+    navegadores extraídos: hash do conteúdo, tamanhos e executáveis.
+    """
+    files = {}
+    executables = []
+    digest = hashlib.sha256()
+
+    try:
+        for browser_dir in sorted(browser_dirs):
+            for root, dirs, names in os.walk(browser_dir):
+                dirs.sort()
+                for name in sorted(names):
+                    full_path = Path(root) / name
+                    rel_path = full_path.relative_to(browsers_path).as_posix()
+                    files[rel_path] = full_path.stat().st_size
+                    digest.update(rel_path.encode("utf-8") + b"\0")
+
+                    with open(full_path, "rb") as arquivo:
+                        for chunk in iter(lambda: arquivo.read(1024 * 1024), b""):
+                            digest.update(chunk)
+
+                    if name in BROWSER_EXECUTABLES:
+                        executables.append(rel_path)
+
+        manifest_dir = Path(tempfile.mkdtemp(prefix="jurisdata_hook_"))
+        manifest_path = manifest_dir / MANIFEST_NAME
+        with open(manifest_path, "w", encoding="utf-8") as arquivo:
+            json.dump({"version": digest.hexdigest(), "files": files, "executables": executables}, arquivo)
+
+        print(f"[HOOK-PLAYWRIGHT] Manifesto dos navegadores: {len(files)} arquivos, versão {digest.hexdigest()[:16]}")
+        return manifest_path
+
+    except Exception as e:
+        print(f"[HOOK-PLAYWRIGHT] Erro ao gerar manifesto dos navegadores: {e}")
+        return None
+
 browser_datas = collect_playwright_browsers()
 datas.extend(browser_datas)
 
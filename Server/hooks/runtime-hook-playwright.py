@@ -1,107 +1,331 @@
 import sys
 import os
-import tempfile
-import shutil
+import json
+import time
 import atexit
+import shutil
+import hashlib
 from pathlib import Path
 
-def setup_playwright_for_pyinstaller(): 
+MANIFEST_NAME = "browsers_manifest.json"
+CACHE_MANIFEST_NAME = ".jurisdata_manifest.json"
+BROWSER_EXECUTABLES = ("chrome.exe", "chrome", "headless_shell.exe", "headless_shell", "chrome-headless-shell.exe", "chrome-headless-shell")
+# Só vale para lock sem PID legível (dono morreu entre criar e escrever); com PID, vale se o processo vive
+LOCK_STALE_SECONDS = 30
+LOCK_WAIT_SECONDS = 300
+
+
+def get_cache_root():
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+        return Path(base) / "JurisData" / "playwright-browsers"
+
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "jurisdata" / "playwright-browsers"
+
+
+def build_manifest(browsers_path):
+    """Manifesto rápido (caminho + tamanho) quando o build não embutiu um."""
+    files = {}
+    executables = []
+    digest = hashlib.sha256()
+
+    for root, dirs, names in os.walk(browsers_path):
+        dirs.sort()
+        for name in sorted(names):
+            if name == MANIFEST_NAME:
+                continue
+            full_path = Path(root) / name
+            rel_path = full_path.relative_to(browsers_path).as_posix()
+            size = full_path.stat().st_size
+            files[rel_path] = size
+            digest.update(f"{rel_path}\0{size}\n".encode("utf-8"))
+            if name in BROWSER_EXECUTABLES:
+                executables.append(rel_path)
+
+    return {"version": digest.hexdigest(), "files": files, "executables": executables}
+
+
+def load_bundled_manifest(browsers_path):
+    manifest_path = browsers_path / MANIFEST_NAME
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError) as e:
+            print(f"[RUNTIME-HOOK] AVISO: Manifesto embutido inválido: {e}")
+    return build_manifest(browsers_path)
+
+
+def is_cache_valid(target_dir, manifest):
+    cache_manifest_path = target_dir / CACHE_MANIFEST_NAME
+    if not cache_manifest_path.exists():
+        return False
+
+    try:
+        with open(cache_manifest_path, "r", encoding="utf-8") as arquivo:
+            cached = json.load(arquivo)
+    except (OSError, ValueError):
+        return False
+
+    if cached.get("version") != manifest["version"]:
+        return False
+
+    for rel_path in manifest.get("executables", []):
+        expected_size = manifest["files"].get(rel_path)
+        exe_path = target_dir / rel_path
+        if not exe_path.exists() or (expected_size is not None and exe_path.stat().st_size != expected_size):
+            return False
+
+    return True
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+
+    if sys.platform.startswith("win"):
+        # os.kill(pid, 0) no Windows mata o processo; consulta pelo handle
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: existe, é de outro usuário
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_pid(path):
+    try:
+        return int(path.read_text(encoding="ascii").strip())
+    except (OSError, ValueError):
+        return None
+
+
+def lock_is_stale(lock_path):
+    pid = read_pid(lock_path)
+    if pid is not None:
+        return not pid_alive(pid)
+    try:
+        return time.time() - lock_path.stat().st_mtime > LOCK_STALE_SECONDS
+    except OSError:
+        return True
+
+
+def try_lock(lock_path):
+    try:
+        fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, str(os.getpid()).encode("ascii"))
+    os.close(fd)
+    return True
+
+
+def acquire_lock(lock_path):
+    deadline = time.time() + LOCK_WAIT_SECONDS
+    while True:
+        if try_lock(lock_path):
+            return True
+
+        if lock_is_stale(lock_path):
+            print(f"[RUNTIME-HOOK] Removendo lock abandonado: {lock_path}")
+            release_lock(lock_path)
+            continue
+
+        if time.time() > deadline:
+            return False
+        time.sleep(0.5)
+
+
+def release_lock(lock_path):
+    try:
+        lock_path.unlink()
+    except OSError:
+        pass
+
+
+def mark_in_use(cache_root, version):
+    """Marca a versão como usada por este processo (até ele sair) para nenhuma outra instância podá-la."""
+    marker = cache_root / f"{version}.inuse-{os.getpid()}"
+    marker.write_text(str(os.getpid()), encoding="ascii")
+    atexit.register(release_lock, marker)
+
+
+def versions_in_use(cache_root):
+    in_use = set()
+    for marker in cache_root.glob("*.inuse-*"):
+        pid = read_pid(marker)
+        if pid is not None and pid_alive(pid):
+            in_use.add(marker.name.split(".inuse-", 1)[0])
+        else:
+            release_lock(marker)
+    return in_use
+
+
+def remove_old_versions(cache_root, keep_dir):
+    in_use = versions_in_use(cache_root)
+
+    for item in cache_root.iterdir():
+        if item == keep_dir or not item.is_dir():
+            continue
+
+        name, _, tmp_pid = item.name.partition(".tmp-")
+        if tmp_pid:
+            # Extração de outra instância ainda em andamento
+            if tmp_pid.isdigit() and pid_alive(int(tmp_pid)):
+                continue
+        elif name in in_use:
+            continue
+
+        # Segura o lock da versão para ninguém começar a extraí-la enquanto apagamos
+        lock_path = cache_root / f"{name}.lock"
+        if not try_lock(lock_path):
+            continue
+        try:
+            if name in versions_in_use(cache_root) and not tmp_pid:
+                continue
+            shutil.rmtree(item, ignore_errors=True)
+            print(f"[RUNTIME-HOOK] Versão antiga removida: {item}")
+        finally:
+            release_lock(lock_path)
+
+
+def extract_browsers(browsers_source_path, manifest):
+    """
+    Extrai os navegadores para um cache versionado pelo hash do manifesto.
+    Em um start quente (cache válido) nada é copiado.
+    """
+    cache_root = get_cache_root()
+    version = manifest["version"][:16]
+    target_dir = cache_root / version
+
+    cache_root.mkdir(parents=True, exist_ok=True)
+    # Marca antes de validar: quem estiver podando já enxerga esta versão em uso
+    mark_in_use(cache_root, version)
+
+    if is_cache_valid(target_dir, manifest):
+        print(f"[RUNTIME-HOOK] ✓ Cache de navegadores válido: {target_dir}")
+        return target_dir
+
+    lock_path = cache_root / f"{version}.lock"
+
+    if not acquire_lock(lock_path):
+        print("[RUNTIME-HOOK] AVISO: Timeout aguardando lock de extração")
+        return None
+
+    try:
+        # Outra instância pode ter extraído enquanto esperávamos o lock
+        if is_cache_valid(target_dir, manifest):
+            print(f"[RUNTIME-HOOK] ✓ Cache de navegadores válido: {target_dir}")
+            return target_dir
+
+        temp_dir = cache_root / f"{version}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+        print(f"[RUNTIME-HOOK] Extraindo navegadores para: {target_dir}")
+        start = time.perf_counter()
+        shutil.copytree(browsers_source_path, temp_dir, ignore=shutil.ignore_patterns(MANIFEST_NAME))
+
+        with open(temp_dir / CACHE_MANIFEST_NAME, "w", encoding="utf-8") as arquivo:
+            json.dump({"version": manifest["version"], "extracted_at": time.time()}, arquivo)
+
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.replace(temp_dir, target_dir)
+        print(f"[RUNTIME-HOOK] ✓ Navegadores extraídos em {time.perf_counter() - start:.1f}s")
+
+        remove_old_versions(cache_root, target_dir)
+        return target_dir
+
+    except Exception as e:
+        print(f"[RUNTIME-HOOK] ERRO ao extrair navegadores: {e}")
+        return None
+    finally:
+        release_lock(lock_path)
+
+
+def setup_playwright_for_pyinstaller():
     if not getattr(sys, 'frozen', False):
         return
-    
+
     print("[RUNTIME-HOOK] Configurando Playwright para PyInstaller...")
-    
+
     if hasattr(sys, '_MEIPASS'):
         base_dir = Path(sys._MEIPASS)
         print(f"[RUNTIME-HOOK] Modo: onefile, Base: {base_dir}")
     else:
         base_dir = Path(sys.executable).parent
         print(f"[RUNTIME-HOOK] Modo: onedir, Base: {base_dir}")
-    
+
     possible_browser_paths = [
         base_dir / "playwright" / "driver" / "package" / ".local-browsers",
         base_dir / ".local-browsers",
         base_dir / "browsers",
     ]
-    
+
     browsers_source_path = None
     for path in possible_browser_paths:
         if path.exists():
             browsers_source_path = path
             print(f"[RUNTIME-HOOK] Navegadores encontrados em: {browsers_source_path}")
             break
-    
+
     if not browsers_source_path:
         print("[RUNTIME-HOOK] AVISO: Navegadores não encontrados no executável")
         return
 
-    temp_browsers_dir = Path(tempfile.gettempdir()) / f"playwright_browsers_{os.getpid()}"
+    manifest = load_bundled_manifest(browsers_source_path)
 
-    if temp_browsers_dir.exists():
-        shutil.rmtree(temp_browsers_dir, ignore_errors=True)
+    if not manifest.get("executables"):
+        print("[RUNTIME-HOOK] AVISO: Chromium não listado no manifesto dos navegadores")
 
-    print(f"[RUNTIME-HOOK] Copiando navegadores para: {temp_browsers_dir}")
-    
-    try:
-        shutil.copytree(browsers_source_path, temp_browsers_dir)
-        print(f"[RUNTIME-HOOK] ✓ Navegadores copiados com sucesso")
-
-        chromium_found = False
-        for item in temp_browsers_dir.rglob("chrome.exe"):
-            if item.exists():
-                chromium_found = True
-                print(f"[RUNTIME-HOOK] ✓ Chromium encontrado: {item}")
-                break
-        
-        if not chromium_found:
-            print("[RUNTIME-HOOK] AVISO: Chromium não encontrado após cópia")
-            
-    except Exception as e:
-        print(f"[RUNTIME-HOOK] ERRO ao copiar navegadores: {e}")
+    browsers_dir = extract_browsers(browsers_source_path, manifest)
+    if browsers_dir is None:
         return
-    
-    os.environ["PLAYWRIGHT_BROWSERS_PATH"] = str(temp_browsers_dir)
-    print(f"[RUNTIME-HOOK] PLAYWRIGHT_BROWSERS_PATH = {temp_browsers_dir}")
-    
+
+    os.environ["PLAYWRIGHT_BROWSERS_PATH"] = str(browsers_dir)
+    print(f"[RUNTIME-HOOK] PLAYWRIGHT_BROWSERS_PATH = {browsers_dir}")
+
     os.environ["PLAYWRIGHT_SKIP_VALIDATE_HOST_REQUIREMENTS"] = "1"
     os.environ["PLAYWRIGHT_SKIP_BROWSER_DOWNLOAD"] = "1"
-    
-    def cleanup_temp_browsers():
-        """Limpa diretório temporário ao sair"""
-        if temp_browsers_dir.exists():
-            try:
-                shutil.rmtree(temp_browsers_dir, ignore_errors=True)
-                print(f"[RUNTIME-HOOK] Diretório temporário removido: {temp_browsers_dir}")
-            except:
-                pass
-    
-    atexit.register(cleanup_temp_browsers)
 
     original_import = __builtins__.__import__
-    
+
     def patched_import(name, *args, **kwargs):
         if name == 'playwright' or name.startswith('playwright.'):
             result = original_import(name, *args, **kwargs)
-            
+
             if name == 'playwright._impl':
                 try:
                     from playwright._impl import _get_driver_env
                     original_get_driver_env = _get_driver_env
-                    
+
                     def patched_get_driver_env():
                         env = original_get_driver_env()
-                        env['PLAYWRIGHT_BROWSERS_PATH'] = str(temp_browsers_dir)
+                        env['PLAYWRIGHT_BROWSERS_PATH'] = str(browsers_dir)
                         return env
-                    
+
                     _get_driver_env = patched_get_driver_env
                 except:
                     pass
-            
+
             return result
         return original_import(name, *args, **kwargs)
-    
+
     __builtins__.__import__ = patched_import
-    
+
     print("[RUNTIME-HOOK] ✓ Configuração do Playwright concluída")
 
-setup_playwright_for_pyinstaller()
\ No newline at end of file
+setup_playwright_for_pyinstaller()
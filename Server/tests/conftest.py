@@ -0,0 +1,62 @@
+import json
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Os módulos do servidor usam imports planos (como no build do PyInstaller)
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "Source"
+sys.path.insert(0, str(SOURCE_DIR))
+# Páginas sintéticas do TJSP (benchmarks/Fixtures.py) servem de fixture HTML
+sys.path.insert(1, str(SOURCE_DIR.parent / "benchmarks"))
+
+
+@pytest.fixture
+def run_server(tmp_path, monkeypatch):
+    """
+    Sobe um Server de verdade numa porta efêmera, com o Config.json do repo
+    e `settings` sobrescritos. Pool de navegadores e watcher ficam desligados.
+    """
+    from Server import Server
+
+    monkeypatch.chdir(tmp_path)  # state/*.db e caches vão para o diretório do teste
+    running = []
+
+    def start(settings=None, unix_socket=None):
+        with open(SOURCE_DIR / "Config.json", "r", encoding="utf-8") as arquivo:
+            config = json.load(arquivo)
+        config["settings"].update({
+            "watch_config": False,
+            "metrics_port": None,
+            "browser_pool": {"enabled": False},
+            "parse_cache": {"enabled": False},
+            **(settings or {}),
+        })
+        config_path = tmp_path / f"Config-{len(running)}.json"
+        config_path.write_text(json.dumps(config), encoding="utf-8")
+
+        server = Server("127.0.0.1", 0, str(config_path), unix_socket)
+        server.monitor_exit = lambda: None  # O stdin é do pytest
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        running.append((server, thread))
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if server.connections is not None and server.server_socket.getsockname()[1]:
+                try:
+                    socket.create_connection(server.server_socket.getsockname(), timeout=1).close()
+                    return server
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        raise RuntimeError("Server não começou a ouvir")
+
+    yield start
+
+    for server, thread in running:
+        server.stop()
+        thread.join(5)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import WorkerNode as worker_node
+from Fixtures import synthetic_pages
+from ParserEngine import ParserEngine
+from Worker import PlaywrightWorker
+from WorkerNode import WorkerNode
+
+PAGES = synthetic_pages(pages=3, items_per_page=5)
+
+
+class FixtureWorker(PlaywrightWorker):
+    """PlaywrightWorker sem Chromium: emite as páginas de fixture pelo caminho real (_emit -> on_page)."""
+
+    hang = None  # threading.Event: o primeiro job avisa que começou e fica preso até ser cancelado
+
+    async def execute(self, search_text):
+        hang, FixtureWorker.hang = FixtureWorker.hang, None
+        if hang is not None:
+            hang.set()
+            await asyncio.sleep(60)
+
+        pages_html = []
+        for html in PAGES:
+            await self._emit(pages_html, html.encode("utf-8"))
+        return pages_html
+
+
+def start_node(server, node_id):
+    node = WorkerNode("127.0.0.1", server.server_socket.getsockname()[1], node_id, capacity=1)
+    threading.Thread(target=node.run, daemon=True).start()
+
+    deadline = time.monotonic() + 10
+    while node_id not in server.coordinator.status()["nodes"]:
+        assert time.monotonic() < deadline, f"worker {node_id} não registrou"
+        time.sleep(0.05)
+    return node
+
+
+def organize_locally(site_cfg):
+    parser = ParserEngine(site_cfg)
+    for page_no, html in enumerate(PAGES, 1):
+        parser.feed(html.encode("utf-8"), page_no)
+    return asyncio.run(parser.finish())
+
+
+@pytest.fixture
+def cluster(run_server, monkeypatch):
+    monkeypatch.setattr(worker_node, "PlaywrightWorker", FixtureWorker)
+    server = run_server({"cluster": {
+        "enabled": True, "heartbeat_interval": 0.5, "heartbeat_timeout": 5.0,
+        "max_reassign": 2, "local_fallback": False,
+    }})
+    assert server.ready.wait(30)
+    nodes = []
+    yield server, nodes
+    for node in nodes:
+        node.stop()
+
+
+def test_remote_job_returns_organized_result(cluster):
+    server, nodes = cluster
+    nodes.append(start_node(server, "node-a"))
+    site = server.config_store.snapshot().sites["TJSP"]
+
+    result = server.coordinator.run(site, "dano moral")
+
+    expected = json.loads(json.dumps(organize_locally(site.cfg)))
+    assert result == expected
+    assert sum(len(items) for items in result.values() if isinstance(items, list)) == 15
+
+
+def test_job_of_killed_worker_is_reassigned(cluster):
+    server, nodes = cluster
+    started = threading.Event()
+    FixtureWorker.hang = started
+
+    node_a = start_node(server, "node-a")
+    nodes.append(node_a)
+
+    site = server.config_store.snapshot().sites["TJSP"]
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = server.coordinator.run(site, "dano moral")
+        except Exception as e:
+            outcome["error"] = e
+
+    job = threading.Thread(target=run, daemon=True)
+    job.start()
+    assert started.wait(10), "job não chegou ao primeiro worker"
+
+    nodes.append(start_node(server, "node-b"))
+    node_a.stop()  # Cai no meio do job
+
+    job.join(10)
+    assert not job.is_alive()
+    assert outcome == {"result": json.loads(json.dumps(organize_locally(site.cfg)))}
+
+    status = server.coordinator.status()
+    assert status["reassigned"] == 1
+    assert list(status["nodes"]) == ["node-b"]
+    assert status["nodes"]["node-b"]["completed"] == 1
@@ -0,0 +1,32 @@
+import json
+import shutil
+from pathlib import Path
+
+from ConfigLoader import ConfigStore
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "Source"
+
+
+def test_reload_rejects_non_object_root_and_keeps_current(tmp_path):
+    path = tmp_path / "Config.json"
+    shutil.copy(SOURCE_DIR / "Config.json", path)
+    store = ConfigStore(str(path))
+    current = store.compile()
+
+    path.write_text("[1, 2]", encoding="utf-8")
+    assert store.reload() == {"reloaded": False, "errors": ["a raiz do config deve ser um objeto"]}
+
+    path.write_text(json.dumps({"sites": [], "settings": {}}), encoding="utf-8")
+    assert store.reload()["errors"] == ["'sites' deve ser um objeto"]
+    assert store.snapshot() is current
+
+
+def test_site_with_non_object_sections_is_a_validation_error(tmp_path):
+    config = json.loads((SOURCE_DIR / "Config.json").read_text(encoding="utf-8"))
+    config["sites"]["TJSP"]["records"] = "processo"
+    path = tmp_path / "Config.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+
+    store = ConfigStore(str(path))
+    store.compile()
+    assert store.reload()["errors"] == ["TJSP: 'records' deve ser um objeto"]
@@ -0,0 +1,57 @@
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from Connections import ConnectionLoop
+
+
+def start_loop(dispatch, **settings):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    addr = listener.getsockname()
+    loop = ConnectionLoop([listener], settings, dispatch)
+    thread = threading.Thread(target=loop.run, daemon=True)
+    thread.start()
+    return loop, thread, addr
+
+
+@pytest.fixture
+def echo_or_flood():
+    def dispatch(conn, data):
+        future = Future()
+        if data == b'{"type":"flood"}':
+            # Resposta bem maior que os buffers do kernel, e fecha depois (só EVENT_WRITE fica)
+            conn.write(b"x" * (8 * 1024 * 1024), block=False)
+            future.set_result(False)
+        else:
+            conn.write(data)
+            future.set_result(True)
+        return future
+
+    loop, thread, addr = start_loop(dispatch)
+    yield loop, thread, addr
+    loop.stop()
+    thread.join(5)
+
+
+def test_client_reset_mid_response_does_not_stop_loop(echo_or_flood):
+    loop, thread, addr = echo_or_flood
+
+    client = socket.create_connection(addr)
+    client.sendall(b'{"type":"flood"}')
+    client.recv(1024)  # Garante que a resposta começou a sair
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    client.close()  # RST com dados ainda no buffer de saída do servidor
+
+    time.sleep(0.5)
+    assert thread.is_alive()
+
+    with socket.create_connection(addr, timeout=5) as other:
+        other.sendall(b'{"type":"ping"}')
+        assert other.recv(1024) == b'{"type":"ping"}'
+    assert loop.status()["buffered_kb"] == 0
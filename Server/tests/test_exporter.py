@@ -0,0 +1,75 @@
+import gzip
+import json
+
+from Exporter import ChunkedExporter, flatten_rows
+
+SITE_CFG = {
+    "groups": {
+        "processo": {"type": "single", "parent_group": None, "members": {"a.numero": {}}},
+        "ementa": {
+            "type": {"multiple": 3},
+            "parent_group": "processo",
+            "members": {
+                ".campo strong": {"cyclic": True, "cyclic_block_size": 3},
+                ".campo": {"not": ".campo strong", "not_reorder": ".campo strong"},
+            },
+        },
+        "parte": {"type": "all", "parent_group": "processo", "members": {".nome": {}}},
+    }
+}
+
+ORGANIZED = {
+    "processo": [
+        {
+            "a.numero": "0001",
+            "ementa": {
+                ".campo strong": ["Relator(a):", "Comarca:", "Ementa:"],
+                ".campo": ["Des. Ana", "Santos", "Recurso provido."],
+            },
+        },
+        {
+            "a.numero": "0002",
+            "ementa": {
+                ".campo strong": ["Relator(a):", "Comarca:", "Ementa:"],
+                ".campo": ["Des. Lima", "Campinas", "Sentença mantida."],
+            },
+            "parte": [{".nome": "Autor"}, {".nome": "Réu"}],
+        },
+    ]
+}
+
+
+def test_one_row_per_leaf_item_with_a_column_per_field():
+    rows = list(flatten_rows(SITE_CFG, ORGANIZED))
+
+    assert rows == [
+        {
+            "processo:a.numero": "0001",
+            "ementa:Relator(a)": "Des. Ana", "ementa:Comarca": "Santos", "ementa:Ementa": "Recurso provido.",
+        },
+        {
+            "processo:a.numero": "0002",
+            "ementa:Relator(a)": "Des. Lima", "ementa:Comarca": "Campinas", "ementa:Ementa": "Sentença mantida.",
+            "parte:.nome": "Autor",
+        },
+        {
+            "processo:a.numero": "0002",
+            "ementa:Relator(a)": "Des. Lima", "ementa:Comarca": "Campinas", "ementa:Ementa": "Sentença mantida.",
+            "parte:.nome": "Réu",
+        },
+    ]
+
+
+def test_jsonl_export_writes_flattened_rows_in_chunks(tmp_path):
+    exporter = ChunkedExporter(str(tmp_path), "jsonl", chunk_rows=2)
+    assert exporter.add("TJSP", SITE_CFG, "dano moral", ORGANIZED) == 3
+    summary = exporter.close()
+
+    rows = []
+    for path in summary["files"]:
+        with gzip.open(path, "rt", encoding="utf-8") as arquivo:
+            rows.extend(json.loads(line) for line in arquivo)
+
+    assert len(summary["files"]) == 2
+    assert [row["processo:a.numero"] for row in rows] == ["0001", "0002", "0002"]
+    assert all(row["site"] == "TJSP" and row["search_term"] == "dano moral" for row in rows)
@@ -0,0 +1,44 @@
+import asyncio
+
+from Incremental import SeenIndex, extract_keys, filter_new
+from ParserEngine import ParserEngine
+
+SITE_CFG = {
+    "url": "https://example.invalid/",
+    "groups": {
+        "processo": {
+            "type": "single",
+            "parent_group": None,
+            "members": {".proc": {"not": ".proc strong", "not_mode": "position"}},
+        }
+    },
+}
+
+PAGE = ("<html><body>" + "".join(
+    f'<div class="item"><div class="proc"><strong>Processo:</strong> 000{i}</div></div>' for i in range(3)
+) + "</body></html>").encode("utf-8")
+
+
+def test_page_keys_match_organized_item_keys(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # ParserEngine.finish grava debug/
+    parser = ParserEngine(SITE_CFG)
+    parser.feed(PAGE, 1)
+    organized = asyncio.run(parser.finish())
+
+    keys = extract_keys(PAGE, SITE_CFG, ".proc")
+
+    # Sem o pós-processamento do membro a chave viria como "Processo: 0000"
+    assert keys == ["0000", "0001", "0002"]
+    assert keys == [item[".proc"] for item in organized["processo"]]
+    assert filter_new(organized, "processo", ".proc", set(keys)) == ({"processo": []}, [])
+
+
+def test_seen_index_creates_database_on_first_use(tmp_path):
+    path = tmp_path / "state" / "seen_items.db"
+    index = SeenIndex(str(path))
+    assert not path.exists()
+
+    index.add("TJSP", "Dano  Moral", ["0001"])
+    assert path.exists()
+    assert index.known("TJSP", "dano moral") == {"0001"}
+    index.close()
@@ -0,0 +1,33 @@
+import asyncio
+import os
+
+from Fixtures import load_config, synthetic_pages
+from ParseCache import ParseCache
+from ParserEngine import ParserEngine
+
+PAGES = [html.encode("utf-8") for html in synthetic_pages(pages=2, items_per_page=5)]
+
+
+def parse(site_cfg, cache=None):
+    parser = ParserEngine(site_cfg, None, cache)
+    for page_no, html in enumerate(PAGES, 1):
+        parser.feed(html, page_no)
+    return asyncio.run(parser.finish())
+
+
+def test_cached_pages_organize_like_uncached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # ParserEngine.finish grava debug/
+    site_cfg = load_config()["sites"]["TJSP"]
+    expected = parse(site_cfg)
+
+    cache_dir = tmp_path / "parse_cache"
+    cache = ParseCache({"dir": str(cache_dir)})
+    assert parse(site_cfg, cache) == expected
+    cache.close()  # Gravação em disco roda em background; close espera a fila
+    assert len([name for name in os.listdir(cache_dir) if name.endswith(".bin")]) == len(PAGES)
+
+    # Processo novo: só o disco tem as páginas
+    reopened = ParseCache({"dir": str(cache_dir)})
+    assert parse(site_cfg, reopened) == expected
+    assert reopened.status()["disk_hits"] == len(PAGES)
+    reopened.close()
@@ -0,0 +1,61 @@
+import asyncio
+import copy
+
+import pytest
+
+from Fixtures import load_config, synthetic_pages
+from ParserEngine import DataOrganizer, UniversalParser
+
+PAGES = [html.encode("utf-8") for html in synthetic_pages(pages=3, items_per_page=4)]
+
+
+@pytest.fixture(scope="module")
+def site_cfg():
+    return load_config()["sites"]["TJSP"]
+
+
+def with_parser(site_cfg, **options):
+    cfg = copy.deepcopy(site_cfg)
+    cfg["parser"] = {**cfg.get("parser", {}), **options}
+    return cfg
+
+
+def selector_map(site_cfg):
+    parser = UniversalParser(site_cfg)
+    for page_no, html in enumerate(PAGES, 1):
+        parser.feed(html, page_no)
+    return parser.result()
+
+
+def organize(site_cfg, selectors):
+    return asyncio.run(DataOrganizer(site_cfg).organize(selectors))
+
+
+def test_stream_backend_matches_dom_backend(site_cfg):
+    dom_cfg = with_parser(site_cfg, backend="dom")
+    stream_cfg = with_parser(site_cfg, backend="stream")
+    dom, stream = selector_map(dom_cfg), selector_map(stream_cfg)
+
+    assert list(stream) == list(dom)
+    assert {key: list(texts) for key, texts in stream.items()} == {key: list(texts) for key, texts in dom.items()}
+    assert organize(stream_cfg, stream) == organize(dom_cfg, dom)
+
+
+def test_interned_selector_map_reads_as_plain_lists(site_cfg):
+    selectors = selector_map(with_parser(site_cfg, backend="dom"))
+    stats = selectors.stats()
+
+    assert stats["distinct_texts"] < stats["entries"]  # Textos repetidos guardados uma vez
+    assert all(isinstance(texts, list) for texts in selectors.values())
+    assert selectors[".ementaClass2 strong"][:2] == ["Classe/Assunto:", "Relator(a):"]
+
+
+def test_selector_limits_keep_configured_members(site_cfg):
+    plain_cfg = with_parser(site_cfg, backend="dom")
+    limited_cfg = with_parser(site_cfg, backend="dom", max_ancestors=1, skip_tags=["script"], max_selectors=20)
+    plain, limited = selector_map(plain_cfg), selector_map(limited_cfg)
+
+    assert len(limited) < len(plain)
+    organized = organize(limited_cfg, limited)
+    assert organized == organize(plain_cfg, plain)
+    assert len(organized["processo"]) == 12
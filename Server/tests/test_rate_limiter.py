@@ -0,0 +1,60 @@
+import pytest
+
+from Cancellation import CancelToken, JobCancelled
+from RateLimiter import RateLimiter
+
+RESULTS_PAGE = b'<html><form><div class="g-recaptcha" data-sitekey="x"></div></form><table class="resultados"></table></html>'
+CHALLENGE_PAGE = b'<html><script>window._cf_chl_opt = {};</script><div id="cf-challenge-running"></div></html>'
+
+
+def controller(**settings):
+    return RateLimiter({"initial_concurrency": 2, "max_concurrency": 4, **settings}).controller("TJSP")
+
+
+def test_recaptcha_widget_on_a_normal_page_is_not_a_backoff():
+    site = controller()
+    assert site.observe(1.0, 200, RESULTS_PAGE) is None
+    assert site.limit == 2
+
+
+def test_captcha_with_error_status_and_challenge_pages_back_off():
+    site = controller()
+    assert site.observe(1.0, 403, RESULTS_PAGE) == "captcha (HTTP 403)"
+    assert site.limit == 1
+
+    site = controller()
+    assert site.observe(1.0, 200, CHALLENGE_PAGE) == "desafio anti-bot"
+    assert site.observe(1.0, 429, None) == "HTTP 429"
+
+
+def test_fast_pages_grow_concurrency_up_to_max():
+    site = controller()
+    for _ in range(20):
+        site.observe(0.5, 200, b"<html></html>")
+    assert site.limit == 4
+
+
+def test_acquire_honours_limit_timeout_and_token():
+    site = controller(initial_concurrency=1)
+    assert site.acquire(0.0)
+    assert not site.acquire(0.0)  # Sem vaga e timeout zero: volta na hora
+
+    token = CancelToken()
+    token.cancel("disconnect")
+    with pytest.raises(JobCancelled):
+        site.acquire(5.0, token)
+
+    site.release()
+    assert site.acquire(0.0)
+
+
+def test_reload_keeps_in_flight_on_the_same_controller():
+    limiter = RateLimiter({"initial_concurrency": 1})
+    site = limiter.controller("TJSP", {})
+    assert site.acquire(0.0)
+
+    limiter.invalidate_site("TJSP")
+    reloaded = limiter.controller("TJSP", {"rate_limit": {"initial_concurrency": 3}})
+
+    assert reloaded is site
+    assert site.to_dict()["in_flight"] == 1 and site.limit == 3
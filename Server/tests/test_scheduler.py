@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from Cancellation import CancelToken, JobCancelled
+from Scheduler import JobScheduler
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condição não atingida"
+        time.sleep(0.01)
+
+
+def queue(scheduler, client, priority, name, granted):
+    """Enfileira um pedido numa thread e espera ele entrar na fila (ordem de chegada determinística)."""
+    waiting = sum(scheduler.status()["waiting"].values())
+
+    def run():
+        ticket = scheduler.acquire(client, priority)
+        granted.append(name)
+        scheduler.release(ticket)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_until(lambda: sum(scheduler.status()["waiting"].values()) == waiting + 1)
+    return thread
+
+
+def test_clients_alternate_instead_of_first_come_first_served():
+    scheduler = JobScheduler(1, {"interactive_share": 0})
+    holder = scheduler.acquire(object(), "batch")
+    client_a, client_b = object(), object()
+    granted = []
+
+    threads = [queue(scheduler, client_a, "batch", f"a{i}", granted) for i in range(1, 4)]
+    threads.append(queue(scheduler, client_b, "batch", "b1", granted))
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(5)
+
+    # b1 chegou por último, mas passa à frente dos pedidos extras do cliente A
+    assert granted == ["a1", "b1", "a2", "a3"]
+
+
+def test_interactive_goes_ahead_of_queued_batch():
+    scheduler = JobScheduler(1, {"interactive_share": 0})
+    holder = scheduler.acquire(object(), "batch")
+    granted = []
+
+    threads = [queue(scheduler, object(), "batch", f"batch{i}", granted) for i in range(1, 3)]
+    threads.append(queue(scheduler, object(), "interactive", "interactive", granted))
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(5)
+
+    assert granted[0] == "interactive"
+
+
+def test_reserved_slot_is_never_taken_by_batch():
+    scheduler = JobScheduler(4, {"interactive_share": 0.25})
+    assert scheduler.reserved == 1
+    batches = [scheduler.acquire(object(), "batch") for _ in range(3)]
+
+    token = CancelToken(0.3)
+    with pytest.raises(JobCancelled):
+        scheduler.acquire(object(), "batch", token)  # Só sobrou a vaga reservada
+
+    interactive = scheduler.acquire(object(), "interactive", CancelToken(1))
+    status = scheduler.status()
+    assert status["running"] == {"interactive": 1, "batch": 3}
+    assert status["waiting"] == {"interactive": 0, "batch": 0}
+
+    for ticket in batches + [interactive]:
+        scheduler.release(ticket)
+    assert scheduler.status()["running"] == {"interactive": 0, "batch": 0}
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from Serializer import ResponseStream, StreamEncoder, orjson
+
+BACKENDS = ["json"] + (["orjson"] if orjson is not None else [])
+
+VALUE = {
+    "processo": [{"numero": "0001", 2: "dois", None: "nulo", True: "sim"}],
+    "contagem": {1: 10, 2.5: 20},
+    "grande": 2 ** 70,
+}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backends_encode_non_str_keys_like_stdlib(backend):
+    encoder = StreamEncoder(backend)
+    encoded = b"".join(encoder.iter_encode(VALUE))
+    assert json.loads(encoded) == json.loads(json.dumps(VALUE, default=str))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_response_stream_is_valid_json(backend):
+    chunks = []
+    stream = ResponseStream(chunks.append, "finished", StreamEncoder(backend), chunk_size=16)
+    stream.add("TJSP", VALUE)
+    stream.add(3, {"error": "falhou"})
+    stream.close(False)
+
+    response = json.loads(b"".join(chunks))
+    assert response["type"] == "finished" and response["success"] is False
+    assert response["content"]["TJSP"]["processo"][0]["2"] == "dois"
+    assert response["content"]["3"] == {"error": "falhou"}
@@ -0,0 +1,54 @@
+import json
+import os
+import socket
+import stat
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="sem socket Unix nesta plataforma")
+
+
+def request(path, message):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(5)
+        client.connect(path)
+        client.sendall(json.dumps(message).encode("utf-8"))
+        received = b""
+        while True:
+            data = client.recv(65536)
+            assert data, "conexão fechada sem resposta"
+            received += data
+            try:
+                return json.loads(received)
+            except ValueError:
+                continue
+
+
+def test_status_over_unix_socket_is_owner_only(run_server, tmp_path):
+    path = str(tmp_path / "jurisdata.sock")
+    server = run_server(unix_socket=path)
+
+    assert stat.S_ISSOCK(os.stat(path).st_mode)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    reply = request(path, {"type": "status"})
+    assert reply["type"] == "status" and reply["success"]
+    assert reply["content"]["unix_socket"] == path
+
+    server.stop()
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_file_is_replaced(run_server, tmp_path):
+    path = str(tmp_path / "jurisdata.sock")
+    # Sobra de um servidor que morreu: o arquivo existe, mas ninguém ouve
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    with pytest.raises(OSError):
+        request(path, {"type": "status"})
+
+    server = run_server(unix_socket=path)
+
+    assert server.unix_socket is not None
+    assert request(path, {"type": "status"})["success"]